@@ -0,0 +1,14 @@
+import os
+import sys
+
+# Test modules import their siblings by bare name (e.g. "from checkpoint import ..."), as
+# when python -m unittest runs inside the module's directory; put those directories on
+# sys.path so pytest also collects them from the repository root
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+for module_dir in ("src/medical_retriever_tool", "src/langgraph/query_parser", "src/weather_integration"):
+    path = os.path.join(ROOT_DIR, *module_dir.split("/"))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# A scratch script without test functions, whose module-level assertion patches too late
+collect_ignore = ["src/langgraph/tools/test_the_test.py"]
@@ -197,12 +197,9 @@ def get_medical_info(state: AgentState) -> AgentState:
             
             if conditions:
                 logger.info(f"Getting medical info for conditions: {conditions}")
-                medical_info = []
-                for condition in conditions:
-                    info = medical_tool.get_medical_info(condition=condition)
-                    if info:
-                        medical_info.extend(info)
-                state["tool_results"]["medical_info"] = medical_info
+                # All conditions are searched in one round trip
+                medical_info = medical_tool.search_many(conditions)
+                state["tool_results"]["medical_info"] = list(medical_info)
                 logger.info("Medical info retrieved successfully")
             else:
                 logger.warning("No health conditions found in user info")
@@ -2,21 +2,39 @@ from langchain_core.tools import StructuredTool
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-from src.medical_retriever_tool.searcher import search_documents
+from src.medical_retriever_tool.searcher import search_documents, search_documents_batch, asearch_documents
 from pydantic import BaseModel, Field
+from typing import Any, Awaitable, Callable, Optional
 
 class MedicalResearchInput(BaseModel):
     query: str = Field(description="The query to search for in the medical research database")
     k: int = Field(description="The number of results to return")
 
+async def _search_medical_research(query: str, k: int = 5) -> list:
+    # ainvoke awaits this instead of running _run in a thread
+    return await asearch_documents(
+        query=query,
+        search_type="hybrid",
+        k=k
+    )
+
 class MedicalResearchTool(StructuredTool):
     name: str = "medical_research_tool"
     description: str = "Search medical research for health and weather queries."
     args_schema: type[BaseModel] = MedicalResearchInput
+    coroutine: Optional[Callable[..., Awaitable[Any]]] = _search_medical_research
 
     def _run(self, query: str, k: int = 5, **kwargs) -> list:
         return search_documents(
             query=query,
             search_type="hybrid",
             k=k
-        )
\ No newline at end of file
+        )
+
+    def search_many(self, queries: list, k: int = 5) -> list:
+        """Search all queries in one round trip and return their results, each chunk once."""
+        return search_documents_batch(
+            queries=queries,
+            search_type="hybrid",
+            k=k
+        )["merged"]
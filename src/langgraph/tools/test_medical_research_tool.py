@@ -1,5 +1,6 @@
+import asyncio
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 from src.langgraph.tools.medical_research_tool import MedicalResearchTool, MedicalResearchInput
 import sys
 import os
@@ -26,5 +27,33 @@ class TestMedicalResearchTool(unittest.TestCase):
         )
         self.assertEqual(result, expected_result)
 
+    def test_medical_research_tool_async_call(self):
+        tool = MedicalResearchTool()
+        expected_result = [{"score": 0.9, "text": "Sample text", "source": "Sample source"}]
+        with patch('src.langgraph.tools.medical_research_tool.asearch_documents',
+                   new=AsyncMock(return_value=expected_result)) as mock_asearch_documents:
+            result = asyncio.run(tool.ainvoke({"query": "Asthma caused by humidity", "k": 5}))
+
+        mock_asearch_documents.assert_awaited_once_with(
+            query="Asthma caused by humidity",
+            search_type="hybrid",
+            k=5
+        )
+        self.assertEqual(result, expected_result)
+
+    def test_search_many_uses_one_batch(self):
+        tool = MedicalResearchTool()
+        merged = [{"score": 0.9, "text": "Sample text", "source": "Sample source", "queries": ["asthma", "copd"]}]
+        with patch('src.langgraph.tools.medical_research_tool.search_documents_batch',
+                   return_value={"results": {}, "merged": merged}) as mock_search_documents_batch:
+            result = tool.search_many(["asthma", "copd"])
+
+        mock_search_documents_batch.assert_called_once_with(
+            queries=["asthma", "copd"],
+            search_type="hybrid",
+            k=5
+        )
+        self.assertEqual(result, merged)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import subprocess
+from ingest_metrics import percentile
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(MODULE_DIR, '..', '..'))
+MODULES = {
+    "searcher": "import searcher",
+    "medical_research_tool": "import src.langgraph.tools.medical_research_tool",
+}
+# Times the first call creating the search backend, without a search
+FIRST_USE = "import time; import searcher; start = time.perf_counter(); searcher.get_backend(); " \
+            "print((time.perf_counter() - start) * 1000)"
+
+def time_import(statement, env):
+    """Wall-clock milliseconds of a cold python process running statement."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], cwd=REPO_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    """
+    Measure the cold import time of the searcher and the medical research tool.
+
+    Every import runs in a fresh interpreter without credentials, as in a
+    test or a Streamlit cold start, so it fails if importing connects to
+    Elasticsearch or validates settings. The baseline is an interpreter
+    importing nothing.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the searcher')
+    parser.add_argument('--runs', type=int, default=10, help='Cold imports measured per module')
+    parser.add_argument('--first-use', action='store_true',
+                        help='Also time the creation of the search backend, which needs the settings')
+    args = parser.parse_args()
+
+    env = {var: value for var, value in os.environ.items()
+           if not var.startswith(("ES_", "IBM_CLOUD_"))}
+    env["PYTHONPATH"] = os.pathsep.join([MODULE_DIR, REPO_DIR])
+    baseline = [time_import("pass", env) for _ in range(args.runs)]
+    logger.info(f"Interpreter start: p50 {percentile(baseline, 50):.0f} ms")
+    for name, statement in MODULES.items():
+        times = [time_import(statement, env) for _ in range(args.runs)]
+        logger.info(
+            f"Import {name}: p50 {percentile(times, 50) - percentile(baseline, 50):.0f} ms, "
+            f"p95 {percentile(times, 95) - percentile(baseline, 50):.0f} ms over interpreter start"
+        )
+
+    if args.first_use:
+        times = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", FIRST_USE], cwd=REPO_DIR, check=True,
+                                    capture_output=True, text=True,
+                                    env=dict(os.environ, PYTHONPATH=env["PYTHONPATH"]))
+            times.append(float(output.stdout.strip().splitlines()[-1]))
+        logger.info(f"First get_backend(): p50 {percentile(times, 50):.1f} ms, p95 {percentile(times, 95):.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import argparse
+import numpy as np
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
+from embedding_cache import EmbeddingCache
+from index_admin import VECTOR_INDEX_TYPES, DEFAULT_HNSW_M, DEFAULT_HNSW_EF_CONSTRUCTION, build_vector_mapping
+from ingest_metrics import percentile
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ES_URL = os.getenv("ES_URL")
+ES_USER = os.getenv("ES_USER")
+ES_PASSWORD = os.getenv("ES_PASSWORD")
+ES_CERT_FINGERPRINT = os.getenv("ES_CERT_FINGERPRINT")
+MEDICAL_JOURNAL_INDEX_NAME = os.getenv("MEDICAL_JOURNAL_INDEX_NAME", "medical_journal")
+EMBEDDING_MODEL_ID = "ibm/slate-125m-english-rtrvr-v2"
+TRUNCATE_INPUT_TOKENS = 500
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("output", "embedding_cache"))
+
+def load_vectors(args):
+    """Benchmark corpus: embeddings from the indexer's cache, or random unit vectors."""
+    if args.synthetic:
+        rng = np.random.default_rng(42)
+        return rng.standard_normal((args.max_docs, args.dims), dtype=np.float32)
+    cache = EmbeddingCache(args.embedding_cache_dir, EMBEDDING_MODEL_ID, TRUNCATE_INPUT_TOKENS,
+                           dims=args.dims, readonly=True)
+    return cache.vectors(args.max_docs)
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def exact_neighbours(corpus, queries, k, block_size=100000):
+    """Ids of the k nearest corpus vectors of every query by exact cosine similarity."""
+    queries = normalize(queries)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    # Scored in blocks so a corpus of millions of vectors needs no queries x corpus matrix
+    for start in range(0, len(corpus), block_size):
+        scores = queries @ normalize(corpus[start:start + block_size]).T
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + scores.shape[1] - k),
+                                                         (len(queries), scores.shape[1] - k))], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return [set(row.tolist()) for row in best_ids]
+
+def measure_queries(es, index_name, queries, truth, args, num_candidates=None):
+    """
+    Recall@k and latencies of kNN queries with num_candidates, or of exact
+    script_score queries when num_candidates is None.
+    """
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        if num_candidates is None:
+            search = {"query": {"script_score": {
+                "query": {"match_all": {}},
+                "script": {
+                    "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
+                    "params": {"query_vector": query.tolist()}
+                }
+            }}}
+        else:
+            search = {"knn": {
+                "field": "vector",
+                "query_vector": query.tolist(),
+                "k": args.k,
+                "num_candidates": num_candidates
+            }}
+        start = time.perf_counter()
+        response = es.search(index=index_name, size=args.k, source=False, **search)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(hit["_id"]) for hit in response["hits"]["hits"]}
+        recalls.append(len(found & expected) / len(expected))
+    return {
+        "num_candidates": num_candidates if num_candidates is not None else "exact",
+        "recall": float(np.mean(recalls)),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95)
+    }
+
+def benchmark_setting(es, index_name, index_type, corpus, queries, truth, args):
+    """
+    Index the corpus with one vector storage setting and measure it.
+
+    Returns:
+        list: Index size, recall@k and query latencies of the setting for
+            every num_candidates, and for exact search with --exact
+    """
+    vector_mapping = build_vector_mapping(index_type, args.m, args.ef_construction, dims=corpus.shape[1])
+    es.indices.create(
+        index=index_name,
+        mappings={"_source": {"excludes": ["vector"]}, "properties": {"vector": vector_mapping}},
+        settings={"number_of_shards": 1, "number_of_replicas": 0, "refresh_interval": "-1"}
+    )
+    try:
+        start = time.perf_counter()
+        bulk(es, ({"_index": index_name, "_id": str(i), "_source": {"vector": vector.tolist()}}
+                  for i, vector in enumerate(corpus)), chunk_size=500)
+        es.indices.refresh(index=index_name)
+        es.options(request_timeout=3600).indices.forcemerge(index=index_name, max_num_segments=1)
+        index_seconds = time.perf_counter() - start
+
+        stats = es.indices.stats(index=index_name, metric="store")
+        size_bytes = stats["indices"][index_name]["total"]["store"]["size_in_bytes"]
+
+        runs = [measure_queries(es, index_name, queries, truth, args, num_candidates)
+                for num_candidates in args.num_candidates]
+        if args.exact:
+            runs.append(measure_queries(es, index_name, queries, truth, args))
+
+        return [
+            dict(run, index_type=index_type, size_mb=size_bytes / (1024 * 1024), index_seconds=index_seconds)
+            for run in runs
+        ]
+    finally:
+        if not args.keep_indices:
+            es.indices.delete(index=index_name)
+
+def main():
+    """
+    Compare index size, recall@k and kNN latency of the vector storage settings.
+
+    Every setting is queried with each --num-candidates, and with --exact
+    also with the brute-force script_score query kNN search replaced, to
+    chart latency against recall, e.g. on a million synthetic chunks:
+    --synthetic --max-docs 1000000 --num-candidates 50 100 200 400 --exact
+    """
+    parser = argparse.ArgumentParser(description='Benchmark HNSW vector storage settings')
+    parser.add_argument('--index-types', nargs='+', choices=VECTOR_INDEX_TYPES, default=list(VECTOR_INDEX_TYPES),
+                        help='Vector storage settings to compare')
+    parser.add_argument('--m', type=int, default=DEFAULT_HNSW_M, help='HNSW neighbours per node')
+    parser.add_argument('--ef-construction', type=int, default=DEFAULT_HNSW_EF_CONSTRUCTION,
+                        help='HNSW candidates considered while building the graph')
+    parser.add_argument('--k', type=int, default=10, help='Number of neighbours retrieved per query')
+    parser.add_argument('--num-candidates', type=int, nargs='+', default=[100],
+                        help='kNN candidates per shard, one measurement per value')
+    parser.add_argument('--exact', action='store_true',
+                        help='Also measure exact script_score search over every vector')
+    parser.add_argument('--queries', type=int, default=100, help='Number of corpus vectors held out as queries')
+    parser.add_argument('--max-docs', type=int, default=20000, help='Maximum number of vectors indexed')
+    parser.add_argument('--dims', type=int, default=768, help='Vector dimensions')
+    parser.add_argument('--embedding-cache-dir', default=EMBEDDING_CACHE_DIR,
+                        help='Embedding cache to take the benchmark vectors from')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Use random vectors instead of the embedding cache')
+    parser.add_argument('--keep-indices', action='store_true', help='Keep the benchmark indices')
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    if len(vectors) <= args.queries + args.k:
+        logger.error(f"Need more than {args.queries + args.k} vectors, found {len(vectors)}")
+        return
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_neighbours(corpus, queries, args.k)
+    logger.info(f"Benchmarking {len(corpus)} vectors with {len(queries)} queries")
+
+    es = Elasticsearch(
+        ES_URL,
+        basic_auth=(ES_USER, ES_PASSWORD),
+        verify_certs=True,
+        ssl_assert_fingerprint=ES_CERT_FINGERPRINT,
+        request_timeout=30,
+        retry_on_timeout=True,
+        max_retries=3
+    )
+
+    results = []
+    for index_type in args.index_types:
+        index_name = f"{MEDICAL_JOURNAL_INDEX_NAME}_bench_{index_type}"
+        logger.info(f"Benchmarking {index_type} in {index_name}...")
+        results.extend(benchmark_setting(es, index_name, index_type, corpus, queries, truth, args))
+
+    print(f"{'setting':<12}{'size MB':>10}{'index s':>10}{'candidates':>12}{f'recall@{args.k}':>12}"
+          f"{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        print(f"{result['index_type']:<12}{result['size_mb']:>10.1f}{result['index_seconds']:>10.1f}"
+              f"{result['num_candidates']:>12}{result['recall']:>12.3f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import logging
+from elasticsearch.helpers import parallel_bulk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 2
+
+def stream_bulk(es, actions, chunk_size=DEFAULT_CHUNK_SIZE, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES,
+                max_in_flight=DEFAULT_MAX_IN_FLIGHT, on_indexed=None):
+    """
+    Index a stream of bulk actions with bounded memory.
+
+    Actions are pulled from the iterable only as fast as Elasticsearch
+    accepts them: requests are flushed every chunk_size actions or
+    max_chunk_bytes bytes, whichever comes first, with at most max_in_flight
+    requests being sent and max_in_flight more waiting in the queue.
+
+    Args:
+        es: Elasticsearch client
+        actions: Iterable (usually a generator) of bulk actions
+        chunk_size (int): Maximum number of actions per bulk request
+        max_chunk_bytes (int): Maximum size of a bulk request in bytes
+        max_in_flight (int): Number of concurrent bulk requests
+        on_indexed (callable): Called with lists of acknowledged document
+            ids, at most chunk_size at a time
+
+    Returns:
+        dict: Number of "indexed" items and the "failed" items, each with
+            the document "_id" and the "error" reported by Elasticsearch
+    """
+    indexed = 0
+    failed = []
+    acked = []
+    for success, item in parallel_bulk(
+        es,
+        actions,
+        thread_count=max_in_flight,
+        queue_size=max_in_flight,
+        chunk_size=chunk_size,
+        max_chunk_bytes=max_chunk_bytes,
+        raise_on_error=False,
+        raise_on_exception=False
+    ):
+        if success:
+            indexed += 1
+            if on_indexed is not None:
+                acked.append(next(iter(item.values()), {}).get("_id"))
+                if len(acked) >= chunk_size:
+                    on_indexed(acked)
+                    acked = []
+            continue
+        # Items are keyed by their op type, e.g. {"index": {"_id": ..., "error": ...}}
+        info = next(iter(item.values()), {})
+        failed.append({"_id": info.get("_id"), "error": info.get("error", info.get("exception"))})
+    if acked:
+        on_indexed(acked)
+    if failed:
+        logger.warning(f"{len(failed)} of {indexed + len(failed)} bulk items failed")
+    return {"indexed": indexed, "failed": failed}
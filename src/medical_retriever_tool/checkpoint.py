@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IngestCheckpoint:
+    """
+    Append-only journal of ingestion progress for resuming a crashed run.
+
+    The first line describes the run (mode, target index and settings
+    fingerprint). After that, a "chunks" line is appended for every group
+    of chunk ids Elasticsearch acknowledged, and a "document" line when all
+    chunks of a PDF are indexed, with the near-duplicate signatures of its
+    chunks when dedup is on. Every line is flushed and fsynced, so after
+    a crash the journal holds everything that was acknowledged; a torn last
+    line is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.run = None
+        self.documents = {}
+        self.chunks = {}
+        self.signatures = {}
+        self._file = None
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring unreadable line {line_number} of checkpoint {self.path}")
+                    continue
+                event = entry.get("event")
+                if event == "run":
+                    self.run = entry
+                elif event == "chunks":
+                    self.chunks.setdefault(entry["pdf_sha256"], set()).update(entry["ids"])
+                elif event == "document":
+                    self.documents[entry["pdf_sha256"]] = entry["source_pdf"]
+                    self.signatures.update(entry.get("signatures", {}))
+
+    def _append(self, event, **fields):
+        self._file.write(json.dumps({"event": event, "ts": time.time(), **fields}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def start(self, mode, index_name, settings_key):
+        """Start a new journal for a run, discarding previous progress."""
+        self.close()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.documents = {}
+        self.chunks = {}
+        self.signatures = {}
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._append("run", mode=mode, index_name=index_name, settings=settings_key)
+        self.run = {"mode": mode, "index_name": index_name, "settings": settings_key}
+
+    def resume(self):
+        """Keep appending to the journal of the interrupted run."""
+        if self.run is None:
+            raise ValueError(f"No run to resume in {self.path}")
+        # Cut a line torn by the crash, or the next record would be appended to it
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+                f.flush()
+                os.fsync(f.fileno())
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def record_chunks(self, pdf_sha256, ids):
+        """Record chunk ids acknowledged by Elasticsearch."""
+        if not ids:
+            return
+        self.chunks.setdefault(pdf_sha256, set()).update(ids)
+        self._append("chunks", pdf_sha256=pdf_sha256, ids=list(ids))
+
+    def record_document(self, source_pdf, pdf_sha256, signatures=None):
+        """
+        Record that every chunk of a PDF is indexed.
+
+        signatures are the near-duplicate signatures of the PDF's chunks
+        (see NearDuplicateIndex.export), so a resumed run matches later
+        chunks against them as the interrupted run did.
+        """
+        self.documents[pdf_sha256] = source_pdf
+        if signatures:
+            self.signatures.update(signatures)
+            self._append("document", source_pdf=source_pdf, pdf_sha256=pdf_sha256, signatures=signatures)
+        else:
+            self._append("document", source_pdf=source_pdf, pdf_sha256=pdf_sha256)
+
+    def is_document_done(self, pdf_sha256):
+        return pdf_sha256 in self.documents
+
+    def acked_chunks(self, pdf_sha256):
+        """Ids of the chunks of a PDF already acknowledged by Elasticsearch."""
+        return self.chunks.get(pdf_sha256, set())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """Remove the journal after a run completed."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.run = None
+        self.documents = {}
+        self.chunks = {}
+        self.signatures = {}
@@ -0,0 +1,303 @@
+import os
+import time
+import logging
+import multiprocessing
+from collections import deque
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Version of the dict produced by extract_document, part of the conversion cache key
+EXTRACT_FORMAT_VERSION = 2
+
+# Converter owned by a pool worker process, built once by _init_worker
+_worker_converter = None
+
+def build_pipeline_options():
+    """Return the Docling PDF pipeline options used by the indexer."""
+    # Docling is imported on first use: it takes seconds to import and the pool only needs it in workers
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+
+    return PdfPipelineOptions(
+        do_table_structure=True,
+        do_figure_caption=True,
+        do_image_ocr=True,
+        do_image_annotation=True
+    )
+
+def conversion_cache_version():
+    """Installed Docling version and extract format, part of the conversion cache key."""
+    try:
+        docling_version = metadata.version("docling")
+    except metadata.PackageNotFoundError:
+        docling_version = ""
+    return f"{docling_version}/{EXTRACT_FORMAT_VERSION}"
+
+def build_converter(pipeline_options=None):
+    """Create a Docling converter for PDFs."""
+    from docling.datamodel.base_models import InputFormat
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    if pipeline_options is None:
+        pipeline_options = build_pipeline_options()
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+def extract_document(document):
+    """
+    Pull the parts of a DoclingDocument the indexer needs into plain data.
+
+    Args:
+        document: Converted DoclingDocument
+
+    Returns:
+        dict: name, page count, per-page markdown as (page number, markdown)
+            pairs, tables and images of the document
+    """
+    tables = []
+    if hasattr(document, 'tables'):
+        for i, table in enumerate(document.tables):
+            tables.append({
+                "table_index": i,
+                "content": str(table.content) if hasattr(table, 'content') else "",
+                "structure": str(table.structure) if hasattr(table, 'structure') else "",
+                "page_number": table.prov[0].page_no if hasattr(table, 'prov') and len(table.prov) > 0 else 0
+            })
+
+    images = []
+    for picture in document.pictures:
+        if picture.prov and len(picture.prov) > 0:
+            images.append({
+                "page_number": picture.prov[0].page_no,
+                "has_image": True,
+                "caption": picture.caption if hasattr(picture, 'caption') else "",
+                "description": picture.description if hasattr(picture, 'description') else "",
+                "ocr_text": picture.ocr_text if hasattr(picture, 'ocr_text') else "",
+                "image_type": "figure",
+                "position": "unknown"
+            })
+
+    page_numbers = sorted(document.pages) if getattr(document, 'pages', None) else []
+    if page_numbers:
+        markdown_pages = [[page_no, document.export_to_markdown(page_no=page_no)] for page_no in page_numbers]
+    else:
+        markdown_pages = [[0, document.export_to_markdown()]]
+
+    return {
+        "name": document.name if hasattr(document, 'name') else None,
+        "num_pages": len(page_numbers),
+        "markdown_pages": markdown_pages,
+        "tables": tables,
+        "images": images
+    }
+
+def convert_pdf(converter, pdf_file):
+    """
+    Convert a single PDF and extract its content.
+
+    Args:
+        converter: Docling DocumentConverter to use
+        pdf_file (str): Path to the PDF
+
+    Returns:
+        dict: Conversion result with the extracted document (or None), an
+            error message (or None), page count, duration and worker pid
+    """
+    converted = _conversion_result(pdf_file)
+    if not os.path.exists(pdf_file):
+        converted["error"] = f"PDF file not found: {pdf_file}"
+        return converted
+    if os.path.getsize(pdf_file) == 0:
+        converted["error"] = f"PDF file is empty: {pdf_file}"
+        return converted
+
+    start = time.perf_counter()
+    try:
+        result = converter.convert(pdf_file)
+        if not result or not result.document:
+            converted["error"] = f"No content extracted from {pdf_file}"
+        else:
+            converted["document"] = extract_document(result.document)
+            converted["num_pages"] = converted["document"]["num_pages"]
+    except Exception as e:
+        converted["error"] = f"Error converting {pdf_file}: {str(e)}"
+    converted["duration"] = time.perf_counter() - start
+    return converted
+
+def _conversion_result(pdf_file, error=None):
+    return {
+        "pdf_file": pdf_file,
+        "document": None,
+        "error": error,
+        "cached": False,
+        "num_pages": 0,
+        "duration": 0.0,
+        "worker": os.getpid()
+    }
+
+def _init_worker():
+    """Build the worker's converter once so layout models stay loaded."""
+    from docling.datamodel.base_models import InputFormat
+
+    global _worker_converter
+    _worker_converter = build_converter()
+    try:
+        _worker_converter.initialize_pipeline(InputFormat.PDF)
+    except Exception as e:
+        # Models are loaded lazily on the first conversion instead
+        logger.warning(f"Could not warm up Docling pipeline in worker {os.getpid()}: {str(e)}")
+
+def _convert_in_worker(pdf_file):
+    return convert_pdf(_worker_converter, pdf_file)
+
+def iter_converted_pdfs(pdf_files, workers=1, cache=None, pdf_hashes=None):
+    """
+    Convert PDFs and yield results as they finish.
+
+    With workers > 1 a process pool is used where each worker keeps its own
+    warm converter. At most two conversions per worker are queued at a time
+    so finished documents never pile up in the parent. A PDF whose
+    conversion raises, or kills its worker process, is yielded with an
+    error like any other failed conversion; see _convert_in_pool. When a
+    conversion
+    cache is given, PDFs already in it are not converted again and new
+    conversions are added to it.
+
+    Args:
+        pdf_files (list): Paths of the PDFs to convert
+        workers (int): Number of worker processes
+        cache (ConversionCache): Optional cache of converted documents
+        pdf_hashes (dict): PDF path -> content sha256, required with a cache
+
+    Yields:
+        dict: Conversion results, see convert_pdf
+    """
+    to_convert = pdf_files
+    if cache is not None:
+        to_convert = []
+        for pdf_file in pdf_files:
+            document = cache.get(pdf_hashes[pdf_file])
+            if document is None:
+                to_convert.append(pdf_file)
+                continue
+            yield {
+                "pdf_file": pdf_file,
+                "document": document,
+                "error": None,
+                "cached": True,
+                "num_pages": document["num_pages"],
+                "duration": 0.0,
+                "worker": os.getpid()
+            }
+
+    for converted in _convert_all(to_convert, workers):
+        if cache is not None and converted["document"] is not None:
+            try:
+                cache.put(pdf_hashes[converted["pdf_file"]], converted["document"])
+            except Exception as e:
+                logger.warning(f"Could not cache conversion of {converted['pdf_file']}: {str(e)}")
+        yield converted
+
+def _convert_all(pdf_files, workers):
+    if not pdf_files:
+        return
+    if workers <= 1:
+        converter = build_converter()
+        for pdf_file in pdf_files:
+            yield convert_pdf(converter, pdf_file)
+        return
+
+    # Spawn rather than fork so workers do not inherit torch/thread state
+    context = multiprocessing.get_context("spawn")
+    yield from _convert_in_pool(
+        pdf_files,
+        lambda: ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker),
+        _convert_in_worker,
+        max_pending=workers * 2
+    )
+
+def _convert_in_pool(pdf_files, make_pool, convert, max_pending):
+    """
+    Convert PDFs with convert in a pool from make_pool, at most max_pending at a time.
+
+    An exception from a conversion is yielded as that PDF's error. When a
+    worker process dies, e.g. killed for running out of memory or crashed
+    by a bad PDF, the pool is broken and every conversion in flight fails
+    with BrokenProcessPool: the pool is replaced, and those PDFs are
+    converted again one at a time, so only a PDF that kills a worker on
+    its own is reported as failed.
+    """
+    queue = deque(pdf_files)
+    # PDFs in flight when a worker died
+    suspects = deque()
+    pool = make_pool()
+    pending = {}
+    try:
+        while queue or suspects or pending:
+            if suspects:
+                if not pending:
+                    pdf_file = suspects.popleft()
+                    pending[pool.submit(convert, pdf_file)] = (pdf_file, True)
+            else:
+                while queue and len(pending) < max_pending:
+                    pdf_file = queue.popleft()
+                    pending[pool.submit(convert, pdf_file)] = (pdf_file, False)
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                pdf_file, alone = pending.pop(future)
+                try:
+                    converted = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if not alone:
+                        suspects.append(pdf_file)
+                        continue
+                    converted = _conversion_result(pdf_file, f"Conversion worker died converting {pdf_file}")
+                except Exception as e:
+                    converted = _conversion_result(pdf_file, f"Error converting {pdf_file}: {str(e)}")
+                yield converted
+
+            if broken:
+                logger.warning(f"A conversion worker died, restarting the pool and retrying "
+                               f"{len(suspects) + len(pending)} PDFs one at a time")
+                suspects.extend(pdf_file for pdf_file, _ in pending.values())
+                pending = {}
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = make_pool()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+class ConversionStats:
+    """Per-worker conversion throughput."""
+
+    def __init__(self):
+        self.workers = {}
+        self.cached = 0
+
+    def add(self, converted):
+        if converted["cached"]:
+            self.cached += 1
+            return
+        stats = self.workers.setdefault(converted["worker"], {"files": 0, "pages": 0, "seconds": 0.0})
+        stats["files"] += 1
+        stats["pages"] += converted["num_pages"]
+        stats["seconds"] += converted["duration"]
+
+    def report_lines(self):
+        lines = []
+        for worker, stats in sorted(self.workers.items()):
+            pages_per_sec = stats["pages"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+            lines.append(
+                f"Worker {worker}: {stats['files']} files, {stats['pages']} pages "
+                f"in {stats['seconds']:.1f}s ({pages_per_sec:.2f} pages/sec)"
+            )
+        if self.cached:
+            lines.append(f"Conversion cache: {self.cached} files reused")
+        return lines
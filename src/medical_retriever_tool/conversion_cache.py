@@ -0,0 +1,54 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ConversionCache:
+    """
+    Extracted Docling documents stored on disk.
+
+    Entries are keyed by the PDF content hash and a fingerprint of the
+    pipeline options, Docling version and extract format, so re-running
+    chunking with new splitter or cleanup settings does not re-run layout
+    analysis, table structure or picture handling. Each entry is the gzipped JSON of the
+    dict returned by conversion.extract_document.
+    """
+
+    def __init__(self, cache_dir, pipeline_options, version=""):
+        self.cache_dir = cache_dir
+        options = pipeline_options.model_dump_json() if hasattr(pipeline_options, 'model_dump_json') else str(pipeline_options)
+        self.options_key = hashlib.sha256(f"{version}\0{options}".encode('utf-8')).hexdigest()[:16]
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, pdf_sha256):
+        return os.path.join(self.cache_dir, f"{pdf_sha256}_{self.options_key}.json.gz")
+
+    def get(self, pdf_sha256):
+        """Return the cached document for a PDF hash, or None."""
+        path = self._path(pdf_sha256)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                document = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable conversion cache entry {path}: {str(e)}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return document
+
+    def put(self, pdf_sha256, document):
+        """Store a converted document, replacing any previous entry atomically."""
+        path = self._path(pdf_sha256)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            # Docling may hand back non-JSON values for captions; store them as text
+            json.dump(document, f, default=str)
+        os.replace(tmp_path, path)
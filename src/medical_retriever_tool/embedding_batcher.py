@@ -0,0 +1,76 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from embedding_client import is_retryable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_IN_FLIGHT = 4
+
+def _embed_batch(embeddings, texts, max_retries, retry_delay, on_batch=None):
+    """
+    Embed one batch, retrying only this batch on failure.
+
+    A batch that keeps failing is split in half so one bad input does not
+    lose the vectors of the rest of the batch. Batches failing with quota,
+    server or connection errors are not split: halves would fail the same
+    way, with twice the requests.
+
+    Returns:
+        list: One vector per text, None where embedding failed
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            start = time.perf_counter()
+            vectors = embeddings.embed_documents(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Expected {len(texts)} vectors, got {len(vectors)}")
+            if on_batch is not None:
+                on_batch(time.perf_counter() - start, len(texts), attempt + 1)
+            return vectors
+        except Exception as e:
+            error = e
+            logger.warning(f"Embedding batch of {len(texts)} failed (attempt {attempt + 1}/{max_retries + 1}): {str(e)}")
+            if attempt < max_retries:
+                time.sleep(retry_delay * (2 ** attempt))
+
+    if len(texts) == 1:
+        logger.error("Giving up on embedding a single text after retries")
+        return [None]
+    if is_retryable(error):
+        logger.error(f"Giving up on embedding a batch of {len(texts)} after retries: {str(error)}")
+        return [None] * len(texts)
+    middle = len(texts) // 2
+    return (_embed_batch(embeddings, texts[:middle], max_retries, retry_delay, on_batch)
+            + _embed_batch(embeddings, texts[middle:], max_retries, retry_delay, on_batch))
+
+def embed_in_batches(embeddings, texts, batch_size=DEFAULT_BATCH_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                     max_retries=3, retry_delay=1.0, on_batch=None):
+    """
+    Embed texts with embed_documents in batches, several requests at a time.
+
+    Args:
+        embeddings: Object with an embed_documents(texts) method
+        texts (list): Texts to embed
+        batch_size (int): Number of texts per embedding request
+        max_in_flight (int): Maximum number of concurrent requests
+        max_retries (int): Retries per batch before it is split or, after
+            transient errors, given up
+        retry_delay (float): Initial delay between retries in seconds
+        on_batch (callable): Called with (seconds, size, attempts) for each
+            successful request
+
+    Returns:
+        list: Vectors in the same order as texts, None for texts that could
+            not be embedded
+    """
+    if not texts:
+        return []
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        results = pool.map(lambda batch: _embed_batch(embeddings, batch, max_retries, retry_delay, on_batch), batches)
+        vectors = []
+        for batch_vectors in results:
+            vectors.extend(batch_vectors)
+    return vectors
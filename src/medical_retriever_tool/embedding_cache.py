@@ -0,0 +1,272 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 32
+INITIAL_CAPACITY = 1024
+
+def embedding_key(model_id, truncate_input_tokens, text):
+    """Cache key of a text embedded with a given model and truncation setting."""
+    digest = hashlib.sha256()
+    digest.update(f"{model_id}\0{truncate_input_tokens}\0".encode('utf-8'))
+    digest.update(text.encode('utf-8'))
+    return digest.digest()
+
+class EmbeddingCache:
+    """
+    On-disk store of embedding vectors keyed by (model, truncation, text hash).
+
+    Vectors live in a memory-mapped float32 or float16 matrix. A parallel
+    memory-mapped array holds the 32-byte key of each slot and another the
+    last time the slot was used, so the key index is rebuilt from disk on
+    open without parsing any text. When max_entries is reached the least
+    recently used tenth of the entries is evicted.
+
+    The cache is safe to share between threads. Only one process should
+    open it for writing at a time; other processes can open it read-only.
+    """
+
+    def __init__(self, cache_dir, model_id, truncate_input_tokens, dims=768, dtype="float32",
+                 max_entries=1_000_000, readonly=False):
+        self.cache_dir = cache_dir
+        self.model_id = model_id
+        self.truncate_input_tokens = truncate_input_tokens
+        self.max_entries = max_entries
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._meta_path = os.path.join(cache_dir, "meta.json")
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["dims"] != dims or meta["dtype"] != dtype:
+                raise ValueError(
+                    f"Embedding cache in {cache_dir} stores {meta['dims']}-dim {meta['dtype']} vectors, "
+                    f"expected {dims}-dim {dtype}"
+                )
+            self._capacity = meta["capacity"]
+            self._clock = meta["clock"]
+        elif readonly:
+            raise FileNotFoundError(f"No embedding cache in {cache_dir}")
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._capacity = 0
+            self._clock = 0
+        self.dims = dims
+        self.dtype = np.dtype(dtype)
+
+        self._open(self._capacity)
+        self._slots = {}
+        self._free = []
+        for slot in range(self._capacity):
+            if self._ticks[slot]:
+                self._slots[self._keys[slot].tobytes()] = slot
+            else:
+                self._free.append(slot)
+        self._free.reverse()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _open(self, capacity):
+        """Map the slot arrays, growing the files to capacity slots."""
+        mode = 'r' if self.readonly else 'r+'
+        arrays = [
+            ("vectors.dat", self.dtype, (capacity, self.dims)),
+            ("keys.dat", np.dtype(f"V{KEY_BYTES}"), (capacity,)),
+            ("ticks.dat", np.dtype(np.uint64), (capacity,))
+        ]
+        mapped = []
+        for name, dtype, shape in arrays:
+            path = self._path(name)
+            size = int(np.prod(shape)) * dtype.itemsize
+            if not self.readonly:
+                with open(path, 'ab') as f:
+                    if f.tell() < size:
+                        f.truncate(size)
+            if capacity == 0:
+                mapped.append(np.zeros(shape, dtype=dtype))
+            else:
+                mapped.append(np.memmap(path, dtype=dtype, mode=mode, shape=shape))
+        self._vectors, self._keys, self._ticks = mapped
+
+    def _grow(self):
+        new_capacity = min(self.max_entries, max(INITIAL_CAPACITY, self._capacity * 2))
+        if new_capacity <= self._capacity:
+            return False
+        self._flush_arrays()
+        self._vectors = self._keys = self._ticks = None
+        self._open(new_capacity)
+        self._free.extend(reversed(range(self._capacity, new_capacity)))
+        self._capacity = new_capacity
+        # The header follows the grown files right away, not at the next flush
+        self._flush_arrays()
+        self._write_meta()
+        return True
+
+    def _evict(self):
+        """Free the least recently used tenth of the slots."""
+        count = max(1, self._capacity // 10)
+        oldest = np.argpartition(self._ticks, count - 1)[:count]
+        for slot in oldest:
+            self._slots.pop(self._keys[slot].tobytes(), None)
+            self._ticks[slot] = 0
+            self._free.append(int(slot))
+        logger.info(f"Evicted {count} embeddings from cache")
+
+    def _allocate(self):
+        if not self._free and not self._grow():
+            self._evict()
+        return self._free.pop()
+
+    def _key(self, text):
+        return embedding_key(self.model_id, self.truncate_input_tokens, text)
+
+    def get_many(self, texts):
+        """
+        Look up vectors for texts.
+
+        Returns:
+            list: float32 vector lists, None for texts not in the cache
+        """
+        vectors = []
+        with self._lock:
+            for text in texts:
+                key = self._key(text)
+                slot = self._slots.get(key)
+                vector = None
+                if slot is not None:
+                    vector = self._vectors[slot].astype(np.float32)
+                    if self.readonly and not self._holds(slot, key):
+                        vector = None
+                if vector is None:
+                    self.misses += 1
+                    vectors.append(None)
+                    continue
+                self.hits += 1
+                if not self.readonly:
+                    self._clock += 1
+                    self._ticks[slot] = self._clock
+                vectors.append(vector.tolist())
+        return vectors
+
+    def _holds(self, slot, key):
+        """
+        Whether slot still holds key, for read-only caches.
+
+        The writer process evicts entries and reuses their slots, so the
+        slot index built on open can go stale. The writer stores a slot's
+        key before its vector and never rewrites a vector in place, so a
+        key that still matches after the vector was read means the vector
+        is the key's and complete.
+        """
+        if self._keys[slot].tobytes() == key:
+            return True
+        del self._slots[key]
+        return False
+
+    def vectors(self, limit=None):
+        """Stored vectors as a float32 matrix, at most limit rows, in slot order."""
+        with self._lock:
+            slots = sorted(self._slots.values())[:limit]
+            return self._vectors[slots].astype(np.float32)
+
+    def put_many(self, texts, vectors):
+        """Store vectors for texts, skipping None vectors."""
+        if self.readonly:
+            return
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                if vector is None:
+                    continue
+                key = self._key(text)
+                previous = self._slots.get(key)
+                # A new vector of a stored key goes to a fresh slot as well, so readers of
+                # the previous slot never see it half rewritten
+                slot = self._allocate()
+                # Before the vector: read-only processes check the key after reading the vector
+                self._keys[slot] = np.frombuffer(key, dtype=self._keys.dtype)[0]
+                self._vectors[slot] = vector
+                self._clock += 1
+                self._ticks[slot] = self._clock
+                self._slots[key] = slot
+                if previous is not None and previous != slot and self._ticks[previous]:
+                    # Unless evicted to make room
+                    self._ticks[previous] = 0
+                    self._free.append(previous)
+
+    def _flush_arrays(self):
+        for array in (self._vectors, self._keys, self._ticks):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def flush(self):
+        """Persist vectors and the key index."""
+        if self.readonly:
+            return
+        with self._lock:
+            self._flush_arrays()
+            self._write_meta()
+
+    def _write_meta(self):
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "dims": self.dims,
+                "dtype": self.dtype.name,
+                "capacity": self._capacity,
+                "clock": self._clock
+            }, f)
+        os.replace(tmp_path, self._meta_path)
+
+class CachedEmbeddings:
+    """Embeddings client wrapper that serves vectors from an EmbeddingCache."""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            embedded = self.embeddings.embed_documents(missing_texts)
+            self.cache.put_many(missing_texts, embedded)
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if hasattr(self.embeddings, 'aembed_documents'):
+                embedded = await self.embeddings.aembed_documents(missing_texts)
+            else:
+                embedded = await asyncio.to_thread(self.embeddings.embed_documents, missing_texts)
+            self.cache.put_many(missing_texts, embedded)
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+        return vectors
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+    def flush(self):
+        self.cache.flush()
@@ -0,0 +1,231 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import weakref
+import threading
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_ID = "ibm/slate-125m-english-rtrvr-v2"
+TRUNCATE_INPUT_TOKENS = 500
+
+# Request quota of the watsonx.ai plan, shared by every client in the process
+DEFAULT_REQUESTS_PER_SECOND = 8.0
+DEFAULT_BURST = 8
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+_shared_bucket = None
+_shared_bucket_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter safe to share between threads and coroutines.
+
+    Tokens refill continuously at rate per second up to capacity, so short
+    bursts of up to capacity requests go out at once and the long-run rate
+    never exceeds rate.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Take tokens if available, else return the seconds until they are."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0.0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """Wait without blocking the event loop until tokens are available."""
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
+
+def get_token_bucket():
+    """
+    Process-wide token bucket for watsonx.ai requests.
+
+    Sized from WATSONX_REQUESTS_PER_SECOND and WATSONX_BURST so that every
+    embedding client in the process draws from the same quota.
+    """
+    global _shared_bucket
+    with _shared_bucket_lock:
+        if _shared_bucket is None:
+            _shared_bucket = TokenBucket(
+                float(os.getenv("WATSONX_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND)),
+                float(os.getenv("WATSONX_BURST", DEFAULT_BURST))
+            )
+        return _shared_bucket
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "status_code", None)
+
+def is_retryable(error):
+    """True for quota (429), server (5xx) and connection errors."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    if isinstance(error, (httpx.TransportError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          ConnectionError, TimeoutError)):
+        return True
+    # Some client versions only carry the status in the message
+    return "Too Many Requests" in str(error)
+
+def backoff_delay(error, attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """
+    Seconds to wait before retry number attempt.
+
+    Uses the server's Retry-After when given, otherwise exponential backoff
+    with full jitter so clients throttled together do not retry together.
+    """
+    response = getattr(error, "response", None)
+    retry_after = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(max_delay, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+class RateLimitedEmbeddings:
+    """
+    Embeddings client wrapper with quota-aware concurrency control.
+
+    Every request waits for a token of the shared token bucket and a slot
+    of max_in_flight, and requests answered with 429, 5xx or a connection
+    error are retried with jittered backoff. The async methods await the
+    client's own aembed_documents and aembed_query, and only run a client
+    without them in a worker thread. Each event loop using them gets its
+    own max_in_flight slots, while the token bucket is shared by all.
+    """
+
+    def __init__(self, embeddings, bucket=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.embeddings = embeddings
+        self.bucket = bucket if bucket is not None else get_token_bucket()
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled = 0
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        # asyncio semaphores are bound to the loop they first wait on
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    def _call(self, method, *args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._semaphore:
+                    self.bucket.acquire()
+                    return getattr(self.embeddings, method)(*args)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.throttled += 1
+                delay = backoff_delay(e, attempt, self.base_delay, self.max_delay)
+                logger.warning(f"watsonx.ai {method} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _loop_semaphore(self):
+        """Async semaphore of the running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return semaphore
+
+    async def _acall(self, method, *args):
+        semaphore = self._loop_semaphore()
+        native = getattr(self.embeddings, f"a{method}", None)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    await self.bucket.acquire_async()
+                    if native is not None:
+                        return await native(*args)
+                    return await asyncio.to_thread(getattr(self.embeddings, method), *args)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.throttled += 1
+                delay = backoff_delay(e, attempt, self.base_delay, self.max_delay)
+                logger.warning(f"watsonx.ai {method} failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def embed_documents(self, texts):
+        return self._call("embed_documents", texts)
+
+    def embed_query(self, text):
+        return self._call("embed_query", text)
+
+    async def aembed_documents(self, texts):
+        return await self._acall("embed_documents", texts)
+
+    async def aembed_query(self, text):
+        return await self._acall("embed_query", text)
+
+def initialize_watsonx(max_in_flight=DEFAULT_MAX_IN_FLIGHT, **options):
+    """
+    Initialize the IBM watsonx.ai embedding model behind the shared rate limiter.
+
+    Credentials are read from IBM_CLOUD_API_KEY, IBM_CLOUD_ENDPOINT and
+    IBM_CLOUD_PROJECT_ID.
+
+    Args:
+        max_in_flight (int): Maximum number of concurrent requests of this client
+        options: Retry settings passed on to RateLimitedEmbeddings
+
+    Returns:
+        RateLimitedEmbeddings: Embedding client
+    """
+    # Imported here: ibm_watsonx_ai takes about half a second to import
+    from ibm_watsonx_ai.foundation_models import Embeddings
+    from ibm_watsonx_ai.metanames import EmbedTextParamsMetaNames as EmbedParams
+
+    embed_params = {
+        EmbedParams.TRUNCATE_INPUT_TOKENS: TRUNCATE_INPUT_TOKENS,  # Restrict to 500 tokens
+        EmbedParams.RETURN_OPTIONS: {
+            'input_text': True
+        }
+    }
+    credentials = {
+        "url": os.getenv("IBM_CLOUD_ENDPOINT"),
+        "apikey": os.getenv("IBM_CLOUD_API_KEY"),
+    }
+    embedding = Embeddings(
+        model_id=EMBEDDING_MODEL_ID,
+        credentials=credentials,
+        params=embed_params,
+        project_id=os.getenv("IBM_CLOUD_PROJECT_ID"),
+        max_retries=0  # Retried with jitter by RateLimitedEmbeddings instead
+    )
+    return RateLimitedEmbeddings(embedding, max_in_flight=max_in_flight, **options)
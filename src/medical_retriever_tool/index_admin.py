@@ -0,0 +1,238 @@
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Settings applied while an index is bulk loaded and not yet searched
+BULK_LOAD_SETTINGS = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0
+}
+
+# HNSW vector storage modes: float32 vectors, or vectors quantized to int8/int4 in
+# the graph (int8_hnsw needs Elasticsearch 8.12, int4_hnsw 8.15)
+VECTOR_INDEX_TYPES = ("hnsw", "int8_hnsw", "int4_hnsw")
+DEFAULT_HNSW_M = 16
+DEFAULT_HNSW_EF_CONSTRUCTION = 100
+
+def build_vector_mapping(index_type="hnsw", m=DEFAULT_HNSW_M, ef_construction=DEFAULT_HNSW_EF_CONSTRUCTION, dims=768):
+    """
+    Mapping of the dense vector field.
+
+    Args:
+        index_type (str): One of VECTOR_INDEX_TYPES
+        m (int): HNSW neighbours per node
+        ef_construction (int): HNSW candidates considered while building the graph
+        dims (int): Vector dimensions
+
+    Returns:
+        dict: dense_vector mapping
+    """
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type {index_type}, expected one of {', '.join(VECTOR_INDEX_TYPES)}")
+    return {
+        "type": "dense_vector",
+        "dims": dims,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {
+            "type": index_type,
+            "m": m,
+            "ef_construction": ef_construction
+        }
+    }
+
+def build_index_body(vector_options=None):
+    """
+    Settings and mappings of a medical journal index.
+
+    The raw vector is kept out of _source: it is only searched through the
+    vector index and doc values, and storing the 768 floats again in every
+    document's _source roughly doubles the on-disk size of a chunk.
+
+    Args:
+        vector_options (dict): Keyword arguments for build_vector_mapping
+
+    Returns:
+        dict: "mappings" and "settings" of the index
+    """
+    settings = {
+        "number_of_shards": 3,
+        "number_of_replicas": 1,
+        "refresh_interval": "30s",
+        "analysis": {
+            "analyzer": {
+                "medical_text_analyzer": {
+                    "type": "custom",
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "stop", "snowball"]
+                }
+            }
+        }
+    }
+    
+    return {
+        "mappings": {
+            "_source": {
+                "excludes": ["vector", "image_text"]
+            },
+            "properties": {
+                "text": {
+                    "type": "text",
+                    "analyzer": "medical_text_analyzer",
+                    "fields": {
+                        "keyword": {
+                            "type": "keyword",
+                            "ignore_above": 256
+                        }
+                    }
+                },
+                # 768 dims to match IBM Watson slate-125m-english-rtrvr-v2
+                "vector": build_vector_mapping(**(vector_options or {})),
+                "source_pdf": {
+                    "type": "keyword"
+                },
+                "pdf_sha256": {
+                    "type": "keyword"
+                },
+                # Id of the page_assets document with the tables and images of the chunk's page
+                "assets_id": {
+                    "type": "keyword"
+                },
+                # Captions, descriptions and OCR text of the images on the chunk's page, for BM25 only:
+                # the images themselves are stored once in the page_assets document
+                "image_text": {
+                    "type": "object",
+                    "properties": {
+                        field: {"type": "text", "analyzer": "medical_text_analyzer"}
+                        for field in ("caption", "description", "ocr_text")
+                    }
+                },
+                # Id of the chunk this one near-duplicates; such chunks have no vector
+                "duplicate_of": {
+                    "type": "keyword"
+                },
+                "page_number": {
+                    "type": "integer"
+                },
+                "chunk_index": {
+                    "type": "integer"
+                },
+                "content_type": {
+                    "type": "keyword",
+                    "fields": {
+                        "text": {
+                            "type": "text",
+                            "analyzer": "medical_text_analyzer"
+                        }
+                    }
+                },
+                "metadata": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "text"},
+                        "author": {"type": "text"},
+                        "date": {"type": "date"},
+                        "keywords": {"type": "keyword"},
+                        "headings": {"type": "keyword"},
+                        "tables": {
+                            "type": "nested",
+                            "properties": {
+                                "table_index": {"type": "integer"},
+                                "content": {"type": "text", "analyzer": "medical_text_analyzer"},
+                                "structure": {"type": "text"},
+                                "page_number": {"type": "integer"}
+                            }
+                        },
+                        "images": {
+                            "type": "nested",
+                            "properties": {
+                                "page_number": {"type": "integer"},
+                                "has_image": {"type": "boolean"},
+                                "caption": {"type": "text", "analyzer": "medical_text_analyzer"},
+                                "description": {"type": "text", "analyzer": "medical_text_analyzer"},
+                                "ocr_text": {"type": "text", "analyzer": "medical_text_analyzer"},
+                                "image_type": {"type": "keyword"},
+                                "position": {"type": "keyword"}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        "settings": settings
+    }
+
+def new_index_name(alias):
+    """Name of a new versioned index behind alias."""
+    return f"{alias}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+
+def get_alias_indices(es, alias):
+    """Indices the alias currently points to."""
+    if not es.indices.exists_alias(name=alias):
+        return []
+    return sorted(es.indices.get_alias(name=alias).keys())
+
+def create_index(es, index_name, bulk_load=False, vector_options=None):
+    """
+    Create an index, optionally with bulk-load settings.
+
+    A bulk-loaded index has refresh disabled and no replicas until
+    finalize_bulk_load restores the regular settings.
+    """
+    body = build_index_body(vector_options)
+    if bulk_load:
+        body["settings"].update(BULK_LOAD_SETTINGS)
+    es.indices.create(index=index_name, mappings=body["mappings"], settings=body["settings"])
+
+def finalize_bulk_load(es, index_name, max_num_segments=1):
+    """Restore regular refresh and replica settings, refresh and force-merge the index."""
+    settings = build_index_body()["settings"]
+    es.indices.put_settings(
+        index=index_name,
+        settings={key: settings[key] for key in BULK_LOAD_SETTINGS}
+    )
+    es.indices.refresh(index=index_name)
+    # Force-merge can take a long time on a large index
+    es.options(request_timeout=3600).indices.forcemerge(index=index_name, max_num_segments=max_num_segments)
+
+def swap_alias(es, alias, index_name):
+    """
+    Atomically point alias at index_name.
+
+    The alias is removed from the indices it pointed to in the same request.
+    If a concrete index with the alias' name exists (an index created before
+    versioned indices were used) it is deleted in that request as well.
+
+    Returns:
+        list: Indices the alias pointed to before the swap
+    """
+    old_indices = [index for index in get_alias_indices(es, alias) if index != index_name]
+    actions = [{"remove": {"index": index, "alias": alias}} for index in old_indices]
+    if not old_indices and es.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index_name, "alias": alias, "is_write_index": True}})
+    es.indices.update_aliases(actions=actions)
+    logger.info(f"Alias {alias} now points to {index_name}")
+    return old_indices
+
+def get_index_generation(es, alias):
+    """
+    Generation of the indices behind alias, changing whenever their content may have.
+
+    Combines the names of the indices, which a rebuild replaces, with the
+    generation counter in their mapping _meta, which the indexer bumps
+    after every run that wrote to them.
+    """
+    mappings = es.indices.get_mapping(index=alias)
+    return ",".join(
+        f"{index}:{mapping['mappings'].get('_meta', {}).get('generation', 0)}"
+        for index, mapping in sorted(mappings.items())
+    )
+
+def bump_index_generation(es, alias):
+    """Increment the generation counter of the indices behind alias, see get_index_generation."""
+    for index, mapping in es.indices.get_mapping(index=alias).items():
+        meta = dict(mapping["mappings"].get("_meta", {}))
+        meta["generation"] = meta.get("generation", 0) + 1
+        es.indices.put_mapping(index=index, meta=meta)
@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the hex sha256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(pdf_sha256, chunk_index):
+    """Deterministic Elasticsearch document id for a chunk of a PDF."""
+    return f"{pdf_sha256}_{chunk_index}"
+
+def page_assets_id(pdf_sha256, page_number):
+    """Deterministic Elasticsearch document id for the tables and images of a PDF page."""
+    return f"{pdf_sha256}_p{page_number}_assets"
+
+class IndexManifest:
+    """
+    Record of which PDF contents are in the index and with which settings.
+
+    The manifest maps each PDF file name to the sha256 of its content, the
+    number of chunks indexed for it and a fingerprint of the chunker and
+    embedding settings it was indexed with. A file indexed with other
+    settings is treated as changed.
+
+    A file whose near-duplicate chunks were skipped or linked to chunks of
+    other PDFs also lists the sha256 of those PDFs, and is treated as
+    changed once one of them is no longer indexed unchanged.
+
+    Chunk ids derive from the content, so PDFs with the same content under
+    different names would write the same documents. Only one of them, the
+    canonical file, is indexed; the others are its aliases and are not
+    recorded, so removing an alias never deletes chunks, and removing the
+    canonical file makes a remaining alias the new canonical file.
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.settings_key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+
+    def reset(self):
+        """Forget all indexed files, e.g. before a full rebuild."""
+        self.files = {}
+
+    def plan(self, pdf_hashes):
+        """
+        Compare PDFs on disk with the manifest.
+
+        Args:
+            pdf_hashes (dict): File name -> sha256 of the PDFs on disk
+
+        Returns:
+            dict: Lists of file names under "new", "changed", "unchanged"
+                and "removed", and "aliases" mapping files with the content
+                of another file to that canonical file; aliases are in none
+                of the lists. Unchanged files depending on chunks of a file
+                that is not unchanged are listed as changed.
+        """
+        by_content = {}
+        for name, sha256 in sorted(pdf_hashes.items()):
+            by_content.setdefault(sha256, []).append(name)
+        aliases = {}
+        for sha256, names in by_content.items():
+            # The file already indexed with this content stays canonical
+            indexed = [name for name in names if self.files.get(name, {}).get("sha256") == sha256]
+            canonical = (indexed or names)[0]
+            aliases.update((name, canonical) for name in names if name != canonical)
+
+        plan = {"new": [], "changed": [], "unchanged": [], "removed": [], "aliases": aliases}
+        for name, sha256 in sorted(pdf_hashes.items()):
+            if name in aliases:
+                continue
+            entry = self.files.get(name)
+            if entry is None:
+                plan["new"].append(name)
+            elif entry["sha256"] != sha256 or entry.get("settings") != self.settings_key:
+                plan["changed"].append(name)
+            else:
+                plan["unchanged"].append(name)
+        plan["removed"] = sorted(name for name in self.files if name not in pdf_hashes or name in aliases)
+        # An alias indexed under its own name, e.g. by an older version, may own the shared
+        # chunks: they are deleted with it and the canonical file writes them again
+        for name in plan["removed"]:
+            canonical = aliases.get(name)
+            if canonical in plan["unchanged"]:
+                plan["unchanged"].remove(canonical)
+                plan["changed"] = sorted(plan["changed"] + [canonical])
+
+        # Re-queued files can in turn hold the chunks other files depend on
+        while True:
+            indexed = {self.files[name]["sha256"] for name in plan["unchanged"]}
+            dependents = [name for name in plan["unchanged"]
+                          if not indexed.issuperset(self.files[name].get("duplicate_of", []))]
+            if not dependents:
+                break
+            plan["unchanged"] = [name for name in plan["unchanged"] if name not in dependents]
+            plan["changed"] = sorted(plan["changed"] + dependents)
+        return plan
+
+    def record(self, name, sha256, chunks, duplicate_of=()):
+        """
+        Record a file as indexed.
+
+        Args:
+            name (str): PDF file name
+            sha256 (str): sha256 of the PDF content
+            chunks (int): Number of chunks indexed
+            duplicate_of: sha256 of the other PDFs whose chunks near-duplicate
+                chunks of this file were skipped or linked to
+        """
+        self.files[name] = {"sha256": sha256, "chunks": chunks, "settings": self.settings_key}
+        if duplicate_of:
+            self.files[name]["duplicate_of"] = sorted(duplicate_of)
+
+    def remove(self, name):
+        self.files.pop(name, None)
+
+    def save(self):
+        """Write the manifest atomically."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of values, 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+class IngestMetrics:
+    """
+    Structured ingestion metrics written as JSON lines.
+
+    Every event is one JSON object with an "event" type and a timestamp:
+    "stage" events carry a stage name, document and duration in seconds,
+    "embedding_batch" events the latency and size of one embedding request,
+    "document" events per-document totals, and "bulk_failure" events one
+    failed bulk item each. close() appends a "summary" event with
+    throughput and p50/p95 durations per stage.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._file = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.stage_durations = {}
+        self.embedding_latencies = []
+        self.totals = {"documents": 0, "failed_documents": 0, "pages": 0, "chunks": 0, "bytes": 0, "bulk_failures": 0}
+
+    def record(self, event, **fields):
+        """Write one event."""
+        fields = {"event": event, "ts": time.time(), **fields}
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(fields, default=str) + "\n")
+
+    def record_stage(self, stage, seconds, document=None, **fields):
+        """Record a stage duration measured elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.stage_durations.setdefault(stage, []).append(seconds)
+        self.record("stage", stage=stage, document=document, seconds=seconds, **fields)
+
+    @contextmanager
+    def stage(self, stage, document=None, **fields):
+        """Time the enclosed block as one run of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start, document, **fields)
+
+    def record_embedding_batch(self, seconds, size, attempts, document=None):
+        with self._lock:
+            self.embedding_latencies.append(seconds)
+        self.record("embedding_batch", document=document, seconds=seconds, size=size, attempts=attempts)
+
+    def record_bulk_failure(self, document, doc_id, error):
+        with self._lock:
+            self.totals["bulk_failures"] += 1
+        self.record("bulk_failure", document=document, doc_id=doc_id, error=error)
+
+    def record_document(self, document, success, pages=0, chunks=0, bytes=0, **fields):
+        with self._lock:
+            self.totals["documents" if success else "failed_documents"] += 1
+            if success:
+                self.totals["pages"] += pages
+                self.totals["chunks"] += chunks
+                self.totals["bytes"] += bytes
+        self.record("document", document=document, success=success, pages=pages, chunks=chunks,
+                    bytes=bytes, **fields)
+
+    def summary(self):
+        """End-of-run totals, throughput and per-stage p50/p95."""
+        elapsed = time.perf_counter() - self._start
+        with self._lock:
+            summary = dict(self.totals)
+            summary["elapsed_seconds"] = elapsed
+            for name in ("documents", "pages", "chunks"):
+                summary[f"{name}_per_second"] = self.totals[name] / elapsed if elapsed > 0 else 0.0
+            summary["stages"] = {
+                stage: {
+                    "count": len(durations),
+                    "total_seconds": sum(durations),
+                    "p50_seconds": percentile(durations, 50),
+                    "p95_seconds": percentile(durations, 95)
+                }
+                for stage, durations in self.stage_durations.items()
+            }
+            summary["embedding_batches"] = {
+                "count": len(self.embedding_latencies),
+                "p50_seconds": percentile(self.embedding_latencies, 50),
+                "p95_seconds": percentile(self.embedding_latencies, 95)
+            }
+        return summary
+
+    def close(self):
+        """Write the summary event and close the stream."""
+        summary = self.summary()
+        self.record("summary", **summary)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return summary
@@ -2,19 +2,28 @@ import os
 import logging
 import argparse
 from dotenv import load_dotenv
-from docling.document_converter import DocumentConverter
-from docling.chunking import HybridChunker
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 from elasticsearch.exceptions import ConnectionError, AuthenticationException, TransportError
-from ibm_watsonx_ai.foundation_models import Embeddings
-from ibm_watsonx_ai.metanames import EmbedTextParamsMetaNames as EmbedParams
 import glob
+import itertools
 import urllib3
+from conversion import iter_converted_pdfs, ConversionStats, build_pipeline_options, conversion_cache_version
+from conversion_cache import ConversionCache
+from embedding_batcher import embed_in_batches, DEFAULT_BATCH_SIZE, DEFAULT_MAX_IN_FLIGHT
+from index_manifest import IndexManifest, file_sha256, chunk_id, page_assets_id
+from bulk_sink import stream_bulk, DEFAULT_MAX_IN_FLIGHT as DEFAULT_BULK_IN_FLIGHT
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from embedding_client import initialize_watsonx, EMBEDDING_MODEL_ID, TRUNCATE_INPUT_TOKENS
+from page_index import PageIndex
+from near_duplicates import NearDuplicateIndex
+from token_chunking import TokenChunker, load_token_counter, DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+from ingest_metrics import IngestMetrics
+from checkpoint import IngestCheckpoint
+from local_index import LocalIndexWriter
+from search_backends import DEFAULT_LOCAL_INDEX_DIR
+from index_admin import (create_index, finalize_bulk_load, get_alias_indices, new_index_name, swap_alias,
+                         bump_index_generation, VECTOR_INDEX_TYPES, DEFAULT_HNSW_M, DEFAULT_HNSW_EF_CONSTRUCTION)
 
 # Configure logging
 logging.basicConfig(
@@ -33,6 +42,31 @@ ES_PASSWORD = os.getenv("ES_PASSWORD")
 ES_CERT_FINGERPRINT = os.getenv("ES_CERT_FINGERPRINT")
 MEDICAL_JOURNAL_INDEX_NAME = os.getenv("MEDICAL_JOURNAL_INDEX_NAME", "medical_journal")
 OUTPUT_DIR = "output"
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, f"{MEDICAL_JOURNAL_INDEX_NAME}_manifest.json")
+
+# Chunking and embedding configuration
+CHUNK_SIZE = 500  # Smaller chunks for better semantic preservation
+CHUNK_OVERLAP = 50  # Overlap to maintain context
+CHUNK_SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " ", ""]  # Natural text boundaries
+# "chars" cuts CHUNK_SIZE-character chunks, "tokens" packs chunks up to CHUNK_TOKENS tokens
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "chars")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS))  # Below TRUNCATE_INPUT_TOKENS
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", DEFAULT_OVERLAP_TOKENS))
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER")  # Hugging Face tokenizer, approximated when unset
+# Near-duplicate chunks: "off", "skip" (not indexed) or "link" (indexed without a vector)
+DEDUP_MODE = os.getenv("DEDUP_MODE", "off")
+DEDUP_MODES = ("off", "skip", "link")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(OUTPUT_DIR, "embedding_cache"))
+CONVERSION_CACHE_DIR = os.path.join(OUTPUT_DIR, "conversion_cache")
+METRICS_PATH = os.path.join(OUTPUT_DIR, "ingest_metrics.jsonl")
+CHECKPOINT_PATH = os.path.join(OUTPUT_DIR, f"{MEDICAL_JOURNAL_INDEX_NAME}_checkpoint.jsonl")
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")  # hnsw, int8_hnsw or int4_hnsw
+HNSW_M = int(os.getenv("HNSW_M", DEFAULT_HNSW_M))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", DEFAULT_HNSW_EF_CONSTRUCTION))
+# "elasticsearch", or "local" to write the embedded index searched by searcher.py with the same setting
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elasticsearch")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", DEFAULT_LOCAL_INDEX_DIR)
+LOCAL_IVF_LISTS = int(os.getenv("LOCAL_IVF_LISTS", 0))  # 0 for exact vector search
 
 # IBM Watson configuration
 IBM_CLOUD_API_KEY = os.getenv("IBM_CLOUD_API_KEY")
@@ -41,168 +75,336 @@ IBM_CLOUD_PROJECT_ID = os.getenv("IBM_CLOUD_PROJECT_ID")
 
 # Validate required environment variables
 required_vars = {
-    "ES_URL": ES_URL,
-    "ES_USER": ES_USER,
-    "ES_PASSWORD": ES_PASSWORD,
-    "ES_CERT_FINGERPRINT": ES_CERT_FINGERPRINT,
     "IBM_CLOUD_API_KEY": IBM_CLOUD_API_KEY,
     "IBM_CLOUD_ENDPOINT": IBM_CLOUD_ENDPOINT,
     "IBM_CLOUD_PROJECT_ID": IBM_CLOUD_PROJECT_ID,
     "MEDICAL_JOURNAL_INDEX_NAME": MEDICAL_JOURNAL_INDEX_NAME
 }
+if SEARCH_BACKEND == "elasticsearch":
+    required_vars.update({
+        "ES_URL": ES_URL,
+        "ES_USER": ES_USER,
+        "ES_PASSWORD": ES_PASSWORD,
+        "ES_CERT_FINGERPRINT": ES_CERT_FINGERPRINT
+    })
 
 missing_vars = [var for var, value in required_vars.items() if not value]
 if missing_vars:
     raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
 # Initialize Elasticsearch client
-try:
-    es = Elasticsearch(
-        ES_URL,
-        basic_auth=(ES_USER, ES_PASSWORD),
-        verify_certs=True,
-        ssl_assert_fingerprint=ES_CERT_FINGERPRINT,
-        request_timeout=30,
-        retry_on_timeout=True,
-        max_retries=3
-    )
-except Exception as e:
-    logger.error(f"Failed to initialize Elasticsearch client: {str(e)}", exc_info=True)
-    raise
-
-def initialize_watsonx():
-    """Initialize IBM watsonx.ai embedding model."""
-    model_id = "ibm/slate-125m-english-rtrvr-v2"
-    embed_params = {
-        EmbedParams.TRUNCATE_INPUT_TOKENS: 500,  # Restrict to 500 tokens
-        EmbedParams.RETURN_OPTIONS: {
-            'input_text': True
+es = None
+if SEARCH_BACKEND == "elasticsearch":
+    try:
+        es = Elasticsearch(
+            ES_URL,
+            basic_auth=(ES_USER, ES_PASSWORD),
+            verify_certs=True,
+            ssl_assert_fingerprint=ES_CERT_FINGERPRINT,
+            request_timeout=30,
+            retry_on_timeout=True,
+            max_retries=3
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize Elasticsearch client: {str(e)}", exc_info=True)
+        raise
+
+def get_manifest_settings(chunking=CHUNKING_MODE, dedup=DEDUP_MODE):
+    """Settings that change chunk content; PDFs indexed with other values are re-indexed."""
+    if chunking == "tokens":
+        chunk_settings = {
+            "chunking": "tokens",
+            "chunk_tokens": CHUNK_TOKENS,
+            "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+            "chunk_tokenizer": CHUNK_TOKENIZER or "approximate"
         }
+    else:
+        chunk_settings = {
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "chunk_separators": CHUNK_SEPARATORS
+        }
+    if dedup != "off":
+        chunk_settings["dedup"] = dedup
+    return {
+        **chunk_settings,
+        "embedding_model_id": EMBEDDING_MODEL_ID,
+        "truncate_input_tokens": TRUNCATE_INPUT_TOKENS,
+        "page_numbers": "provenance",
+        "image_text": "chunks"
     }
-    credentials = {
-        "url": IBM_CLOUD_ENDPOINT,
-        "apikey": IBM_CLOUD_API_KEY,
-    }
-    embedding = Embeddings(
-        model_id=model_id,
-        credentials=credentials,
-        params=embed_params,
-        project_id=IBM_CLOUD_PROJECT_ID
-    )
-    return embedding
 
-def setup_elasticsearch_index():
-    """Create Elasticsearch index with mappings for text and vector search."""
+def setup_elasticsearch_index(bulk_load=False, vector_options=None):
+    """
+    Create a versioned Elasticsearch index with mappings for text and vector search.
+
+    Searches go through the MEDICAL_JOURNAL_INDEX_NAME alias. Without
+    bulk_load the alias is created on the new index straight away unless it
+    already exists. With bulk_load the index gets bulk-load settings and the
+    alias is left alone; rebuild_index swaps it once loading is done.
+
+    Args:
+        bulk_load (bool): Create the index with bulk-load settings
+        vector_options (dict): Vector storage options, see index_admin.build_vector_mapping
+
+    Returns:
+        str: Name of the index to write to, None on failure
+    """
     try:
         # Test connection first
         if not test_elasticsearch_connection():
             logger.error("Failed to connect to Elasticsearch")
-            return False
+            return None
             
         logger.info("Checking if index exists...")
-        if es.indices.exists(index=MEDICAL_JOURNAL_INDEX_NAME):
+        if not bulk_load and es.indices.exists(index=MEDICAL_JOURNAL_INDEX_NAME):
             logger.info(f"Index {MEDICAL_JOURNAL_INDEX_NAME} already exists")
-            return True
-
-        logger.info(f"Creating index {MEDICAL_JOURNAL_INDEX_NAME}...")
-        settings = {
-            "number_of_shards": 3,
-            "number_of_replicas": 1,
-            "refresh_interval": "30s",
-            "analysis": {
-                "analyzer": {
-                    "medical_text_analyzer": {
-                        "type": "custom",
-                        "tokenizer": "standard",
-                        "filter": ["lowercase", "stop", "snowball"]
-                    }
-                }
-            }
-        }
-        
-        mappings = {
-            "mappings": {
-                "properties": {
-                    "text": {
-                        "type": "text",
-                        "analyzer": "medical_text_analyzer",
-                        "fields": {
-                            "keyword": {
-                                "type": "keyword",
-                                "ignore_above": 256
-                            }
-                        }
-                    },
-                    "vector": {
-                        "type": "dense_vector",
-                        "dims": 768,  # Updated to match IBM Watson slate-125m-english-rtrvr-v2 model dimensions
-                        "index": True,
-                        "similarity": "cosine"
-                    },
-                    "source_pdf": {
-                        "type": "keyword"
-                    },
-                    "page_number": {
-                        "type": "integer"
-                    },
-                    "chunk_index": {
-                        "type": "integer"
-                    },
-                    "content_type": {
-                        "type": "keyword",
-                        "fields": {
-                            "text": {
-                                "type": "text",
-                                "analyzer": "medical_text_analyzer"
-                            }
-                        }
-                    },
-                    "metadata": {
-                        "type": "object",
-                        "properties": {
-                            "title": {"type": "text"},
-                            "author": {"type": "text"},
-                            "date": {"type": "date"},
-                            "keywords": {"type": "keyword"},
-                            "headings": {"type": "keyword"},
-                            "tables": {
-                                "type": "nested",
-                                "properties": {
-                                    "table_index": {"type": "integer"},
-                                    "content": {"type": "text", "analyzer": "medical_text_analyzer"},
-                                    "structure": {"type": "text"},
-                                    "page_number": {"type": "integer"}
-                                }
-                            },
-                            "images": {
-                                "type": "nested",
-                                "properties": {
-                                    "page_number": {"type": "integer"},
-                                    "has_image": {"type": "boolean"},
-                                    "caption": {"type": "text", "analyzer": "medical_text_analyzer"},
-                                    "description": {"type": "text", "analyzer": "medical_text_analyzer"},
-                                    "ocr_text": {"type": "text", "analyzer": "medical_text_analyzer"},
-                                    "image_type": {"type": "keyword"},
-                                    "position": {"type": "keyword"}
-                                }
-                            }
-                        }
-                    }
-                }
-            },
-            "settings": settings
-        }
-        
-        es.indices.create(index=MEDICAL_JOURNAL_INDEX_NAME, body=mappings)
-        logger.info(f"Successfully created index {MEDICAL_JOURNAL_INDEX_NAME}")
-        return True
+            return MEDICAL_JOURNAL_INDEX_NAME
+
+        index_name = new_index_name(MEDICAL_JOURNAL_INDEX_NAME)
+        logger.info(f"Creating index {index_name}...")
+        create_index(es, index_name, bulk_load=bulk_load, vector_options=vector_options)
+        if not bulk_load:
+            swap_alias(es, MEDICAL_JOURNAL_INDEX_NAME, index_name)
+        logger.info(f"Successfully created index {index_name}")
+        return index_name
         
     except Exception as e:
         logger.error(f"Error setting up Elasticsearch index: {str(e)}", exc_info=True)
+        return None
+
+def delete_stale_chunks(source_pdf, pdf_sha256=None, chunk_count=0, index_name=MEDICAL_JOURNAL_INDEX_NAME,
+                        local_index=None):
+    """
+    Delete chunks of a PDF that do not belong to its current content.
+
+    Args:
+        source_pdf (str): PDF file name
+        pdf_sha256 (str): sha256 of the current content, None to delete all chunks of the PDF
+        chunk_count (int): Number of chunks of the current content
+        index_name (str): Index or alias to delete from
+        local_index (LocalIndexWriter): Local index to delete from instead of Elasticsearch
+
+    Returns:
+        bool: True if the delete succeeded
+    """
+    if local_index is not None:
+        deleted = local_index.delete_stale(source_pdf, pdf_sha256, chunk_count)
+        if deleted:
+            logger.info(f"Deleted {deleted} stale chunks of {source_pdf}")
+        return True
+    query = {"bool": {"filter": [{"term": {"source_pdf": source_pdf}}]}}
+    if pdf_sha256 is not None:
+        query["bool"]["should"] = [
+            {"bool": {"must_not": {"term": {"pdf_sha256": pdf_sha256}}}},
+            {"range": {"chunk_index": {"gte": chunk_count}}}
+        ]
+        query["bool"]["minimum_should_match"] = 1
+    try:
+        response = es.delete_by_query(index=index_name, query=query, conflicts="proceed")
+        if response.get("deleted"):
+            logger.info(f"Deleted {response['deleted']} stale chunks of {source_pdf}")
+        return True
+    except Exception as e:
+        logger.error(f"Error deleting stale chunks of {source_pdf}: {str(e)}", exc_info=True)
         return False
 
-def process_and_index_pdfs(embeddings, pdf_dir="pdfs"):
-    """Process PDFs in the specified directory and index chunks in Elasticsearch."""
+def clean_markdown(markdown_content):
+    """Drop empty and hyphen-only lines from markdown while preserving table structure."""
+    cleaned_lines = []
+    in_table = False
+    for line in markdown_content.split('\n'):
+        line = line.strip()
+        
+        # Check if we're entering or exiting a table
+        if line.startswith('|') or line.startswith('+-'):
+            in_table = True
+            cleaned_lines.append(line)  # Keep table structure intact
+            continue
+        elif in_table and not (line.startswith('|') or line.startswith('+-')):
+            in_table = False
+        
+        # For non-table content, clean up unnecessary hyphens
+        if not in_table:
+            if line and not line.replace('-', '').strip() == '':
+                cleaned_lines.append(line)
+        else:
+            cleaned_lines.append(line)  # Keep all table lines
+    
+    return '\n'.join(cleaned_lines)
+
+def generate_page_asset_actions(page_index, source_pdf, pdf_sha256, index_name=MEDICAL_JOURNAL_INDEX_NAME):
+    """
+    Yield bulk index actions for one page_assets document per page with tables or images.
+
+    Tables and images are stored once per page instead of on every chunk of
+    the page; chunks refer to their page's document through assets_id.
+    """
+    for page_number in page_index.asset_pages():
+        yield {
+            "_index": index_name,
+            "_id": page_assets_id(pdf_sha256, page_number),
+            "_source": {
+                "source_pdf": source_pdf,
+                "pdf_sha256": pdf_sha256,
+                "page_number": page_number,
+                "content_type": "page_assets",
+                "metadata": {
+                    "tables": page_index.tables_on(page_number),
+                    "images": page_index.images_on(page_number)
+                }
+            }
+        }
+
+def generate_chunk_actions(embeddings, chunks, chunk_starts, page_index, document, source_pdf, pdf_sha256, f,
+                           failed_chunks, metrics, index_name=MEDICAL_JOURNAL_INDEX_NAME,
+                           embed_batch_size=DEFAULT_BATCH_SIZE, embed_concurrency=DEFAULT_MAX_IN_FLIGHT,
+                           skip_ids=frozenset(), duplicates=None, link_duplicates=False):
+    """
+    Yield bulk index actions for the chunks of a document.
+
+    Chunks are embedded one window of embed_concurrency batches at a time,
+    so only the vectors of that window are held in memory. Indices of chunks
+    that could not be embedded or prepared are appended to failed_chunks.
+    Time spent embedding is recorded as the "embed" stage, and the latency
+    of every embedding request as an embedding batch. Chunks whose ids are
+    in skip_ids were indexed before a crash and are neither embedded nor
+    indexed again.
+
+    duplicates maps indices of near-duplicate chunks to the id of the chunk
+    they duplicate. They are not embedded; with link_duplicates they are
+    indexed without a vector and with a duplicate_of reference, otherwise
+    they are left out.
+    """
+    duplicates = duplicates or {}
+
+    def build_action(i, vector=None):
+        # Page of the chunk's first character, from Docling provenance
+        page_number = page_index.page_for_offset(chunk_starts[i])
+        content_type = page_index.content_type(page_number)
+
+        # Prepare metadata with proper type handling
+        metadata = {
+            "title": document["name"],
+            "author": None,  # Would need to extract from document metadata
+            "date": None,    # Would need to extract from document metadata
+            "keywords": [],  # Would need to extract from document metadata
+            "headings": []   # Would need to extract from document structure
+        }
+
+        # Remove None values from metadata
+        metadata = {k: v for k, v in metadata.items() if v is not None}
+
+        source = {
+            "text": chunks[i],
+            "source_pdf": source_pdf,
+            "pdf_sha256": pdf_sha256,
+            "page_number": page_number,
+            "chunk_index": i,
+            "content_type": content_type,
+            "metadata": metadata
+        }
+        if content_type != "text":
+            source["assets_id"] = page_assets_id(pdf_sha256, page_number)
+            images = page_index.images_on(page_number)
+            if images:
+                source["image_text"] = {
+                    field: " ".join(str(image.get(field) or "") for image in images)
+                    for field in ("caption", "description", "ocr_text")
+                }
+        if vector is not None:
+            source["vector"] = vector
+        if i in duplicates:
+            source["duplicate_of"] = duplicates[i]
+        f.write(f"\nChunk {i+1} (Type: {content_type}):\n")
+        f.write(f"Page: {page_number}\n")
+        f.write(f"Content: {chunks[i][:200]}...\n")
+        return {"_index": index_name, "_id": chunk_id(pdf_sha256, i), "_source": source}
+
+    pending = [i for i, chunk in enumerate(chunks)
+               if chunk.strip() and chunk_id(pdf_sha256, i) not in skip_ids]
+    if link_duplicates:
+        for i in pending:
+            if i in duplicates:
+                yield build_action(i)
+    chunk_indices = [i for i in pending if i not in duplicates]
+    window = embed_batch_size * embed_concurrency
+    for start in range(0, len(chunk_indices), window):
+        window_indices = chunk_indices[start:start + window]
+        with metrics.stage("embed", source_pdf, chunks=len(window_indices)):
+            vectors = embed_in_batches(
+                embeddings,
+                [chunks[i] for i in window_indices],
+                batch_size=embed_batch_size,
+                max_in_flight=embed_concurrency,
+                max_retries=0,  # Transient errors are retried by the embedding client
+                on_batch=lambda seconds, size, attempts: metrics.record_embedding_batch(
+                    seconds, size, attempts, source_pdf
+                )
+            )
+        for i, vector in zip(window_indices, vectors):
+            try:
+                if vector is None:
+                    logger.warning(f"Failed to embed chunk {i} from {source_pdf}")
+                    f.write(f"Failed to embed chunk {i} from {source_pdf}\n")
+                    failed_chunks.append(i)
+                    continue
+                yield build_action(i, vector)
+                
+            except Exception as chunk_error:
+                logger.error(f"Error processing chunk {i} from {source_pdf}: {str(chunk_error)}", exc_info=True)
+                f.write(f"Error processing chunk {i} from {source_pdf}: {str(chunk_error)}\n")
+                failed_chunks.append(i)
+                continue
+
+def process_and_index_pdfs(embeddings, manifest, pdf_dir="pdfs", incremental=False, workers=1,
+                           embed_batch_size=DEFAULT_BATCH_SIZE, embed_concurrency=DEFAULT_MAX_IN_FLIGHT,
+                           bulk_concurrency=DEFAULT_BULK_IN_FLIGHT, conversion_cache=None, metrics=None,
+                           debug_dump=False, index_name=MEDICAL_JOURNAL_INDEX_NAME, checkpoint=None,
+                           chunking=CHUNKING_MODE, dedup=DEDUP_MODE, local_index=None, failed_files=None):
+    """
+    Process PDFs in the specified directory and index chunks in Elasticsearch.
+
+    With local_index, a LocalIndexWriter, chunks are staged in the local
+    index instead; the caller commits it.
+
+    Chunk ids are derived from the PDF content hash so re-indexing a file
+    overwrites its chunks, and of several PDFs with the same content only
+    one is indexed (see IndexManifest). In incremental mode only PDFs that are new or
+    changed since the manifest was written are converted and embedded, and
+    chunks of PDFs that no longer exist are deleted.
+
+    Per-document and per-stage timings go to metrics. The stages are
+    "convert", "chunk", "embed", "index" (embedding and bulk requests
+    streamed together, so bulk time is index minus embed) and "cleanup".
+    The free-text report with table, image and chunk contents is only
+    written with debug_dump.
+
+    With a checkpoint, acknowledged chunks and finished PDFs are journaled
+    as they are indexed. PDFs the checkpoint already lists as finished are
+    skipped and chunks it lists as acknowledged are not embedded again, so
+    a resumed run continues where the interrupted one stopped.
+
+    With chunking="tokens" chunks are packed up to CHUNK_TOKENS tokens
+    without splitting tables, and the number of chunks character chunking
+    would have produced is reported alongside for comparison.
+
+    With dedup set to "skip" or "link", chunks that are near-duplicates of
+    an earlier chunk of this run, in the same or another PDF, are not
+    embedded; see generate_chunk_actions. The manifest lists the PDFs a
+    file's duplicates refer to, so an incremental run re-indexes the file
+    when one of them changes, and the checkpoint keeps the signatures of
+    finished PDFs, so a resumed run finds the same duplicates.
+
+    The return value only tells whether any PDF was indexed. Pass a list as
+    failed_files to receive the names of the PDFs that were not indexed
+    completely: conversion errors, chunks that failed to embed or were
+    rejected, and errors while indexing or cleaning up.
+    """
+    if failed_files is None:
+        failed_files = []
+    if metrics is None:
+        metrics = IngestMetrics()
     try:
         # Get all PDFs in the directory
         pdf_files = glob.glob(os.path.join(pdf_dir, "*.pdf"))
@@ -210,223 +412,261 @@ def process_and_index_pdfs(embeddings, pdf_dir="pdfs"):
             logger.error(f"No PDFs found in {pdf_dir}")
             return False
 
+        pdf_paths = {os.path.basename(pdf_file): pdf_file for pdf_file in pdf_files}
+        pdf_hashes = {name: file_sha256(path) for name, path in pdf_paths.items()}
+        plan = manifest.plan(pdf_hashes)
+        logger.info(
+            f"PDFs: {len(plan['new'])} new, {len(plan['changed'])} changed, "
+            f"{len(plan['unchanged'])} unchanged, {len(plan['removed'])} removed"
+        )
+        # Copies share their chunk ids with the canonical file, only that one is indexed
+        for name, canonical in plan["aliases"].items():
+            logger.info(f"{name} has the same content as {canonical} and is not indexed separately")
+        pdf_files = [pdf_file for pdf_file in pdf_files if os.path.basename(pdf_file) not in plan["aliases"]]
+
+        if incremental:
+            for name in plan["removed"]:
+                if delete_stale_chunks(name, index_name=index_name, local_index=local_index):
+                    manifest.remove(name)
+            manifest.save()
+            pdf_files = [pdf_paths[name] for name in plan["new"] + plan["changed"]]
+            if not pdf_files:
+                logger.info("Index is up to date")
+                return True
+
+        if checkpoint is not None and checkpoint.documents:
+            pdf_files = [pdf_file for pdf_file in pdf_files
+                         if not checkpoint.is_document_done(pdf_hashes[os.path.basename(pdf_file)])]
+            logger.info(f"Resuming: {len(checkpoint.documents)} PDFs already indexed, {len(pdf_files)} left")
+            if not pdf_files:
+                return True
+
         # Create output file for debugging
         output_file = "pdf_processing_output.txt"
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with open(output_file if debug_dump else os.devnull, 'w', encoding='utf-8') as f:
             f.write("PDF Processing Output\n")
             f.write("=" * 50 + "\n\n")
 
-            # Initialize Docling converter with correct options
-            pipeline_options = PdfPipelineOptions(
-                do_table_structure=True,
-                do_figure_caption=True,
-                do_image_ocr=True,
-                do_image_annotation=True
-            )
-            
-            converter = DocumentConverter(
-                format_options={
-                    InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-                }
-            )
-            
             # Use RecursiveCharacterTextSplitter for better compatibility with IBM embeddings
             chunker = RecursiveCharacterTextSplitter(
-                chunk_size=500,  # Smaller chunks for better semantic preservation
-                chunk_overlap=50,  # Overlap to maintain context
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
                 length_function=len,
-                separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],  # Natural text boundaries
-                is_separator_regex=False
+                separators=CHUNK_SEPARATORS,
+                is_separator_regex=False,
+                add_start_index=True
             )
+            token_chunker = None
+            if chunking == "tokens":
+                token_chunker = TokenChunker(load_token_counter(CHUNK_TOKENIZER), CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+            chunk_counts = {"tokens": 0, "chars": 0}
+            near_duplicates = None
+            if dedup != "off":
+                near_duplicates = NearDuplicateIndex()
+                if checkpoint is not None:
+                    near_duplicates.load(checkpoint.signatures)
+            dedup_counts = {"chunks": 0, "duplicates": 0}
             
             total_chunks = 0
             successful_files = 0
+            conversion_stats = ConversionStats()
             
-            for pdf_file in pdf_files:
+            # Convert PDFs using Docling, in worker processes when workers > 1
+            for converted in iter_converted_pdfs(
+                pdf_files,
+                workers=workers,
+                cache=conversion_cache,
+                pdf_hashes={pdf_file: pdf_hashes[os.path.basename(pdf_file)] for pdf_file in pdf_files}
+            ):
+                pdf_file = converted["pdf_file"]
+                source_pdf = os.path.basename(pdf_file)
+                pdf_sha256 = pdf_hashes[source_pdf]
                 try:
                     f.write(f"\n{'='*50}\n")
                     f.write(f"Processing {pdf_file}...\n")
                     f.write(f"{'='*50}\n\n")
                     
-                    # Validate PDF file
-                    if not os.path.exists(pdf_file):
-                        f.write(f"PDF file not found: {pdf_file}\n")
-                        continue
-                        
-                    if os.path.getsize(pdf_file) == 0:
-                        f.write(f"PDF file is empty: {pdf_file}\n")
-                        continue
-                    
-                    # Convert PDF using Docling
-                    result = converter.convert(pdf_file)
-                    if not result or not result.document:
-                        f.write(f"No content extracted from {pdf_file}\n")
+                    if converted["error"]:
+                        failed_files.append(source_pdf)
+                        logger.error(converted["error"])
+                        f.write(f"{converted['error']}\n")
+                        metrics.record_document(source_pdf, False, error=converted["error"])
                         continue
+                    conversion_stats.add(converted)
+                    metrics.record_stage(
+                        "convert", converted["duration"], source_pdf,
+                        pages=converted["num_pages"], cached=converted["cached"]
+                    )
+                    document = converted["document"]
                     
                     # Process tables
-                    tables = []
-                    if hasattr(result.document, 'tables'):
-                        f.write("\nProcessing tables:\n")
-                        for i, table in enumerate(result.document.tables):
-                            table_info = {
-                                "table_index": i,
-                                "content": str(table.content) if hasattr(table, 'content') else "",
-                                "structure": str(table.structure) if hasattr(table, 'structure') else "",
-                                "page_number": table.prov[0].page_no if hasattr(table, 'prov') and len(table.prov) > 0 else 0
-                            }
-                            tables.append(table_info)
-                            f.write(f"Table {i+1} on page {table_info['page_number']}:\n")
-                            f.write(f"Content: {table_info['content'][:200]}...\n")
+                    tables = document["tables"]
+                    f.write("\nProcessing tables:\n")
+                    for table_info in tables:
+                        f.write(f"Table {table_info['table_index']+1} on page {table_info['page_number']}:\n")
+                        f.write(f"Content: {table_info['content'][:200]}...\n")
                     
                     # Process images
-                    images = []
+                    images = document["images"]
                     f.write("\nProcessing images:\n")
-                    for picture in result.document.pictures:
-                        if picture.prov and len(picture.prov) > 0:
-                            page_no = picture.prov[0].page_no
-                            image_info = {
-                                "page_number": page_no,
-                                "has_image": True,
-                                "caption": picture.caption if hasattr(picture, 'caption') else "",
-                                "description": picture.description if hasattr(picture, 'description') else "",
-                                "ocr_text": picture.ocr_text if hasattr(picture, 'ocr_text') else "",
-                                "image_type": "figure",
-                                "position": "unknown"
-                            }
-                            images.append(image_info)
-                            f.write(f"Image on page {page_no}:\n")
-                            f.write(f"Caption: {image_info['caption']}\n")
-                            f.write(f"Description: {image_info['description']}\n")
-                            f.write(f"OCR Text: {image_info['ocr_text'][:200]}...\n")
+                    for image_info in images:
+                        f.write(f"Image on page {image_info['page_number']}:\n")
+                        f.write(f"Caption: {image_info['caption']}\n")
+                        f.write(f"Description: {image_info['description']}\n")
+                        f.write(f"OCR Text: {image_info['ocr_text'][:200]}...\n")
                     
                     # Get and clean text content
                     f.write("\nProcessing text content:\n")
-                    markdown_content = result.document.export_to_markdown()
-                    
-                    # Clean up the markdown content while preserving table structure
-                    cleaned_lines = []
-                    in_table = False
-                    for line in markdown_content.split('\n'):
-                        line = line.strip()
+                    with metrics.stage("chunk", source_pdf):
+                        # Clean each page's markdown and keep track of where pages start
+                        page_index, cleaned_content = PageIndex.from_pages(
+                            [(page_number, clean_markdown(markdown)) for page_number, markdown in document["markdown_pages"]],
+                            tables,
+                            images
+                        )
                         
-                        # Check if we're entering or exiting a table
-                        if line.startswith('|') or line.startswith('+-'):
-                            in_table = True
-                            cleaned_lines.append(line)  # Keep table structure intact
-                            continue
-                        elif in_table and not (line.startswith('|') or line.startswith('+-')):
-                            in_table = False
-                        
-                        # For non-table content, clean up unnecessary hyphens
-                        if not in_table:
-                            if line and not line.replace('-', '').strip() == '':
-                                cleaned_lines.append(line)
+                        # Split the content into chunks, keeping each chunk's offset for page lookup
+                        chunk_documents = chunker.create_documents([cleaned_content])
+                        if token_chunker is not None:
+                            chunks, chunk_starts = token_chunker.split(cleaned_content)
+                            chunk_counts["tokens"] += len(chunks)
+                            chunk_counts["chars"] += len(chunk_documents)
                         else:
-                            cleaned_lines.append(line)  # Keep all table lines
-                    
-                    cleaned_content = '\n'.join(cleaned_lines)
-                    
-                    # Split the content into chunks
-                    chunks = chunker.split_text(cleaned_content)
+                            chunks = [chunk.page_content for chunk in chunk_documents]
+                            chunk_starts = [chunk.metadata["start_index"] for chunk in chunk_documents]
                     f.write(f"\nCreated {len(chunks)} text chunks\n")
+
+                    # Find chunks repeating earlier text, e.g. running headers, licences or reprinted abstracts
+                    duplicates = {}
+                    if near_duplicates is not None:
+                        with metrics.stage("dedup", source_pdf):
+                            for i, chunk in enumerate(chunks):
+                                if chunk.strip():
+                                    duplicate_of = near_duplicates.check(chunk_id(pdf_sha256, i), chunk)
+                                    if duplicate_of is not None:
+                                        duplicates[i] = duplicate_of
+                        dedup_counts["chunks"] += len(chunks)
+                        dedup_counts["duplicates"] += len(duplicates)
+                        f.write(f"{len(duplicates)} chunks are near-duplicates of earlier chunks\n")
                     
-                    actions = []
-                    for i, chunk in enumerate(chunks):
-                        try:
-                            text = chunk
-                            if not text.strip():
-                                continue
-                                
-                            # Generate embedding
-                            vector = embeddings.embed_query(text)
-                            
-                            # Extract page number from the chunk (if available in the markdown)
-                            page_number = 0  # Default to first page
-                            for line in text.split('\n'):
-                                if line.startswith('<!-- Page'):
-                                    try:
-                                        page_number = int(line.split('Page')[1].split('-->')[0].strip())
-                                        break
-                                    except:
-                                        pass
-                            
-                            # Determine content type
-                            content_type = "text"
-                            if any(table["page_number"] == page_number for table in tables):
-                                content_type = "table"
-                            if any(image["page_number"] == page_number for image in images):
-                                content_type = "image"
-                            
-                            # Prepare metadata with proper type handling
-                            metadata = {
-                                "title": result.document.name if hasattr(result.document, 'name') else None,
-                                "author": None,  # Would need to extract from document metadata
-                                "date": None,    # Would need to extract from document metadata
-                                "keywords": [],  # Would need to extract from document metadata
-                                "headings": [],  # Would need to extract from document structure
-                                "tables": tables,
-                                "images": images
-                            }
-                            
-                            # Remove None values from metadata
-                            metadata = {k: v for k, v in metadata.items() if v is not None}
-                            
-                            action = {
-                                "_index": MEDICAL_JOURNAL_INDEX_NAME,
-                                "_id": f"{os.path.basename(pdf_file)}_{i}",
-                                "_source": {
-                                    "text": text,
-                                    "vector": vector,
-                                    "source_pdf": os.path.basename(pdf_file),
-                                    "page_number": page_number,
-                                    "chunk_index": i,
-                                    "content_type": content_type,
-                                    "metadata": metadata
-                                }
-                            }
-                            actions.append(action)
-                            
-                            f.write(f"\nChunk {i+1} (Type: {content_type}):\n")
-                            f.write(f"Page: {page_number}\n")
-                            f.write(f"Content: {text[:200]}...\n")
-                            
-                        except Exception as chunk_error:
-                            f.write(f"Error processing chunk {i} from {pdf_file}: {str(chunk_error)}\n")
-                            continue
-                    
-                    # Bulk index to Elasticsearch
-                    if actions:
-                        try:
-                            # Add detailed error handling for bulk operation
-                            success, failed = bulk(es, actions, raise_on_error=False, stats_only=False)
-                            
-                            if failed:
-                                f.write(f"\nBulk indexing errors for {pdf_file}:\n")
-                                for item in failed:
-                                    f.write(f"Error in item {item['index']['_id']}: {item['index']['error']}\n")
+                    # Embed and index chunks as a stream so memory stays flat for large documents
+                    failed_chunks = []
+                    indexed = 0
+                    document_error = None
+                    acked = frozenset(checkpoint.acked_chunks(pdf_sha256)) if checkpoint is not None else frozenset()
+                    if acked:
+                        f.write(f"\nSkipping {len(acked)} chunks indexed before the interruption\n")
+                    asset_count = len(page_index.asset_pages())
+                    actions = itertools.chain(generate_page_asset_actions(
+                        page_index, source_pdf, pdf_sha256, index_name
+                    ), generate_chunk_actions(
+                        embeddings, chunks, chunk_starts, page_index, document, source_pdf, pdf_sha256, f,
+                        failed_chunks, metrics,
+                        index_name=index_name,
+                        embed_batch_size=embed_batch_size,
+                        embed_concurrency=embed_concurrency,
+                        skip_ids=acked,
+                        duplicates=duplicates,
+                        link_duplicates=(dedup == "link")
+                    ))
+                    on_indexed = None
+                    if checkpoint is not None:
+                        # Page asset documents are cheap to re-index, only chunks are journaled
+                        on_indexed = lambda ids: checkpoint.record_chunks(
+                            pdf_sha256, [doc_id for doc_id in ids if not doc_id.endswith("_assets")]
+                        )
+                    try:
+                        with metrics.stage("index", source_pdf):
+                            if local_index is not None:
+                                result = local_index.index_actions(actions, on_indexed=on_indexed)
                             else:
-                                total_chunks += len(actions)
-                                successful_files += 1
-                                f.write(f"\nSuccessfully indexed {len(actions)} chunks from {pdf_file}\n")
-                                
-                        except Exception as bulk_error:
-                            f.write(f"Error bulk indexing {pdf_file}: {str(bulk_error)}\n")
-                            # Print the first few actions to debug
-                            f.write("\nFirst few actions that failed:\n")
-                            for i, action in enumerate(actions[:3]):
-                                f.write(f"Action {i}:\n")
-                                f.write(f"ID: {action['_id']}\n")
-                                f.write(f"Text length: {len(action['_source']['text'])}\n")
-                                f.write(f"Vector length: {len(action['_source']['vector'])}\n")
-                                f.write(f"Content type: {action['_source']['content_type']}\n")
-                                f.write("-" * 30 + "\n")
+                                result = stream_bulk(es, actions, max_in_flight=bulk_concurrency,
+                                                     on_indexed=on_indexed)
+                        if result["failed"]:
+                            document_error = f"{len(result['failed'])} chunks of {pdf_file} were rejected by bulk indexing"
+                            logger.error(f"{document_error}, e.g. {result['failed'][0]['_id']}: "
+                                         f"{result['failed'][0]['error']}")
+                            f.write(f"\nBulk indexing errors for {pdf_file}:\n")
+                            for item in result["failed"]:
+                                f.write(f"Error in item {item['_id']}: {item['error']}\n")
+                                metrics.record_bulk_failure(source_pdf, item["_id"], item["error"])
+                        elif failed_chunks:
+                            # Not recorded in the manifest so the next incremental run retries the file
+                            document_error = f"{len(failed_chunks)} chunks of {pdf_file} were not indexed"
+                            logger.warning(document_error)
+                            f.write(f"\n{document_error}\n")
+                        elif result["indexed"] or acked or duplicates:
+                            indexed = result["indexed"] - asset_count + len(acked)
+                            total_chunks += indexed
+                            successful_files += 1
+                            f.write(f"\nSuccessfully indexed {indexed} chunks from {pdf_file}\n")
+                            # Remove chunks left over from a previous version of this PDF
+                            with metrics.stage("cleanup", source_pdf):
+                                if delete_stale_chunks(source_pdf, pdf_sha256, len(chunks), index_name=index_name,
+                                                       local_index=local_index):
+                                    # Chunk ids are "<pdf sha256>_<index>"
+                                    canonical_pdfs = {duplicate_of.rsplit("_", 1)[0]
+                                                      for duplicate_of in duplicates.values()}
+                                    manifest.record(source_pdf, pdf_sha256, indexed,
+                                                    duplicate_of=canonical_pdfs - {pdf_sha256})
+                                    manifest.save()
+                                    if checkpoint is not None:
+                                        signatures = None
+                                        if near_duplicates is not None:
+                                            signatures = near_duplicates.export(
+                                                chunk_id(pdf_sha256, i) for i in range(len(chunks))
+                                            )
+                                        checkpoint.record_document(source_pdf, pdf_sha256, signatures=signatures)
+                                else:
+                                    document_error = f"Stale chunks of {pdf_file} could not be deleted"
+                    except Exception as bulk_error:
+                        document_error = f"Error bulk indexing {pdf_file}: {str(bulk_error)}"
+                        logger.error(document_error, exc_info=True)
+                        f.write(f"{document_error}\n")
+                    
+                    if document_error is not None:
+                        failed_files.append(source_pdf)
+                    if isinstance(embeddings, CachedEmbeddings):
+                        embeddings.flush()
+                    metrics.record_document(
+                        source_pdf,
+                        indexed > 0,
+                        pages=converted["num_pages"],
+                        chunks=indexed,
+                        bytes=len(cleaned_content.encode('utf-8')),
+                        failed_chunks=len(failed_chunks),
+                        character_chunks=len(chunk_documents),
+                        duplicate_chunks=len(duplicates),
+                        error=document_error
+                    )
                     
                 except Exception as file_error:
+                    failed_files.append(source_pdf)
+                    logger.error(f"Error processing file {pdf_file}: {str(file_error)}", exc_info=True)
                     f.write(f"Error processing file {pdf_file}: {str(file_error)}\n")
+                    metrics.record_document(source_pdf, False, error=str(file_error))
                     continue
             
             f.write(f"\nIndexing complete. Processed {successful_files}/{len(pdf_files)} files, {total_chunks} total chunks\n")
-            logger.info(f"Output written to {output_file}")
+            if token_chunker is not None and chunk_counts["chars"]:
+                reduction = 100.0 * (1 - chunk_counts["tokens"] / chunk_counts["chars"])
+                line = (f"Token chunking: {chunk_counts['tokens']} chunks instead of {chunk_counts['chars']} "
+                        f"with character chunking ({reduction:.0f}% fewer)")
+                f.write(f"\n{line}\n")
+                logger.info(line)
+            if near_duplicates is not None:
+                saved_requests = -(-dedup_counts["duplicates"] // embed_batch_size)
+                line = (f"Near-duplicate filter: {dedup_counts['duplicates']} of {dedup_counts['chunks']} chunks "
+                        f"were duplicates ({dedup}), saving {dedup_counts['duplicates']} embedding inputs "
+                        f"(about {saved_requests} requests)")
+                f.write(f"\n{line}\n")
+                logger.info(line)
+            f.write("\nConversion throughput:\n")
+            for line in conversion_stats.report_lines():
+                f.write(f"{line}\n")
+                logger.info(line)
+            if debug_dump:
+                logger.info(f"Output written to {output_file}")
         
         return successful_files > 0
         
@@ -453,17 +693,163 @@ def test_elasticsearch_connection():
         return False
 
 def delete_index_if_exists():
-    """Delete the index if it exists."""
+    """Delete the indices behind the alias, or a legacy index with the alias' name, if they exist."""
     try:
-        if es.indices.exists(index=MEDICAL_JOURNAL_INDEX_NAME):
-            logger.info(f"Deleting existing index {MEDICAL_JOURNAL_INDEX_NAME}")
-            es.indices.delete(index=MEDICAL_JOURNAL_INDEX_NAME)
-            logger.info(f"Successfully deleted index {MEDICAL_JOURNAL_INDEX_NAME}")
+        indices = get_alias_indices(es, MEDICAL_JOURNAL_INDEX_NAME)
+        if not indices and es.indices.exists(index=MEDICAL_JOURNAL_INDEX_NAME):
+            indices = [MEDICAL_JOURNAL_INDEX_NAME]
+        for index_name in indices:
+            logger.info(f"Deleting existing index {index_name}")
+            es.indices.delete(index=index_name)
+            logger.info(f"Successfully deleted index {index_name}")
         return True
     except Exception as e:
         logger.error(f"Error deleting index: {str(e)}", exc_info=True)
         return False
 
+def rebuild_index(embeddings, keep_old_indices=False, vector_options=None, checkpoint=None, resume=False, **options):
+    """
+    Rebuild the index without taking search offline.
+
+    PDFs are indexed into a new versioned index with refresh disabled and no
+    replicas. Only when every PDF was indexed completely are regular
+    settings restored, the index force-merged and the alias moved to it
+    atomically, so searches keep hitting the previous, complete index
+    until the swap. The manifest
+    of the new index replaces the current one only after the swap.
+
+    If the rebuild is interrupted or some PDFs fail, the new index, its
+    manifest and the checkpoint are kept and a resumed rebuild keeps
+    loading into the index named in the checkpoint. They are only removed
+    after the swap, or by a later run that does not resume.
+
+    Args:
+        embeddings: Embedding client
+        keep_old_indices (bool): Keep the indices the alias pointed to before
+        vector_options (dict): Vector storage options of the new index
+        checkpoint (IngestCheckpoint): Journal of the rebuild's progress
+        resume (bool): Continue the rebuild recorded in checkpoint
+        options: Passed on to process_and_index_pdfs
+
+    Returns:
+        bool: True if the alias was swapped to the new index, False if it
+            still points to the previous one, e.g. because a PDF failed
+    """
+    manifest = IndexManifest(f"{MANIFEST_PATH}.rebuild", get_manifest_settings(
+        options.get("chunking", CHUNKING_MODE), options.get("dedup", DEDUP_MODE)
+    ))
+    if resume:
+        index_name = checkpoint.run["index_name"]
+        logger.info(f"Resuming rebuild into {index_name}")
+    else:
+        index_name = setup_elasticsearch_index(bulk_load=True, vector_options=vector_options)
+        if not index_name:
+            return False
+        manifest.reset()
+        if checkpoint is not None:
+            checkpoint.start("rebuild", index_name, manifest.settings_key)
+    failed_files = []
+    indexed = process_and_index_pdfs(embeddings, manifest, index_name=index_name, checkpoint=checkpoint,
+                                     failed_files=failed_files, **options)
+    if not indexed or failed_files:
+        # An incomplete index never replaces the complete one
+        if failed_files:
+            logger.error(f"Rebuild incomplete, {len(set(failed_files))} PDFs were not fully indexed: "
+                         f"{', '.join(sorted(set(failed_files)))}")
+        # The new index and the journal are kept: --resume retries the PDFs that are not done,
+        # any other run discards them (see discard_interrupted_rebuild)
+        logger.error(f"Rebuild failed, {MEDICAL_JOURNAL_INDEX_NAME} still points to the previous index; "
+                     f"{index_name} is kept, run again with --resume to finish it")
+        return False
+
+    try:
+        logger.info(f"Finalizing {index_name}...")
+        finalize_bulk_load(es, index_name)
+        old_indices = swap_alias(es, MEDICAL_JOURNAL_INDEX_NAME, index_name)
+    except Exception as e:
+        logger.error(f"Error swapping {MEDICAL_JOURNAL_INDEX_NAME} to {index_name}: {str(e)}", exc_info=True)
+        return False
+    manifest.save()
+    os.replace(manifest.path, MANIFEST_PATH)
+
+    if not keep_old_indices:
+        for old_index in old_indices:
+            logger.info(f"Deleting previous index {old_index}")
+            es.indices.delete(index=old_index)
+    return True
+
+def discard_interrupted_rebuild(checkpoint):
+    """Delete the index of an interrupted rebuild that is not going to be resumed."""
+    if checkpoint.run is None or checkpoint.run["mode"] != "rebuild":
+        return
+    index_name = checkpoint.run["index_name"]
+    if index_name in get_alias_indices(es, MEDICAL_JOURNAL_INDEX_NAME):
+        return
+    if es.indices.exists(index=index_name):
+        logger.info(f"Deleting index {index_name} of an interrupted rebuild")
+        es.indices.delete(index=index_name)
+
+def publish_index_changes():
+    """Refresh the index and bump its generation so searchers drop their cached results."""
+    try:
+        es.indices.refresh(index=MEDICAL_JOURNAL_INDEX_NAME)
+        bump_index_generation(es, MEDICAL_JOURNAL_INDEX_NAME)
+    except Exception as e:
+        logger.error(f"Error publishing changes of {MEDICAL_JOURNAL_INDEX_NAME}: {str(e)}", exc_info=True)
+
+def index_locally(embeddings, manifest, mode, checkpoint, resume=False, **options):
+    """
+    Index PDFs into the embedded local index instead of Elasticsearch.
+
+    Changes are staged by LocalIndexWriter and only become visible to
+    searches when they are committed at the end, so "full" and "rebuild"
+    both replace the old content in one step. Changes staged by an
+    interrupted run are kept for --resume and discarded otherwise.
+
+    Returns:
+        bool: True if the PDFs were indexed and committed
+    """
+    writer = LocalIndexWriter(LOCAL_INDEX_DIR)
+    try:
+        if not resume:
+            writer.discard_staged()
+            if mode in ("full", "rebuild") or writer.current is None:
+                logger.info(f"Indexing into a new local index in {LOCAL_INDEX_DIR}")
+                writer.delete_all()
+                manifest.reset()
+                manifest.save()
+            else:
+                logger.info(f"Updating the local index in {LOCAL_INDEX_DIR}")
+            checkpoint.start(mode, LOCAL_INDEX_DIR, manifest.settings_key)
+        if not process_and_index_pdfs(embeddings, manifest, incremental=(mode == "incremental"),
+                                      checkpoint=checkpoint, local_index=writer, **options):
+            return False
+        writer.commit(ivf_lists=LOCAL_IVF_LISTS)
+        return True
+    except Exception as e:
+        logger.error(f"Error indexing into the local index: {str(e)}", exc_info=True)
+        return False
+    finally:
+        writer.close()
+
+def log_metrics_summary(summary):
+    """Log the end-of-run ingestion summary."""
+    logger.info(
+        f"Ingested {summary['documents']} documents ({summary['failed_documents']} failed), "
+        f"{summary['pages']} pages, {summary['chunks']} chunks in {summary['elapsed_seconds']:.1f}s "
+        f"({summary['pages_per_second']:.2f} pages/s, {summary['chunks_per_second']:.2f} chunks/s)"
+    )
+    for stage, stats in summary["stages"].items():
+        logger.info(
+            f"Stage {stage}: {stats['count']} runs, {stats['total_seconds']:.1f}s total, "
+            f"p50 {stats['p50_seconds']:.3f}s, p95 {stats['p95_seconds']:.3f}s"
+        )
+    batches = summary["embedding_batches"]
+    logger.info(
+        f"Embedding requests: {batches['count']}, p50 {batches['p50_seconds']:.3f}s, "
+        f"p95 {batches['p95_seconds']:.3f}s; bulk failures: {summary['bulk_failures']}"
+    )
+
 def main():
     """Main function to setup and index PDFs."""
     try:
@@ -471,37 +857,159 @@ def main():
         parser = argparse.ArgumentParser(description='Index medical journal PDFs into Elasticsearch')
         parser.add_argument('--append', action='store_true', 
                           help='Append to existing index instead of deleting it')
+        parser.add_argument('--incremental', action='store_true',
+                          help='Only index new or changed PDFs and remove chunks of deleted PDFs')
+        parser.add_argument('--rebuild', action='store_true',
+                          help='Rebuild into a new index and swap the alias to it once loading succeeds')
+        parser.add_argument('--resume', action='store_true',
+                          help='Continue an interrupted run where it stopped, skipping indexed PDFs and chunks')
+        parser.add_argument('--keep-old-indices', action='store_true',
+                          help='Keep the previous index after a rebuild swapped the alias')
+        parser.add_argument('--vector-index-type', choices=VECTOR_INDEX_TYPES, default=VECTOR_INDEX_TYPE,
+                          help='HNSW vector storage of newly created indices; int8/int4 quantize the vectors')
+        parser.add_argument('--hnsw-m', type=int, default=HNSW_M,
+                          help='HNSW neighbours per node of newly created indices')
+        parser.add_argument('--hnsw-ef-construction', type=int, default=HNSW_EF_CONSTRUCTION,
+                          help='HNSW candidates considered while building the graph of newly created indices')
+        parser.add_argument('--chunking', choices=["chars", "tokens"], default=CHUNKING_MODE,
+                          help='Cut chunks by characters, or pack them up to CHUNK_TOKENS tokens without splitting tables')
+        parser.add_argument('--dedup', choices=DEDUP_MODES, default=DEDUP_MODE,
+                          help='Skip near-duplicate chunks, or link them to the first occurrence without embedding them')
+        parser.add_argument('--workers', type=int, default=1,
+                          help='Number of processes converting PDFs in parallel')
+        parser.add_argument('--embed-batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                          help='Number of chunks per embedding request')
+        parser.add_argument('--embed-concurrency', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                          help='Number of embedding requests in flight')
+        parser.add_argument('--bulk-concurrency', type=int, default=DEFAULT_BULK_IN_FLIGHT,
+                          help='Number of bulk indexing requests in flight')
+        parser.add_argument('--embedding-cache-dir', default=EMBEDDING_CACHE_DIR,
+                          help='Directory of the on-disk embedding cache')
+        parser.add_argument('--embedding-cache-max-entries', type=int, default=1_000_000,
+                          help='Maximum number of vectors kept in the embedding cache')
+        parser.add_argument('--no-embedding-cache', action='store_true',
+                          help='Always embed chunks through watsonx.ai')
+        parser.add_argument('--conversion-cache-dir', default=CONVERSION_CACHE_DIR,
+                          help='Directory of cached Docling conversions')
+        parser.add_argument('--no-conversion-cache', action='store_true',
+                          help='Always convert PDFs with Docling')
+        parser.add_argument('--metrics-file', default=METRICS_PATH,
+                          help='JSON lines file receiving per-document and per-stage metrics')
+        parser.add_argument('--debug-dump', action='store_true',
+                          help='Also write table, image and chunk contents to pdf_processing_output.txt')
         args = parser.parse_args()
+        vector_options = {
+            "index_type": args.vector_index_type,
+            "m": args.hnsw_m,
+            "ef_construction": args.hnsw_ef_construction
+        }
 
-        # Initialize embeddings
-        embeddings = initialize_watsonx()
-        
-        # Check if index exists
-        index_exists = es.indices.exists(index=MEDICAL_JOURNAL_INDEX_NAME)
-        
-        if not index_exists:
-            logger.info(f"Index {MEDICAL_JOURNAL_INDEX_NAME} does not exist. Creating new index...")
-            if not setup_elasticsearch_index():
-                logger.error("Failed to setup Elasticsearch index")
-                return
-        elif not args.append:
-            # Delete existing index if not in append mode
-            logger.info(f"Deleting existing index {MEDICAL_JOURNAL_INDEX_NAME}...")
-            if not delete_index_if_exists():
-                logger.error("Failed to delete existing index")
+        # Initialize embeddings, reusing vectors of chunks embedded by earlier runs
+        embedding_client = initialize_watsonx(max_in_flight=args.embed_concurrency)
+        embeddings = embedding_client
+        if not args.no_embedding_cache:
+            embedding_cache = EmbeddingCache(
+                args.embedding_cache_dir,
+                EMBEDDING_MODEL_ID,
+                TRUNCATE_INPUT_TOKENS,
+                max_entries=args.embedding_cache_max_entries
+            )
+            embeddings = CachedEmbeddings(embeddings, embedding_cache)
+        conversion_cache = None
+        if not args.no_conversion_cache:
+            conversion_cache = ConversionCache(
+                args.conversion_cache_dir, build_pipeline_options(), conversion_cache_version()
+            )
+        manifest = IndexManifest(MANIFEST_PATH, get_manifest_settings(args.chunking, args.dedup))
+        metrics = IngestMetrics(args.metrics_file)
+        index_options = {
+            "workers": args.workers,
+            "embed_batch_size": args.embed_batch_size,
+            "embed_concurrency": args.embed_concurrency,
+            "bulk_concurrency": args.bulk_concurrency,
+            "conversion_cache": conversion_cache,
+            "metrics": metrics,
+            "debug_dump": args.debug_dump,
+            "chunking": args.chunking,
+            "dedup": args.dedup
+        }
+
+        checkpoint = IngestCheckpoint(CHECKPOINT_PATH)
+        if args.resume:
+            if checkpoint.run is None:
+                logger.error(f"No interrupted run to resume in {CHECKPOINT_PATH}")
                 return
-            # Create new index
-            if not setup_elasticsearch_index():
-                logger.error("Failed to setup Elasticsearch index")
+            if checkpoint.run["settings"] != manifest.settings_key:
+                logger.error("Chunking or embedding settings changed since the interrupted run, cannot resume")
                 return
+            checkpoint.resume()
+            mode = checkpoint.run["mode"]
+            logger.info(f"Resuming {mode} run into {checkpoint.run['index_name']}")
         else:
-            logger.info(f"Appending to existing index {MEDICAL_JOURNAL_INDEX_NAME}")
+            mode = "rebuild" if args.rebuild else "incremental" if args.incremental else "append" if args.append else "full"
+            if es is not None:
+                discard_interrupted_rebuild(checkpoint)
+
+        if SEARCH_BACKEND == "local":
+            success = index_locally(embeddings, manifest, mode, checkpoint, resume=args.resume, **index_options)
+            if not success:
+                logger.error("Failed to index PDFs into the local index")
+        elif mode == "rebuild":
+            success = rebuild_index(embeddings, keep_old_indices=args.keep_old_indices, vector_options=vector_options,
+                                    checkpoint=checkpoint, resume=args.resume, **index_options)
+            if not success:
+                logger.error("Failed to rebuild index")
+        else:
+            if not args.resume:
+                # Check if index exists
+                index_exists = es.indices.exists(index=MEDICAL_JOURNAL_INDEX_NAME)
+                
+                if not index_exists:
+                    logger.info(f"Index {MEDICAL_JOURNAL_INDEX_NAME} does not exist. Creating new index...")
+                    if not setup_elasticsearch_index(vector_options=vector_options):
+                        logger.error("Failed to setup Elasticsearch index")
+                        return
+                    manifest.reset()
+                    manifest.save()
+                elif mode == "full":
+                    # Delete existing index if not in append mode
+                    logger.info(f"Deleting existing index {MEDICAL_JOURNAL_INDEX_NAME}...")
+                    if not delete_index_if_exists():
+                        logger.error("Failed to delete existing index")
+                        return
+                    # Create new index
+                    if not setup_elasticsearch_index(vector_options=vector_options):
+                        logger.error("Failed to setup Elasticsearch index")
+                        return
+                    manifest.reset()
+                    manifest.save()
+                else:
+                    logger.info(f"Appending to existing index {MEDICAL_JOURNAL_INDEX_NAME}")
+                checkpoint.start(mode, MEDICAL_JOURNAL_INDEX_NAME, manifest.settings_key)
+            
+            # Process and index PDFs
+            success = process_and_index_pdfs(
+                embeddings,
+                manifest,
+                incremental=(mode == "incremental"),
+                checkpoint=checkpoint,
+                **index_options
+            )
+            if not success:
+                logger.error("Failed to process and index PDFs")
+            # Even a failed run may have written chunks
+            publish_index_changes()
         
-        # Process and index PDFs
-        if not process_and_index_pdfs(embeddings):
-            logger.error("Failed to process and index PDFs")
+        log_metrics_summary(metrics.close())
+        if not success:
+            # Keep the journal so the run can be continued with --resume
+            checkpoint.close()
             return
+        checkpoint.clear()
         
+        if isinstance(embeddings, CachedEmbeddings):
+            logger.info(f"Embedding cache: {embeddings.cache.hits} hits, {embeddings.cache.misses} misses")
+        logger.info(f"watsonx.ai requests retried after throttling or errors: {embedding_client.throttled}")
         logger.info("Indexing complete")
             
     except Exception as e:
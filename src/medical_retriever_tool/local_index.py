@@ -0,0 +1,563 @@
+import os
+import re
+import json
+import mmap
+import shutil
+import logging
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stop words of Elasticsearch's _english_ list, as removed by medical_text_analyzer
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that the their then "
+    "there these they this to was will with".split()
+)
+# Searched fields and their boosts, as in the Elasticsearch multi_match queries
+BM25_FIELDS = {"text": 2.0, "caption": 1.5, "description": 1.2, "ocr_text": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_NPROBE = 8
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def analyze(text):
+    """Lower-cased word tokens of text without stop words."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+def highlight_fragments(text, query, fragment_size=150, number_of_fragments=3, no_match_size=150):
+    """
+    Best fragments of text for query, like an Elasticsearch highlight without tags.
+
+    text is cut at word boundaries into fragments of about fragment_size
+    characters, which are ranked by the distinct query terms they contain,
+    each weighted by the inverse of its frequency in text so that rare terms
+    count more. Without any match the first no_match_size characters are
+    returned.
+    """
+    terms = set(analyze(query))
+    term_counts = Counter(token for token in analyze(text) if token in terms)
+    fragments = []
+    start = 0
+    for match in re.finditer(r"\S+", text):
+        if match.end() - start > fragment_size and match.start() > start:
+            fragments.append((start, match.start()))
+            start = match.start()
+    if start < len(text):
+        fragments.append((start, len(text)))
+    scored = []
+    for position, (fragment_start, fragment_end) in enumerate(fragments):
+        fragment = text[fragment_start:fragment_end].strip()
+        score = sum(1 / term_counts[term] for term in terms.intersection(analyze(fragment)))
+        if score:
+            scored.append((-score, position, fragment))
+    if not scored:
+        return [text[:no_match_size].strip()] if no_match_size and text.strip() else []
+    return [fragment for _, _, fragment in sorted(scored)[:number_of_fragments]]
+
+def is_searchable(source, has_vector):
+    """Documents searches return: chunks with a vector that are not linked near-duplicates."""
+    return has_vector and "duplicate_of" not in source and source.get("content_type") != "page_assets"
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+class LocalIndex:
+    """
+    Read-only, memory-mapped local retrieval index.
+
+    One index version is a directory holding the unit-normalized vectors as
+    an N x dims float32 .npy file, the documents' _source as JSON lines with
+    their byte offsets, and a BM25 inverted index per searched field stored
+    as CSR arrays (term -> rows and term frequencies). Opening an index
+    maps these files; nothing is parsed except the id list and vocabulary.
+    With IVF lists, vector search only scores the rows of the nprobe lists
+    whose centroids are closest to the query instead of every row.
+    """
+
+    def __init__(self, version_dir):
+        self.version_dir = version_dir
+        with open(self._path("meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(self._path("ids.json"), 'r', encoding='utf-8') as f:
+            self.ids = json.load(f)
+        with open(self._path("vocab.json"), 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.vectors = np.load(self._path("vectors.npy"), mmap_mode='r')
+        self.searchable = np.load(self._path("searchable.npy"), mmap_mode='r')
+        self.offsets = np.load(self._path("offsets.npy"), mmap_mode='r')
+        self._sources_file = open(self._path("sources.jsonl"), 'rb')
+        self._sources = (mmap.mmap(self._sources_file.fileno(), 0, access=mmap.ACCESS_READ)
+                         if self.offsets[-1] else b"")
+        self.postings = {
+            field: {
+                name: np.load(self._path(f"bm25_{field}_{name}.npy"), mmap_mode='r')
+                for name in ("indptr", "rows", "tfs", "lengths")
+            }
+            for field in BM25_FIELDS
+        }
+        self.centroids = None
+        if self.meta.get("ivf_lists"):
+            self.centroids = np.load(self._path("ivf_centroids.npy"))
+            self.ivf_indptr = np.load(self._path("ivf_indptr.npy"), mmap_mode='r')
+            self.ivf_rows = np.load(self._path("ivf_rows.npy"), mmap_mode='r')
+
+    def _path(self, name):
+        return os.path.join(self.version_dir, name)
+
+    @classmethod
+    def open(cls, index_dir, attempts=3):
+        """
+        Open the current version of the index in index_dir, None if there is none.
+
+        A writer only deletes a version two commits after it stopped being
+        current; if one disappears while it is being opened, CURRENT has
+        moved on and the new current version is opened instead.
+        """
+        current_path = os.path.join(index_dir, "CURRENT")
+        for attempt in range(attempts):
+            if not os.path.exists(current_path):
+                return None
+            with open(current_path, 'r', encoding='utf-8') as f:
+                version = f.read().strip()
+            try:
+                return cls(os.path.join(index_dir, version))
+            except FileNotFoundError:
+                with open(current_path, 'r', encoding='utf-8') as f:
+                    if attempt == attempts - 1 or f.read().strip() == version:
+                        raise
+
+    def __len__(self):
+        return len(self.ids)
+
+    def source(self, row):
+        return json.loads(self._sources[self.offsets[row]:self.offsets[row + 1]])
+
+    def get(self, ids):
+        """_source of the documents with the given ids that exist."""
+        return {doc_id: self.source(self.rows[doc_id]) for doc_id in ids if doc_id in self.rows}
+
+    def bm25_scores(self, query):
+        """BM25 score of every row for query, the best boosted field score per row."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        terms = Counter(analyze(query))
+        for field, boost in BM25_FIELDS.items():
+            postings = self.postings[field]
+            doc_count = self.meta["fields"][field]["doc_count"]
+            avg_length = self.meta["fields"][field]["avg_length"]
+            if not doc_count:
+                continue
+            field_scores = np.zeros(len(self.ids), dtype=np.float32)
+            for term, query_count in terms.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    continue
+                start, end = postings["indptr"][term_id], postings["indptr"][term_id + 1]
+                if start == end:
+                    continue
+                rows = postings["rows"][start:end]
+                tfs = postings["tfs"][start:end]
+                idf = np.log(1 + (doc_count - (end - start) + 0.5) / ((end - start) + 0.5))
+                norms = BM25_K1 * (1 - BM25_B + BM25_B * postings["lengths"][rows] / avg_length)
+                field_scores[rows] += query_count * boost * idf * tfs / (tfs + norms)
+            np.maximum(scores, field_scores, out=scores)
+        return scores
+
+    def vector_scores(self, query_vector, nprobe=None):
+        """
+        kNN score, (1 + cosine similarity) / 2 as in Elasticsearch, of searchable rows to query_vector.
+
+        Returns:
+            tuple: (rows, scores) arrays; all searchable rows, or with IVF and
+                nprobe the rows of the nprobe closest lists
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        if nprobe and self.centroids is not None:
+            lists = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate([self.ivf_rows[self.ivf_indptr[i]:self.ivf_indptr[i + 1]] for i in lists])
+            rows.sort()
+            return rows, (self.vectors[rows] @ query + 1.0) / 2
+        rows = np.flatnonzero(self.searchable)
+        return rows, ((self.vectors @ query)[rows] + 1.0) / 2
+
+    @staticmethod
+    def _top(rows, scores, k):
+        """Positions of the k best scores, best first."""
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    def search(self, query, query_vector, search_type, k, nprobe=DEFAULT_NPROBE, bm25_filter=False):
+        """
+        Search like the Elasticsearch backend does.
+
+        "bm25" ranks by BM25 alone and "vector" returns the k nearest
+        neighbours by kNN score. "hybrid" adds the kNN score of the k
+        nearest neighbours to the BM25 score, over the chunks matching the
+        query or among the neighbours, like a search with query and knn.
+
+        Args:
+            bm25_filter (bool): Only consider neighbours matching the query
+
+        Returns:
+            list: Hits as {"_id", "_score", "_source"} dicts
+        """
+        if search_type not in ("bm25", "vector", "hybrid"):
+            raise ValueError(f"Invalid search type: {search_type}")
+        bm25 = None
+        if search_type != "vector" or bm25_filter:
+            bm25 = self.bm25_scores(query)
+        if search_type == "bm25":
+            rows = np.flatnonzero(self.searchable & (bm25 > 0))
+            scores = bm25[rows]
+        else:
+            rows, scores = self.vector_scores(query_vector, nprobe)
+            if bm25_filter:
+                matching = bm25[rows] > 0
+                rows, scores = rows[matching], scores[matching]
+            top = self._top(rows, scores, k)
+            rows, scores = rows[top], scores[top]
+            if search_type == "hybrid":
+                combined = np.where(self.searchable & (bm25 > 0), bm25, 0).astype(np.float32)
+                combined[rows] += scores
+                rows = np.union1d(np.flatnonzero(combined > 0), rows)
+                scores = combined[rows]
+
+        return [
+            {"_id": self.ids[rows[i]], "_score": float(scores[i]), "_source": self.source(rows[i])}
+            for i in self._top(rows, scores, k)
+        ]
+
+    def close(self):
+        if isinstance(self._sources, mmap.mmap):
+            self._sources.close()
+        self._sources_file.close()
+
+class LocalIndexWriter:
+    """
+    Builds LocalIndex versions from bulk index actions.
+
+    Indexed and deleted documents are appended to a staging log, and their
+    vectors to a staging vector file, both fsynced for every batch, so
+    staged changes survive a crash and are replayed when a writer is opened
+    again. commit() merges the current version with the staged changes into
+    a new version directory and switches CURRENT to it. The previous
+    version is kept until the next commit, so searchers that read CURRENT
+    just before the switch can still open it.
+    """
+
+    def __init__(self, index_dir, dims=768):
+        self.index_dir = index_dir
+        self.dims = dims
+        os.makedirs(index_dir, exist_ok=True)
+        self._log_path = os.path.join(index_dir, "staged.jsonl")
+        self._vectors_path = os.path.join(index_dir, "staged_vectors.f32")
+        self.current = LocalIndex.open(index_dir)
+        # Id -> (source_pdf, pdf_sha256, chunk_index) of every live document
+        self._docs = self._committed_docs()
+        self._staged_rows = self._recover_vectors()
+        for entry in self._staged_entries():
+            self._apply(entry)
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._vectors = open(self._vectors_path, 'ab')
+
+    def _committed_docs(self):
+        if self.current is None:
+            return {}
+        return {doc_id: self._doc_key(self.current.source(row)) for row, doc_id in enumerate(self.current.ids)}
+
+    @staticmethod
+    def _doc_key(source):
+        return source.get("source_pdf"), source.get("pdf_sha256"), source.get("chunk_index")
+
+    def _recover_vectors(self):
+        """Drop a partly written vector at the end of the staging file; return the row count."""
+        if not os.path.exists(self._vectors_path):
+            return 0
+        row_bytes = self.dims * 4
+        rows = os.path.getsize(self._vectors_path) // row_bytes
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(rows * row_bytes)
+        return rows
+
+    def _staged_entries(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring unreadable line of {self._log_path}")
+                    continue
+                if entry.get("row") is not None and entry["row"] >= self._staged_rows:
+                    continue
+                yield entry
+
+    def _apply(self, entry):
+        if entry["op"] == "index":
+            self._docs[entry["_id"]] = self._doc_key(entry["_source"])
+        elif entry["op"] == "delete":
+            self._docs.pop(entry["_id"], None)
+        elif entry["op"] == "clear":
+            self._docs = {}
+
+    def _append(self, entries):
+        for entry in entries:
+            self._log.write(json.dumps(entry) + "\n")
+            self._apply(entry)
+        _fsync(self._log)
+
+    def index_actions(self, actions, on_indexed=None, batch_size=500):
+        """
+        Stage bulk index actions.
+
+        Args:
+            actions: Iterable of {"_id", "_source"} actions; a "vector" in
+                _source is stored in the vector matrix, not in _source
+            on_indexed (callable): Called with the ids of every durable batch
+            batch_size (int): Actions per fsynced batch
+
+        Returns:
+            dict: "indexed" count and "failed" items, like bulk_sink.stream_bulk
+        """
+        indexed = 0
+        batch = []
+
+        def flush():
+            entries = []
+            for action in batch:
+                source = dict(action["_source"])
+                vector = source.pop("vector", None)
+                row = None
+                if vector is not None:
+                    self._vectors.write(np.asarray(vector, dtype=np.float32).tobytes())
+                    row = self._staged_rows
+                    self._staged_rows += 1
+                entries.append({"op": "index", "_id": action["_id"], "_source": source, "row": row})
+            _fsync(self._vectors)
+            self._append(entries)
+            if on_indexed is not None:
+                on_indexed([entry["_id"] for entry in entries])
+
+        for action in actions:
+            batch.append(action)
+            if len(batch) >= batch_size:
+                flush()
+                indexed += len(batch)
+                batch = []
+        if batch:
+            flush()
+            indexed += len(batch)
+        return {"indexed": indexed, "failed": []}
+
+    def delete_stale(self, source_pdf, pdf_sha256=None, chunk_count=0):
+        """Stage deletes like delete_stale_chunks' query; return the number of documents deleted."""
+        stale = [
+            doc_id for doc_id, (doc_pdf, doc_sha256, chunk_index) in self._docs.items()
+            if doc_pdf == source_pdf and (
+                pdf_sha256 is None or doc_sha256 != pdf_sha256
+                or (chunk_index is not None and chunk_index >= chunk_count)
+            )
+        ]
+        self._append({"op": "delete", "_id": doc_id} for doc_id in stale)
+        return len(stale)
+
+    def delete_all(self):
+        self._append([{"op": "clear"}])
+
+    def discard_staged(self):
+        """Drop the changes staged since the last commit."""
+        for f in (self._log, self._vectors):
+            f.truncate(0)
+            _fsync(f)
+        self._staged_rows = 0
+        self._docs = self._committed_docs()
+
+    def commit(self, ivf_lists=0):
+        """
+        Write a new index version with the staged changes and make it current.
+
+        The whole version is rewritten, and the _source of every document
+        is held in memory while its BM25 postings are built, so memory
+        grows with the size of the index, not just with the changes.
+
+        Args:
+            ivf_lists (int): Number of IVF lists for vector search, 0 for
+                exact search only
+
+        Returns:
+            LocalIndex: The new current version
+        """
+        self._log.close()
+        self._vectors.close()
+        staged_vectors = None
+        if self._staged_rows:
+            staged_vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                       shape=(self._staged_rows, self.dims))
+
+        # Final documents in order: ("committed", row) or ("staged", source, vector row)
+        docs = {}
+        if self.current is not None:
+            docs = {doc_id: ("committed", row) for row, doc_id in enumerate(self.current.ids)}
+        for entry in self._staged_entries():
+            if entry["op"] == "index":
+                docs.pop(entry["_id"], None)
+                docs[entry["_id"]] = ("staged", entry["_source"], entry["row"])
+            elif entry["op"] == "delete":
+                docs.pop(entry["_id"], None)
+            elif entry["op"] == "clear":
+                docs = {}
+
+        previous = os.path.basename(self.current.version_dir) if self.current is not None else None
+        version = f"v{int(previous[1:]) + 1}" if previous else "v1"
+        version_dir = os.path.join(self.index_dir, version)
+        if os.path.exists(version_dir):
+            shutil.rmtree(version_dir)
+        os.makedirs(version_dir)
+
+        ids = list(docs)
+        vectors = np.lib.format.open_memmap(os.path.join(version_dir, "vectors.npy"), mode='w+',
+                                            dtype=np.float32, shape=(len(ids), self.dims))
+        searchable = np.zeros(len(ids), dtype=bool)
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        sources = []
+        with open(os.path.join(version_dir, "sources.jsonl"), 'wb') as f:
+            for row, doc_id in enumerate(ids):
+                doc = docs[doc_id]
+                if doc[0] == "committed":
+                    source = self.current.source(doc[1])
+                    vectors[row] = self.current.vectors[doc[1]]
+                    has_vector = bool(self.current.searchable[doc[1]]) or bool(np.any(vectors[row]))
+                else:
+                    source = doc[1]
+                    has_vector = doc[2] is not None
+                    if has_vector:
+                        vector = np.asarray(staged_vectors[doc[2]])
+                        vectors[row] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+                searchable[row] = is_searchable(source, has_vector)
+                line = json.dumps(source).encode('utf-8')
+                f.write(line)
+                offsets[row + 1] = offsets[row] + len(line)
+                sources.append(source)
+        vectors.flush()
+        np.save(os.path.join(version_dir, "searchable.npy"), searchable)
+        np.save(os.path.join(version_dir, "offsets.npy"), offsets)
+        with open(os.path.join(version_dir, "ids.json"), 'w', encoding='utf-8') as f:
+            json.dump(ids, f)
+
+        meta = {"dims": self.dims, "count": len(ids), "fields": self._write_bm25(version_dir, ids, sources, searchable)}
+        meta["ivf_lists"] = self._write_ivf(version_dir, vectors, searchable, ivf_lists)
+        with open(os.path.join(version_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        del vectors, staged_vectors
+
+        current_path = os.path.join(self.index_dir, "CURRENT")
+        with open(f"{current_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(f"{current_path}.tmp", current_path)
+        for path in (self._log_path, self._vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if self.current is not None:
+            self.current.close()
+        # Searchers may still be opening the previous version, only older ones go
+        for name in os.listdir(self.index_dir):
+            if name not in (version, previous) and name.startswith("v") and name[1:].isdigit():
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+        logger.info(f"Committed local index {version} with {len(ids)} documents")
+
+        self.current = LocalIndex(version_dir)
+        self._staged_rows = 0
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._vectors = open(self._vectors_path, 'ab')
+        return self.current
+
+    def _field_texts(self, source, page_assets):
+        """Text of every BM25 field of a chunk; image fields come from its page's images."""
+        images = page_assets.get(source.get("assets_id"), {}).get("images", [])
+        texts = {"text": source.get("text") or ""}
+        for field in ("caption", "description", "ocr_text"):
+            texts[field] = " ".join(str(image.get(field) or "") for image in images)
+        return texts
+
+    def _write_bm25(self, version_dir, ids, sources, searchable):
+        page_assets = {
+            doc_id: source.get("metadata", {})
+            for doc_id, source in zip(ids, sources) if source.get("content_type") == "page_assets"
+        }
+        vocab = {}
+        postings = {field: {} for field in BM25_FIELDS}
+        lengths = {field: np.zeros(len(ids), dtype=np.float32) for field in BM25_FIELDS}
+        for row in np.flatnonzero(searchable):
+            for field, text in self._field_texts(sources[row], page_assets).items():
+                tokens = analyze(text)
+                lengths[field][row] = len(tokens)
+                for term, tf in Counter(tokens).items():
+                    term_id = vocab.setdefault(term, len(vocab))
+                    postings[field].setdefault(term_id, []).append((row, tf))
+
+        fields = {}
+        for field in BM25_FIELDS:
+            indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+            rows, tfs = [], []
+            for term_id in range(len(vocab)):
+                term_postings = postings[field].get(term_id, [])
+                indptr[term_id + 1] = indptr[term_id] + len(term_postings)
+                rows.extend(row for row, _ in term_postings)
+                tfs.extend(tf for _, tf in term_postings)
+            arrays = {
+                "indptr": indptr,
+                "rows": np.asarray(rows, dtype=np.int32),
+                "tfs": np.asarray(tfs, dtype=np.float32),
+                "lengths": lengths[field]
+            }
+            for name, array in arrays.items():
+                np.save(os.path.join(version_dir, f"bm25_{field}_{name}.npy"), array)
+            doc_count = int(np.count_nonzero(lengths[field]))
+            fields[field] = {
+                "doc_count": doc_count,
+                "avg_length": float(lengths[field].sum() / doc_count) if doc_count else 0.0
+            }
+        with open(os.path.join(version_dir, "vocab.json"), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f)
+        return fields
+
+    def _write_ivf(self, version_dir, vectors, searchable, ivf_lists, iterations=10):
+        """Cluster searchable vectors with spherical k-means; return the number of lists written."""
+        rows = np.flatnonzero(searchable)
+        if not ivf_lists or len(rows) < ivf_lists * 4:
+            return 0
+        rng = np.random.default_rng(0)
+        sample = np.asarray(vectors[rng.choice(rows, min(len(rows), ivf_lists * 256), replace=False)])
+        centroids = sample[rng.choice(len(sample), ivf_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(ivf_lists):
+                members = sample[assignment == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+        assignment = np.concatenate([
+            np.argmax(np.asarray(vectors[rows[start:start + 65536]]) @ centroids.T, axis=1)
+            for start in range(0, len(rows), 65536)
+        ])
+        order = np.argsort(assignment, kind='stable')
+        indptr = np.zeros(ivf_lists + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(assignment, minlength=ivf_lists))
+        np.save(os.path.join(version_dir, "ivf_centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(version_dir, "ivf_indptr.npy"), indptr)
+        np.save(os.path.join(version_dir, "ivf_rows.npy"), rows[order].astype(np.int64))
+        return ivf_lists
+
+    def close(self):
+        self._log.close()
+        self._vectors.close()
+        if self.current is not None:
+            self.current.close()
@@ -0,0 +1,106 @@
+import re
+import hashlib
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 5
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def shingles(text, size=DEFAULT_SHINGLE_SIZE):
+    """Set of size-word shingles of the lower-cased words of text."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of chunk texts for near-duplicate detection.
+
+    Each text is reduced to a MinHash signature of num_perm 64-bit hashes
+    over its word shingles. Signatures are split into bands; texts sharing
+    any band are candidates, and a candidate is a duplicate when the share
+    of equal signature values (the Jaccard similarity estimate) reaches
+    threshold. With the defaults, texts with a Jaccard similarity of 0.8
+    are found with a probability above 0.99.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                 shingle_size=DEFAULT_SHINGLE_SIZE):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(1)
+        self._seeds = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64)
+        # Odd multipliers make the multiply-xor hashes permutations of the 64-bit space
+        self._multipliers = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, text):
+        """MinHash signature of text, None for text without words."""
+        text_shingles = shingles(text, self.shingle_size)
+        if not text_shingles:
+            return None
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+             for shingle in text_shingles),
+            dtype=np.uint64,
+            count=len(text_shingles)
+        )
+        permuted = (hashes[:, None] ^ self._seeds) * self._multipliers
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def find(self, signature):
+        """Key of an indexed text similar to the signature, or None."""
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        best, best_similarity = None, self.threshold
+        for key in candidates:
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+    def add(self, key, signature):
+        self._signatures[key] = signature
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def export(self, keys):
+        """Hex signatures of the indexed texts among keys, to be restored with load."""
+        return {key: self._signatures[key].tobytes().hex() for key in keys if key in self._signatures}
+
+    def load(self, signatures):
+        """Index the signatures of an earlier run, as returned by export."""
+        for key, signature in signatures.items():
+            self.add(key, np.frombuffer(bytes.fromhex(signature), dtype=np.uint64))
+
+    def check(self, key, text):
+        """
+        Return the key of an earlier near-duplicate of text, or None.
+
+        A text without a near-duplicate is indexed under key so later texts
+        can be matched against it.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        duplicate_of = self.find(signature)
+        if duplicate_of is None:
+            self.add(key, signature)
+        return duplicate_of
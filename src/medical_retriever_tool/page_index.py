@@ -0,0 +1,76 @@
+from bisect import bisect_right
+
+class PageIndex:
+    """
+    Page lookups for the chunks of one document.
+
+    Built once per document from its per-page text, tables and images: a
+    sorted list of page start offsets in the joined document text maps a
+    chunk's character offset to its page, and page -> tables/images
+    dictionaries give the content on that page without scanning.
+    """
+
+    def __init__(self, page_starts, page_numbers, tables, images):
+        self.page_starts = page_starts
+        self.page_numbers = page_numbers
+        self.tables_by_page = {}
+        for table in tables:
+            self.tables_by_page.setdefault(table["page_number"], []).append(table)
+        self.images_by_page = {}
+        for image in images:
+            self.images_by_page.setdefault(image["page_number"], []).append(image)
+
+    @classmethod
+    def from_pages(cls, pages, tables, images, separator="\n"):
+        """
+        Join per-page text into one document text and index page offsets.
+
+        Args:
+            pages (list): (page_number, text) pairs in page order
+            tables (list): Table dicts with a "page_number"
+            images (list): Image dicts with a "page_number"
+            separator (str): Text placed between pages
+
+        Returns:
+            tuple: (PageIndex, joined document text)
+        """
+        page_starts = []
+        page_numbers = []
+        parts = []
+        offset = 0
+        for page_number, text in pages:
+            if not text:
+                continue
+            if parts:
+                parts.append(separator)
+                offset += len(separator)
+            page_starts.append(offset)
+            page_numbers.append(page_number)
+            parts.append(text)
+            offset += len(text)
+        return cls(page_starts, page_numbers, tables, images), "".join(parts)
+
+    def page_for_offset(self, offset):
+        """Page containing the character at offset, 0 if the document has no pages."""
+        position = bisect_right(self.page_starts, offset) - 1
+        if position < 0:
+            return self.page_numbers[0] if self.page_numbers else 0
+        return self.page_numbers[position]
+
+    def tables_on(self, page_number):
+        return self.tables_by_page.get(page_number, [])
+
+    def images_on(self, page_number):
+        return self.images_by_page.get(page_number, [])
+
+    def asset_pages(self):
+        """Pages with tables or images, in page order."""
+        return sorted(set(self.tables_by_page) | set(self.images_by_page))
+
+    def content_type(self, page_number):
+        """Content type of chunks on a page; images take precedence over tables."""
+        if page_number in self.images_by_page:
+            return "image"
+        if page_number in self.tables_by_page:
+            return "table"
+        return "text"
@@ -0,0 +1,127 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 3600.0
+DEFAULT_REPORT_EVERY = 100
+
+def normalize_query(query):
+    """Cache key of a query: case-folded, with whitespace runs collapsed."""
+    return " ".join(query.casefold().split())
+
+class QueryVectorCache:
+    """
+    Bounded in-memory LRU cache of query vectors with a time-to-live.
+
+    Queries are keyed by normalize_query, so "Asthma " and "asthma" share
+    an entry. Entries older than ttl seconds are embedded again, and the
+    least recently used entry is evicted beyond max_entries.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query):
+        """Cached vector of query, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query, vector):
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (vector, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Hits, misses, hit rate and size of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate(), "size": len(self)}
+
+class CachedQueryEmbeddings:
+    """
+    Embeddings client wrapper that serves query vectors from a QueryVectorCache.
+
+    Document embedding is passed through. The hit rate is logged every
+    report_every query lookups.
+    """
+
+    def __init__(self, embeddings, cache, report_every=DEFAULT_REPORT_EVERY):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.report_every = report_every
+
+    def _report(self):
+        stats = self.cache.stats()
+        if self.report_every and (stats["hits"] + stats["misses"]) % self.report_every == 0:
+            logger.info(
+                f"Query embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({100 * stats['hit_rate']:.0f}% hit rate), {stats['size']} entries"
+            )
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, vector)
+        self._report()
+        return vector
+
+    def embed_queries(self, texts):
+        """Vectors of several queries, embedding the ones not cached in a single call."""
+        vectors = [self.cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                self.cache.put(texts[i], vector)
+                vectors[i] = vector
+        self._report()
+        return vectors
+
+    async def aembed_documents(self, texts):
+        if hasattr(self.embeddings, 'aembed_documents'):
+            return await self.embeddings.aembed_documents(texts)
+        return await asyncio.to_thread(self.embeddings.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        vector = self.cache.get(text)
+        if vector is None:
+            if hasattr(self.embeddings, 'aembed_query'):
+                vector = await self.embeddings.aembed_query(text)
+            else:
+                vector = await asyncio.to_thread(self.embeddings.embed_query, text)
+            self.cache.put(text, vector)
+        self._report()
+        return vector
@@ -0,0 +1,175 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_BACKENDS = ("off", "memory", "disk")
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 3600.0
+DEFAULT_GENERATION_CHECK_INTERVAL = 5.0
+
+def result_key(query, generation, **options):
+    """
+    Cache key of a search: the normalized query, the index generation and
+    every search option (search_type, k, ...) that changes the results.
+    """
+    fields = {"query": normalize_query(query), "generation": generation, "options": options}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class MemoryResultCache:
+    """In-memory LRU cache of search results, at most max_entries of them, each kept for ttl seconds."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Copy of the cached results of key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may modify the results they get, e.g. attach page assets
+        return copy.deepcopy(entry[0])
+
+    def put(self, key, results):
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(results), self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class DiskResultCache:
+    """
+    Search results stored on disk as one JSON file per key.
+
+    Shared by every searcher process using cache_dir. When the files
+    exceed max_bytes the least recently used ones (by modification time,
+    which hits refresh) are deleted. Entries older than ttl seconds are
+    ignored and deleted.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.name.endswith(".json"))
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.cache_dir) if name.endswith(".json"))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Cached results of key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry["stored"] > self.ttl:
+                self._remove(path)
+                self.misses += 1
+                return None
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["results"]
+
+    def put(self, key, results):
+        """Store results, replacing any previous entry atomically."""
+        path = self._path(key)
+        # Unique across the threads and processes sharing cache_dir
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.cache_dir)
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump({"stored": time.time(), "results": results}, f, default=str)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Delete least recently used entries down to three quarters of max_bytes."""
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json")
+        )
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+class IndexGenerationTracker:
+    """
+    Current index generation, fetched at most every check_interval seconds.
+
+    Cached results are keyed by generation, so results of an older
+    generation stop being served at most check_interval seconds after the
+    indexer published a new one.
+    """
+
+    def __init__(self, fetch_generation, check_interval=DEFAULT_GENERATION_CHECK_INTERVAL, clock=time.monotonic):
+        self.fetch_generation = fetch_generation
+        self.check_interval = check_interval
+        self.clock = clock
+        self._generation = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            now = self.clock()
+            if self._checked is None or now - self._checked >= self.check_interval:
+                generation = self.fetch_generation()
+                if generation != self._generation and self._generation is not None:
+                    logger.info(f"Index generation changed to {generation}, older cached results are no longer served")
+                self._generation = generation
+                self._checked = now
+            return self._generation
@@ -0,0 +1,121 @@
+import os
+import logging
+import threading
+from collections import deque
+from ingest_metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SAMPLES = 10000
+QUANTILES = (50, 95, 99)
+
+class LatencyHistogram:
+    """
+    Distribution of the last max_samples values of a measurement.
+
+    Percentiles are exact over that window, which keeps memory bounded
+    and makes them follow recent behaviour; count and total cover every
+    value observed.
+    """
+
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct):
+        return percentile(list(self.samples), pct)
+
+    def summary(self):
+        """Count, sum, mean and p50/p95/p99 of the histogram."""
+        values = list(self.samples)
+        summary = {"count": self.count, "sum": self.total, "mean": self.total / self.count if self.count else 0.0}
+        for pct in QUANTILES:
+            summary[f"p{pct}"] = percentile(values, pct)
+        return summary
+
+class RetrievalMetrics:
+    """
+    In-process metrics sink of searches.
+
+    Every search's result metadata (see searcher.search_documents) is
+    recorded: each timing into a histogram per stage, the Elasticsearch
+    took, hit counts and response bytes into histograms of their own, and
+    searches, errors and result cache hits into counters.
+    """
+
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.stages = {}
+        self.values = {}
+        self.counters = {"searches": 0, "errors": 0, "result_cache_hits": 0}
+        self._lock = threading.Lock()
+
+    def _observe(self, histograms, name, value):
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = LatencyHistogram(self.max_samples)
+        histogram.observe(value)
+
+    def record(self, metadata):
+        """Record the metadata of one search."""
+        with self._lock:
+            self.counters["searches"] += 1
+            if "error" in metadata:
+                self.counters["errors"] += 1
+            if metadata.get("result_cache") == "hit":
+                self.counters["result_cache_hits"] += 1
+            for stage, elapsed_ms in metadata.get("timings", {}).items():
+                self._observe(self.stages, stage.removesuffix("_ms"), elapsed_ms)
+            for name in ("hits", "response_bytes"):
+                if name in metadata:
+                    self._observe(self.values, name, metadata[name])
+
+    def snapshot(self):
+        """Summaries of every stage and value histogram, and the counters."""
+        with self._lock:
+            return {
+                "stages": {stage: histogram.summary() for stage, histogram in sorted(self.stages.items())},
+                "values": {name: histogram.summary() for name, histogram in sorted(self.values.items())},
+                "counters": dict(self.counters)
+            }
+
+    def export_text(self):
+        """
+        Metrics in the Prometheus text exposition format.
+
+        Stage latencies are summaries named retrieval_stage_ms with a stage
+        label, hits and response bytes retrieval_hits and
+        retrieval_response_bytes, and counters retrieval_<name>_total.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        summaries = [("retrieval_stage_ms", f'stage="{stage}",', summary)
+                     for stage, summary in snapshot["stages"].items()]
+        summaries += [(f"retrieval_{name}", "", summary) for name, summary in snapshot["values"].items()]
+        declared = set()
+        for metric, labels, summary in summaries:
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} summary")
+                declared.add(metric)
+            for pct in QUANTILES:
+                lines.append(f'{metric}{{{labels}quantile="{pct / 100}"}} {summary[f"p{pct}"]:.3f}')
+            label_set = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{metric}_sum{label_set} {summary['sum']:.3f}")
+            lines.append(f"{metric}_count{label_set} {summary['count']}")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE retrieval_{name}_total counter")
+            lines.append(f"retrieval_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_text(self, path):
+        """Write export_text atomically to path, e.g. for a node exporter textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.export_text())
+        os.replace(tmp_path, path)
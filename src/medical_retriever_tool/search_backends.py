@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from local_index import LocalIndex, highlight_fragments
+from token_chunking import approximate_token_count
+from index_admin import get_index_generation
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKENDS = ("elasticsearch", "local")
+DEFAULT_LOCAL_INDEX_DIR = os.path.join("output", "local_index")
+DEFAULT_NUM_CANDIDATES = 100
+DEFAULT_RANK_WINDOW = 50
+DEFAULT_RANK_CONSTANT = 60
+DEFAULT_SNIPPET_FRAGMENTS = 3
+# Fields of lean hits: what results render, without the chunk text (replaced by highlight snippets)
+LEAN_SOURCE_FIELDS = ["source_pdf", "page_number", "content_type", "assets_id", "metadata.title"]
+
+# Searches only return chunks with a vector: near-duplicate chunks linked by the
+# indexer carry duplicate_of, and per-page table/image documents are fetched separately
+CANONICAL_CHUNKS = {
+    "bool": {
+        "must_not": [
+            {"exists": {"field": "duplicate_of"}},
+            {"term": {"content_type": "page_assets"}}
+        ]
+    }
+}
+
+# Chunks carry the text of their page's images in image_text, as the local index does
+MULTI_MATCH_FIELDS = [
+    "text^2",
+    "image_text.caption^1.5",
+    "image_text.description^1.2",
+    "image_text.ocr_text"
+]
+
+class SearchResults(list):
+    """List of search results with a metadata dict, e.g. the search's timings."""
+
+    def __init__(self, results=(), metadata=None):
+        super().__init__(results)
+        self.metadata = metadata if metadata is not None else {}
+
+def reciprocal_rank_fusion(rankings, weights=None, rank_constant=DEFAULT_RANK_CONSTANT):
+    """
+    Merge ranked hit lists with weighted reciprocal rank fusion.
+
+    A hit's fused score is the sum over the rankings it appears in of
+    weight / (rank_constant + rank), with ranks starting at 1, so only
+    positions matter and BM25 and cosine scales never meet.
+
+    Args:
+        rankings (dict): Name of every ranking -> its hits, best first
+        weights (dict): Name -> weight, 1.0 for rankings not listed
+        rank_constant (int): Dampens the advantage of top ranks
+
+    Returns:
+        list: (hit, score, ranks) tuples by descending score, ranks mapping
+            the name of every ranking the hit appears in to its rank
+    """
+    weights = weights or {}
+    fused = {}
+    for name, hits in rankings.items():
+        weight = weights.get(name, 1.0)
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.setdefault(hit["_id"], [hit, 0.0, {}])
+            entry[1] += weight / (rank_constant + rank)
+            entry[2][name] = rank
+    return sorted((tuple(entry) for entry in fused.values()), key=lambda entry: -entry[1])
+
+def merge_results(results_by_query):
+    """
+    Merge the results of several queries into one de-duplicated list.
+
+    A chunk found by several queries is kept once, with its best score and
+    "queries" listing every query that found it.
+
+    Args:
+        results_by_query (dict): Query -> its results, see searcher.search_documents
+
+    Returns:
+        list: Copies of the distinct results by descending score
+    """
+    merged = {}
+    for query, results in results_by_query.items():
+        for result in results:
+            # Results cached before they carried their chunk's id are told apart by content
+            key = result.get("id") or (result["source"], result["page"], result["text"])
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = dict(result, queries=[])
+            elif result["score"] > entry["score"]:
+                entry.update(result, queries=entry["queries"])
+            entry["queries"].append(query)
+    return sorted(merged.values(), key=lambda result: -result["score"])
+
+def build_snippet(fragments, max_chars, max_tokens=0):
+    """
+    Join highlight fragments, best first, into a snippet within the budgets.
+
+    Fragments are added while they fit; the first one is cut at a word
+    boundary if it alone exceeds a budget. max_tokens of 0 means no token
+    budget.
+    """
+    fits = lambda text: len(text) <= max_chars and (not max_tokens or approximate_token_count(text) <= max_tokens)
+    snippet = ""
+    for fragment in fragments:
+        candidate = f"{snippet} … {fragment}" if snippet else fragment
+        if fits(candidate):
+            snippet = candidate
+        elif not snippet:
+            words = fragment.split()
+            while words and not fits(" ".join(words) + " …"):
+                words.pop()
+            snippet = " ".join(words) + " …" if words else ""
+            break
+        else:
+            break
+    return snippet
+
+def response_stats(response, stats):
+    """
+    Record what Elasticsearch reported about a search response in stats.
+
+    Sets "took_ms" (the time Elasticsearch spent, without the network),
+    "hits" and "total_hits" (accumulated over the searches of an _msearch
+    response) and "response_bytes", the Content-Length of the response
+    (compressed with http_compress), or the size of its JSON body if the
+    response is chunked.
+    """
+    if stats is None:
+        return
+    body = getattr(response, "body", response)
+    stats["took_ms"] = body.get("took", 0)
+    for item in body.get("responses", [body]):
+        hits = item.get("hits", {})
+        stats["hits"] = stats.get("hits", 0) + len(hits.get("hits", []))
+        stats["total_hits"] = stats.get("total_hits", 0) + hits.get("total", {}).get("value", 0)
+    meta = getattr(response, "meta", None)
+    content_length = meta.headers.get("content-length") if meta is not None else None
+    stats["response_bytes"] = int(content_length) if content_length else len(json.dumps(body).encode('utf-8'))
+
+class ElasticsearchBackend:
+    """Search backend querying the Elasticsearch index (or alias) index_name."""
+
+    name = "elasticsearch"
+
+    def __init__(self, es, index_name, num_candidates=DEFAULT_NUM_CANDIDATES):
+        self.es = es
+        self.index_name = index_name
+        self.num_candidates = num_candidates
+
+    def build_search(self, query, query_vector, search_type, k, bm25_filter=False, snippet_chars=None):
+        """
+        Search request body for search_type, see search().
+
+        Vector search uses the HNSW knn clause, which visits num_candidates
+        vectors per shard instead of scoring every document. Hybrid search
+        sends the BM25 query together with the knn clause, and Elasticsearch
+        adds up the scores of documents found by both.
+
+        With snippet_chars, hits only carry LEAN_SOURCE_FIELDS and up to
+        DEFAULT_SNIPPET_FRAGMENTS highlight fragments of the text of about
+        snippet_chars characters in total, instead of the whole chunk.
+        """
+        if search_type not in ("bm25", "vector", "hybrid"):
+            raise ValueError(f"Invalid search type: {search_type}")
+        multi_match = {"multi_match": {"query": query, "fields": MULTI_MATCH_FIELDS}}
+        body = {"size": k}
+        if search_type != "vector":
+            # BM25 search with image content
+            body["query"] = {"bool": {"must": multi_match, "filter": CANONICAL_CHUNKS}}
+        if search_type != "bm25":
+            body["knn"] = {
+                "field": "vector",
+                "query_vector": query_vector,
+                "k": k,
+                "num_candidates": max(self.num_candidates, k),
+                "filter": [CANONICAL_CHUNKS, multi_match] if bm25_filter else [CANONICAL_CHUNKS]
+            }
+        if snippet_chars:
+            body["_source"] = LEAN_SOURCE_FIELDS
+            body["highlight"] = {
+                # Also highlights hits found by kNN only, which have no text query
+                "highlight_query": {"match": {"text": query}},
+                "pre_tags": [""],
+                "post_tags": [""],
+                "fields": {
+                    "text": {
+                        "fragment_size": max(50, snippet_chars // DEFAULT_SNIPPET_FRAGMENTS),
+                        "number_of_fragments": DEFAULT_SNIPPET_FRAGMENTS,
+                        "no_match_size": snippet_chars,
+                        "order": "score"
+                    }
+                }
+            }
+        return body
+
+    def search(self, query, query_vector, search_type, k, bm25_filter=False, snippet_chars=None, stats=None):
+        """
+        Search the index.
+
+        Args:
+            query (str): The search query
+            query_vector (list): Embedding of query, None for "bm25"
+            search_type (str): One of "bm25", "vector", or "hybrid"
+            k (int): Number of hits to return
+            bm25_filter (bool): Only consider nearest neighbours that match query
+            snippet_chars (int): Return lean hits with highlight snippets of
+                about this many characters, see build_search
+            stats (dict): Filled with the search's took_ms, hits, total_hits
+                and response_bytes, see response_stats
+
+        Returns:
+            list: Hits as {"_id", "_score", "_source"} dicts, with
+                {"highlight": {"text": fragments}} for lean hits
+        """
+        response = self.es.search(
+            index=self.index_name,
+            body=self.build_search(query, query_vector, search_type, k, bm25_filter, snippet_chars)
+        )
+        response_stats(response, stats)
+        return response["hits"]["hits"]
+
+    def build_msearch(self, searches):
+        """Multi search request body: an empty header and the body of every search, see search_many."""
+        body = []
+        for search in searches:
+            body.append({})
+            body.append(self.build_search(**search))
+        return body
+
+    def search_many(self, searches, stats=None):
+        """
+        Run several searches in a single _msearch request.
+
+        Args:
+            searches (list): Keyword arguments of search() for every search
+            stats (dict): Filled with the request's took_ms and the hits and
+                response_bytes of all searches, see response_stats
+
+        Returns:
+            list: Hits of every search, in the order of searches
+
+        Raises:
+            RuntimeError: If any of the searches failed
+        """
+        response = self.es.msearch(index=self.index_name, searches=self.build_msearch(searches))
+        response_stats(response, stats)
+        hits = []
+        for search, item in zip(searches, response["responses"]):
+            if "error" in item:
+                raise RuntimeError(f"Search for '{search['query']}' failed: {item['error']}")
+            hits.append(item["hits"]["hits"])
+        return hits
+
+    def generation(self):
+        """Generation of the searched indices, see index_admin.get_index_generation."""
+        return get_index_generation(self.es, self.index_name)
+
+    def get_page_assets(self, assets_ids):
+        """Tables and images of the page asset documents assets_ids, by id."""
+        response = self.es.mget(index=self.index_name, ids=assets_ids)
+        return {doc["_id"]: doc["_source"]["metadata"] for doc in response["docs"] if doc.get("found")}
+
+class LocalBackend:
+    """
+    Search backend on an embedded LocalIndex written by the indexer.
+
+    Scores like the Elasticsearch backend: BM25 (k1=1.2, b=0.75) over the
+    best boosted field for "bm25", (1 + cosine similarity) / 2 of the k
+    nearest neighbours for "vector" and their sum for "hybrid". The index
+    is reopened when the indexer commits a new version.
+    """
+
+    name = "local"
+
+    def __init__(self, index_dir, nprobe=None):
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self._index = None
+        self._version = None
+
+    def generation(self):
+        """Version of the committed index, None if there is none."""
+        current_path = os.path.join(self.index_dir, "CURRENT")
+        if not os.path.exists(current_path):
+            return None
+        with open(current_path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+
+    @property
+    def index(self):
+        version = self.generation()
+        if version is None:
+            raise FileNotFoundError(f"No local index in {self.index_dir}, run the indexer with SEARCH_BACKEND=local")
+        if version != self._version:
+            # Opens the then current version, should CURRENT move on meanwhile
+            index = LocalIndex.open(self.index_dir)
+            if self._index is not None:
+                self._index.close()
+            self._index = index
+            self._version = os.path.basename(index.version_dir)
+            logger.info(f"Opened local index {self._version} with {len(self._index)} documents")
+        return self._index
+
+    def search(self, query, query_vector, search_type, k, bm25_filter=False, snippet_chars=None, stats=None):
+        """
+        Search the local index, see ElasticsearchBackend.search.
+
+        stats gets the took_ms of the search in the index, which has no
+        network time, and its number of hits.
+        """
+        options = {"bm25_filter": bm25_filter}
+        if self.nprobe is not None:
+            options["nprobe"] = self.nprobe
+        start = time.perf_counter()
+        hits = self.index.search(query, query_vector, search_type, k, **options)
+        if stats is not None:
+            stats["took_ms"] = stats.get("took_ms", 0) + (time.perf_counter() - start) * 1000
+            stats["hits"] = stats.get("hits", 0) + len(hits)
+        if snippet_chars:
+            for hit in hits:
+                text = hit["_source"].pop("text", "")
+                hit["highlight"] = {"text": highlight_fragments(
+                    text, query, max(50, snippet_chars // DEFAULT_SNIPPET_FRAGMENTS), DEFAULT_SNIPPET_FRAGMENTS,
+                    snippet_chars
+                )}
+        return hits
+
+    def search_many(self, searches, stats=None):
+        """Run several searches, see ElasticsearchBackend.search_many."""
+        return [self.search(**search, stats=stats) for search in searches]
+
+    def get_page_assets(self, assets_ids):
+        """Tables and images of the page asset documents assets_ids, by id."""
+        return {doc_id: source.get("metadata", {}) for doc_id, source in self.index.get(assets_ids).items()}
+
+class AsyncElasticsearchBackend(ElasticsearchBackend):
+    """
+    ElasticsearchBackend on an AsyncElasticsearch client, with awaitable searches.
+
+    Request bodies are built like ElasticsearchBackend's, see build_search.
+    """
+
+    async def search(self, query, query_vector, search_type, k, bm25_filter=False, snippet_chars=None,
+                     stats=None):
+        """Search the index, see ElasticsearchBackend.search."""
+        response = await self.es.search(
+            index=self.index_name,
+            body=self.build_search(query, query_vector, search_type, k, bm25_filter, snippet_chars)
+        )
+        response_stats(response, stats)
+        return response["hits"]["hits"]
+
+    async def search_many(self, searches, stats=None):
+        """Run several searches in a single _msearch request, see ElasticsearchBackend.search_many."""
+        response = await self.es.msearch(index=self.index_name, searches=self.build_msearch(searches))
+        response_stats(response, stats)
+        hits = []
+        for search, item in zip(searches, response["responses"]):
+            if "error" in item:
+                raise RuntimeError(f"Search for '{search['query']}' failed: {item['error']}")
+            hits.append(item["hits"]["hits"])
+        return hits
+
+    async def get_page_assets(self, assets_ids):
+        """Tables and images of the page asset documents assets_ids, by id."""
+        response = await self.es.mget(index=self.index_name, ids=assets_ids)
+        return {doc["_id"]: doc["_source"]["metadata"] for doc in response["docs"] if doc.get("found")}
+
+    async def close(self):
+        await self.es.close()
+
+class AsyncLocalBackend:
+    """Awaitable LocalBackend: its searches, CPU and mmap bound, run in worker threads."""
+
+    name = "local"
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def search(self, query, query_vector, search_type, k, bm25_filter=False, snippet_chars=None,
+                     stats=None):
+        """Search the local index, see ElasticsearchBackend.search."""
+        return await asyncio.to_thread(
+            self.backend.search, query, query_vector, search_type, k, bm25_filter, snippet_chars, stats
+        )
+
+    async def search_many(self, searches, stats=None):
+        """Run several searches, see ElasticsearchBackend.search_many."""
+        return await asyncio.to_thread(self.backend.search_many, searches, stats)
+
+    async def get_page_assets(self, assets_ids):
+        """Tables and images of the page asset documents assets_ids, by id."""
+        return await asyncio.to_thread(self.backend.get_page_assets, assets_ids)
+
+    async def close(self):
+        pass
+
+def get_search_backend(backend_name, es=None, index_name=None, index_dir=None,
+                       num_candidates=DEFAULT_NUM_CANDIDATES):
+    """
+    Create the search backend backend_name.
+
+    Args:
+        backend_name (str): "elasticsearch" or "local"
+        es: Elasticsearch client, for "elasticsearch"
+        index_name (str): Index or alias to search, for "elasticsearch"
+        index_dir (str): Local index directory, for "local"
+        num_candidates (int): kNN candidates per shard, for "elasticsearch"
+
+    Returns:
+        ElasticsearchBackend or LocalBackend
+    """
+    if backend_name == "elasticsearch":
+        return ElasticsearchBackend(es, index_name, num_candidates)
+    elif backend_name == "local":
+        nprobe = os.getenv("LOCAL_INDEX_NPROBE")
+        return LocalBackend(index_dir or DEFAULT_LOCAL_INDEX_DIR, int(nprobe) if nprobe else None)
+    raise ValueError(f"Unknown search backend: {backend_name} (expected one of {', '.join(SEARCH_BACKENDS)})")
+
+def get_async_search_backend(backend, async_es=None):
+    """
+    Awaitable counterpart of the search backend backend.
+
+    Args:
+        backend: ElasticsearchBackend or LocalBackend, see get_search_backend
+        async_es: AsyncElasticsearch client, for "elasticsearch"
+
+    Returns:
+        AsyncElasticsearchBackend or AsyncLocalBackend
+    """
+    if backend.name == "elasticsearch":
+        return AsyncElasticsearchBackend(async_es, backend.index_name, backend.num_candidates)
+    elif backend.name == "local":
+        return AsyncLocalBackend(backend)
+    raise ValueError(f"Unknown search backend: {backend.name}")
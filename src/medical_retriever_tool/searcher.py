@@ -1,9 +1,24 @@
 import os
+import sys
+import time
+import asyncio
 import logging
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from ibm_watsonx_ai.foundation_models import Embeddings
-from ibm_watsonx_ai.metanames import EmbedTextParamsMetaNames as EmbedParams
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from embedding_client import initialize_watsonx, EMBEDDING_MODEL_ID, TRUNCATE_INPUT_TOKENS
+from query_cache import QueryVectorCache, CachedQueryEmbeddings, DEFAULT_MAX_ENTRIES, DEFAULT_TTL
+from token_chunking import approximate_token_count
+from result_cache import (MemoryResultCache, DiskResultCache, IndexGenerationTracker, result_key,
+                          DEFAULT_MAX_BYTES as DEFAULT_RESULT_CACHE_MAX_BYTES, DEFAULT_TTL as DEFAULT_RESULT_CACHE_TTL,
+                          DEFAULT_GENERATION_CHECK_INTERVAL)
+from retrieval_metrics import RetrievalMetrics
+from search_backends import (get_search_backend, get_async_search_backend, reciprocal_rank_fusion, build_snippet,
+                             merge_results, SearchResults, DEFAULT_LOCAL_INDEX_DIR, DEFAULT_NUM_CANDIDATES, DEFAULT_RANK_WINDOW,
+                             DEFAULT_RANK_CONSTANT)
 
 # Configure logging
 logging.basicConfig(
@@ -20,66 +35,424 @@ ES_URL = os.getenv("ES_URL")
 ES_USER = os.getenv("ES_USER")
 ES_PASSWORD = os.getenv("ES_PASSWORD")
 ES_CERT_FINGERPRINT = os.getenv("ES_CERT_FINGERPRINT")
+# Alias of the current versioned index; the indexer swaps it on rebuilds
 MEDICAL_JOURNAL_INDEX_NAME = os.getenv("MEDICAL_JOURNAL_INDEX_NAME", "medical_journal")
 
 # IBM Watson configuration
 IBM_CLOUD_API_KEY = os.getenv("IBM_CLOUD_API_KEY")
 IBM_CLOUD_ENDPOINT = os.getenv("IBM_CLOUD_ENDPOINT")
 IBM_CLOUD_PROJECT_ID = os.getenv("IBM_CLOUD_PROJECT_ID")
+# Concurrent watsonx.ai requests of the searcher; the request rate is limited process-wide
+EMBED_MAX_IN_FLIGHT = int(os.getenv("SEARCH_EMBED_MAX_IN_FLIGHT", 4))
 
-# Validate required environment variables
-required_vars = {
-    "ES_URL": ES_URL,
-    "ES_USER": ES_USER,
-    "ES_PASSWORD": ES_PASSWORD,
-    "ES_CERT_FINGERPRINT": ES_CERT_FINGERPRINT,
-    "IBM_CLOUD_API_KEY": IBM_CLOUD_API_KEY,
-    "IBM_CLOUD_ENDPOINT": IBM_CLOUD_ENDPOINT,
-    "IBM_CLOUD_PROJECT_ID": IBM_CLOUD_PROJECT_ID,
-    "MEDICAL_JOURNAL_INDEX_NAME": MEDICAL_JOURNAL_INDEX_NAME
+# Embedding cache written by the indexer, opened read-only on first use
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+_embedding_cache = None
+_embeddings = None
+# In-memory cache of query vectors; QUERY_CACHE_SIZE=0 disables it
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", DEFAULT_TTL))  # Seconds
+
+# "elasticsearch" or "local", the embedded index written by the indexer with SEARCH_BACKEND=local
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "elasticsearch")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", DEFAULT_LOCAL_INDEX_DIR)
+# HNSW candidates per shard of vector and hybrid searches; more is slower with better recall
+KNN_NUM_CANDIDATES = int(os.getenv("KNN_NUM_CANDIDATES", DEFAULT_NUM_CANDIDATES))
+# Hybrid search: "rrf" fuses the ranks of a BM25 and a kNN top-N, "sum" adds their scores
+HYBRID_MODE = os.getenv("HYBRID_MODE", "rrf")
+RRF_RANK_WINDOW = int(os.getenv("RRF_RANK_WINDOW", DEFAULT_RANK_WINDOW))  # N hits fetched per leg
+RRF_RANK_CONSTANT = int(os.getenv("RRF_RANK_CONSTANT", DEFAULT_RANK_CONSTANT))
+RRF_WEIGHTS = {
+    "bm25": float(os.getenv("RRF_BM25_WEIGHT", 1.0)),
+    "vector": float(os.getenv("RRF_VECTOR_WEIGHT", 1.0))
 }
+# Cache of search results: "memory", "disk" (shared by processes using RESULT_CACHE_DIR) or "off"
+RESULT_CACHE = os.getenv("RESULT_CACHE", "memory")
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))  # Entries, for "memory"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("output", "result_cache"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", DEFAULT_RESULT_CACHE_MAX_BYTES))  # For "disk"
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", DEFAULT_RESULT_CACHE_TTL))  # Seconds
+# Seconds between checks of the index generation; cached results of older generations are not served
+INDEX_GENERATION_CHECK_INTERVAL = float(os.getenv("INDEX_GENERATION_CHECK_INTERVAL", DEFAULT_GENERATION_CHECK_INTERVAL))
+_result_cache = None
+_generation_tracker = None
+# Lean results carry highlight snippets of at most SNIPPET_MAX_CHARS characters (and
+# SNIPPET_MAX_TOKENS approximate tokens, if set) instead of the whole chunk text
+SEARCH_LEAN = os.getenv("SEARCH_LEAN", "false").lower() == "true"
+SNIPPET_MAX_CHARS = int(os.getenv("SNIPPET_MAX_CHARS", 600))
+SNIPPET_MAX_TOKENS = int(os.getenv("SNIPPET_MAX_TOKENS", 0))
+ES_HTTP_COMPRESS = os.getenv("ES_HTTP_COMPRESS", "true").lower() == "true"
+# Pooled connections per Elasticsearch node of the async client, i.e. its concurrent requests
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", 10))
+# Async backend of every event loop running asearch_documents; aiohttp sessions are bound to their loop
+_async_backends = weakref.WeakKeyDictionary()
+# Async generators closing those backends when their loop shuts down, see _close_with_loop
+_async_backend_closers = weakref.WeakKeyDictionary()
+# In-process latency histograms of every search stage, see get_retrieval_metrics
+RETRIEVAL_METRICS = os.getenv("RETRIEVAL_METRICS", "true").lower() == "true"
+# If set, the metrics are written there in the Prometheus text format every RETRIEVAL_METRICS_EXPORT_EVERY searches
+RETRIEVAL_METRICS_FILE = os.getenv("RETRIEVAL_METRICS_FILE")
+RETRIEVAL_METRICS_EXPORT_EVERY = int(os.getenv("RETRIEVAL_METRICS_EXPORT_EVERY", 100))
+_retrieval_metrics = RetrievalMetrics() if RETRIEVAL_METRICS else None
+_metrics_sinks = [_retrieval_metrics] if _retrieval_metrics is not None else []
+# Threads running the BM25 leg of "rrf" searches
+RRF_LEG_WORKERS = int(os.getenv("RRF_LEG_WORKERS", 4))
+_leg_executor = None
 
-missing_vars = [var for var, value in required_vars.items() if not value]
-if missing_vars:
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
-
-# Initialize Elasticsearch client
-try:
-    es = Elasticsearch(
-        ES_URL,
-        basic_auth=(ES_USER, ES_PASSWORD),
-        verify_certs=True,
-        ssl_assert_fingerprint=ES_CERT_FINGERPRINT,
-        request_timeout=30,
-        retry_on_timeout=True,
-        max_retries=3
-    )
-except Exception as e:
-    logger.error(f"Failed to initialize Elasticsearch client: {str(e)}", exc_info=True)
-    raise
-
-def initialize_watsonx():
-    """Initialize IBM watsonx.ai embedding model."""
-    model_id = "ibm/slate-125m-english-rtrvr-v2"
-    embed_params = {
-        EmbedParams.TRUNCATE_INPUT_TOKENS: 500,  # Restrict to 500 tokens
-        EmbedParams.RETURN_OPTIONS: {
-            'input_text': True
-        }
-    }
-    credentials = {
-        "url": IBM_CLOUD_ENDPOINT,
-        "apikey": IBM_CLOUD_API_KEY,
+# Clients are created on first use, so importing the searcher needs neither credentials nor a cluster
+_es = None
+_backend = None
+_client_lock = threading.Lock()
+
+def _require_env(required_vars):
+    """Raise ValueError naming the variables of required_vars that are not set."""
+    missing_vars = [var for var, value in required_vars.items() if not value]
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
+def _es_client_options():
+    """Connection settings of the Elasticsearch clients, validated on first use."""
+    _require_env({
+        "ES_URL": ES_URL,
+        "ES_USER": ES_USER,
+        "ES_PASSWORD": ES_PASSWORD,
+        "ES_CERT_FINGERPRINT": ES_CERT_FINGERPRINT,
+        "MEDICAL_JOURNAL_INDEX_NAME": MEDICAL_JOURNAL_INDEX_NAME
+    })
+    return {
+        "basic_auth": (ES_USER, ES_PASSWORD),
+        "verify_certs": True,
+        "ssl_assert_fingerprint": ES_CERT_FINGERPRINT,
+        "request_timeout": 30,
+        "retry_on_timeout": True,
+        "max_retries": 3,
+        "http_compress": ES_HTTP_COMPRESS  # gzip requests and responses
     }
-    embedding = Embeddings(
-        model_id=model_id,
-        credentials=credentials,
-        params=embed_params,
-        project_id=IBM_CLOUD_PROJECT_ID
+
+def get_es_client():
+    """
+    Return the Elasticsearch client, created on first use and shared by all searches.
+
+    Returns:
+        Elasticsearch: The client, None if SEARCH_BACKEND is not "elasticsearch"
+
+    Raises:
+        ValueError: If an ES_* environment variable is missing
+    """
+    global _es
+    if _es is None and SEARCH_BACKEND == "elasticsearch":
+        with _client_lock:
+            if _es is None:
+                options = _es_client_options()
+                from elasticsearch import Elasticsearch
+                try:
+                    _es = Elasticsearch(ES_URL, **options)
+                except Exception as e:
+                    logger.error(f"Failed to initialize Elasticsearch client: {str(e)}", exc_info=True)
+                    raise
+    return _es
+
+def get_backend():
+    """Return the search backend configured by SEARCH_BACKEND, created on first use."""
+    global _backend
+    if _backend is None:
+        es = get_es_client()
+        with _client_lock:
+            if _backend is None:
+                _backend = get_search_backend(SEARCH_BACKEND, es=es, index_name=MEDICAL_JOURNAL_INDEX_NAME,
+                                              index_dir=LOCAL_INDEX_DIR, num_candidates=KNN_NUM_CANDIDATES)
+    return _backend
+
+def get_embedding_cache():
+    """Return the indexer's embedding cache, or None if EMBEDDING_CACHE_DIR has no cache."""
+    global _embedding_cache
+    if _embedding_cache is None and EMBEDDING_CACHE_DIR:
+        try:
+            _embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_ID, TRUNCATE_INPUT_TOKENS, readonly=True
+            )
+        except FileNotFoundError:
+            logger.warning(f"No embedding cache found in {EMBEDDING_CACHE_DIR}")
+    return _embedding_cache
+
+def get_embeddings():
+    """
+    Return the searcher's embedding client, created on first use and shared by all searches.
+
+    Query vectors are served from an LRU+TTL cache first, then from the
+    indexer's embedding cache, and only then embedded through watsonx.ai.
+    """
+    global _embeddings
+    if _embeddings is None:
+        _require_env({
+            "IBM_CLOUD_API_KEY": IBM_CLOUD_API_KEY,
+            "IBM_CLOUD_ENDPOINT": IBM_CLOUD_ENDPOINT,
+            "IBM_CLOUD_PROJECT_ID": IBM_CLOUD_PROJECT_ID
+        })
+        embeddings = initialize_watsonx(max_in_flight=EMBED_MAX_IN_FLIGHT)
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            embeddings = CachedEmbeddings(embeddings, embedding_cache)
+        if QUERY_CACHE_SIZE > 0:
+            embeddings = CachedQueryEmbeddings(embeddings, QueryVectorCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL))
+        _embeddings = embeddings
+    return _embeddings
+
+def get_query_cache_stats():
+    """Hits, misses, hit rate and size of the query vector cache, None if it is disabled or unused."""
+    if isinstance(_embeddings, CachedQueryEmbeddings):
+        return _embeddings.cache.stats()
+    return None
+
+def fetch_page_assets(results):
+    """
+    Attach the tables and images of their page to results that have any.
+
+    Pages' tables and images are stored once per page by the indexer and
+    fetched here in one request for just the pages of the given results.
+
+    Args:
+        results (list): Results of search_documents
+
+    Returns:
+        list: The same results, with "tables" and "images" added where the
+            page has them and "image_info" set to the page's first image
+    """
+    assets_ids = _assets_ids(results)
+    if not assets_ids:
+        return results
+    return _attach_page_assets(results, get_backend().get_page_assets(assets_ids))
+
+async def afetch_page_assets(results):
+    """Async fetch_page_assets, on the event loop's async backend."""
+    assets_ids = _assets_ids(results)
+    if not assets_ids:
+        return results
+    return _attach_page_assets(results, await get_async_backend().get_page_assets(assets_ids))
+
+def _assets_ids(results):
+    return sorted({result["assets_id"] for result in results if result.get("assets_id")})
+
+def _attach_page_assets(results, page_assets):
+    for result in results:
+        assets = page_assets.get(result.get("assets_id"))
+        if assets is None:
+            continue
+        result["tables"] = assets.get("tables", [])
+        result["images"] = assets.get("images", [])
+        if result["images"]:
+            result["has_image"] = True
+            result["image_info"] = result["images"][0]
+    return results
+
+def get_async_backend():
+    """
+    Return the async search backend of the running event loop, created on first use.
+
+    For Elasticsearch it owns an AsyncElasticsearch client keeping up to
+    ES_CONNECTIONS_PER_NODE pooled connections per node; the local backend
+    runs its searches in worker threads. The backend is closed when the
+    loop shuts down its async generators, which asyncio.run does before it
+    returns; loops run otherwise should call aclose_async_backend.
+    """
+    loop = asyncio.get_running_loop()
+    async_backend = _async_backends.get(loop)
+    if async_backend is None:
+        backend = get_backend()
+        async_es = None
+        if backend.name == "elasticsearch":
+            from elasticsearch import AsyncElasticsearch
+            async_es = AsyncElasticsearch(
+                ES_URL, connections_per_node=ES_CONNECTIONS_PER_NODE, **_es_client_options()
+            )
+        async_backend = _async_backends[loop] = get_async_search_backend(backend, async_es)
+        _async_backend_closers[loop] = _close_with_loop(loop, async_backend)
+    return async_backend
+
+def _close_with_loop(loop, async_backend):
+    """
+    Async generator that closes async_backend when loop shuts down its async generators.
+
+    The generator is started right away, which registers it with the
+    running loop; asyncio.run then closes it, running its finally clause,
+    after the main coroutine finished. Streamlit and the chatbot graph run
+    every tool invocation in a new asyncio.run, so without this every
+    invocation would leave an aiohttp session open.
+    """
+    async def close_on_shutdown():
+        try:
+            yield
+        finally:
+            # Unless aclose_async_backend closed it already
+            if _async_backends.get(loop) is async_backend:
+                del _async_backends[loop]
+                await async_backend.close()
+
+    closer = close_on_shutdown()
+    try:
+        # Runs the generator to its yield, which does not need the loop
+        closer.asend(None).send(None)
+    except StopIteration:
+        pass
+    return closer
+
+async def aclose_async_backend():
+    """Close the async backend of the running event loop, e.g. before the loop ends."""
+    loop = asyncio.get_running_loop()
+    _async_backend_closers.pop(loop, None)
+    async_backend = _async_backends.pop(loop, None)
+    if async_backend is not None:
+        await async_backend.close()
+
+def get_result_cache():
+    """Return the result cache configured by RESULT_CACHE, None if it is "off"."""
+    global _result_cache, _generation_tracker
+    if _result_cache is None and RESULT_CACHE != "off":
+        if RESULT_CACHE == "memory":
+            _result_cache = MemoryResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        elif RESULT_CACHE == "disk":
+            _result_cache = DiskResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
+        else:
+            raise ValueError(f"Invalid result cache: {RESULT_CACHE}")
+        _generation_tracker = IndexGenerationTracker(get_backend().generation, INDEX_GENERATION_CHECK_INTERVAL)
+    return _result_cache
+
+def get_retrieval_metrics():
+    """Return the in-process RetrievalMetrics of all searches, None if RETRIEVAL_METRICS is off."""
+    return _retrieval_metrics
+
+def add_metrics_sink(sink):
+    """
+    Also record every search in sink.
+
+    Args:
+        sink: Object with a record(metadata) method, called with the
+            metadata of every search, see search_documents
+    """
+    _metrics_sinks.append(sink)
+
+def remove_metrics_sink(sink):
+    _metrics_sinks.remove(sink)
+
+def _record_metrics(metadata):
+    """Record a search's metadata in every metrics sink; a failing sink never fails the search."""
+    for sink in list(_metrics_sinks):
+        try:
+            sink.record(metadata)
+        except Exception as e:
+            logger.error(f"Failed to record search metrics: {str(e)}", exc_info=True)
+    if (RETRIEVAL_METRICS_FILE and _retrieval_metrics is not None
+            and _retrieval_metrics.counters["searches"] % RETRIEVAL_METRICS_EXPORT_EVERY == 0):
+        try:
+            _retrieval_metrics.write_text(RETRIEVAL_METRICS_FILE)
+        except OSError as e:
+            logger.error(f"Failed to write search metrics to {RETRIEVAL_METRICS_FILE}: {str(e)}", exc_info=True)
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+def _timed_embeddings(timings):
+    """get_embeddings, recording the creation of the client on first use as embed_init_ms."""
+    if _embeddings is not None:
+        return _embeddings
+    start = time.perf_counter()
+    embeddings = get_embeddings()
+    timings["embed_init_ms"] = _elapsed_ms(start)
+    return embeddings
+
+def _record_leg(name, elapsed_ms, stats, timings):
+    """
+    Record a backend request's time in timings, split into the time the
+    backend reported spending (name_took_ms) and the rest (name_network_ms):
+    network, transfer and response parsing.
+    """
+    timings[f"{name}_ms"] = elapsed_ms
+    if "took_ms" in stats:
+        timings[f"{name}_took_ms"] = stats["took_ms"]
+        timings[f"{name}_network_ms"] = max(0.0, elapsed_ms - stats["took_ms"])
+
+def _summarize_legs(metadata, results):
+    """Set the hits and response bytes of a search in its metadata."""
+    metadata["hits"] = len(results)
+    metadata["response_bytes"] = sum(stats.get("response_bytes", 0) for stats in metadata.get("legs", {}).values())
+
+def _search_leg(query, search_type, size, timings, legs, **options):
+    """Run one search, recording its embedding and search time in timings and its backend stats in legs."""
+    query_vector = None
+    if search_type != "bm25":
+        # Vector and hybrid search use IBM watsonx embeddings
+        embeddings = _timed_embeddings(timings)
+        start = time.perf_counter()
+        query_vector = embeddings.embed_query(query)
+        timings["embed_ms"] = _elapsed_ms(start)
+    stats = legs[search_type] = {}
+    start = time.perf_counter()
+    hits = get_backend().search(query, query_vector, search_type, size, stats=stats, **options)
+    _record_leg(search_type, _elapsed_ms(start), stats, timings)
+    return hits
+
+def _rrf_search(query, k, timings, legs, rank_window, weights, **options):
+    """
+    Hybrid search by reciprocal rank fusion of a BM25 and a kNN top-N.
+
+    The BM25 leg runs in a worker thread while the query is embedded and
+    searched by kNN, and their top rank_window hits are merged in here.
+
+    Returns:
+        list: Fused hits with "_score" set to the fused score and "_ranks"
+            to the hit's rank in each leg
+    """
+    global _leg_executor
+    if _leg_executor is None:
+        _leg_executor = ThreadPoolExecutor(max_workers=RRF_LEG_WORKERS, thread_name_prefix="bm25-leg")
+    size = max(rank_window, k)
+    bm25_future = _leg_executor.submit(_search_leg, query, "bm25", size, timings, legs, **options)
+    vector_hits = _search_leg(query, "vector", size, timings, legs, **options)
+    bm25_hits = bm25_future.result()
+    start = time.perf_counter()
+    fused = reciprocal_rank_fusion({"bm25": bm25_hits, "vector": vector_hits}, weights, RRF_RANK_CONSTANT)
+    hits = [dict(hit, _score=score, _ranks=ranks) for hit, score, ranks in fused[:k]]
+    timings["fuse_ms"] = _elapsed_ms(start)
+    return hits
+
+def _validate_search(search_type, hybrid_mode):
+    """Check search_type and return the hybrid mode it uses, None if it is not "hybrid"."""
+    if search_type not in ("bm25", "vector", "hybrid"):
+        raise ValueError(f"Invalid search type: {search_type}")
+    if search_type != "hybrid":
+        return None
+    hybrid_mode = hybrid_mode or HYBRID_MODE
+    if hybrid_mode not in ("rrf", "sum"):
+        raise ValueError(f"Invalid hybrid mode: {hybrid_mode}")
+    return hybrid_mode
+
+def _result_cache_key(query, generation, search_type, k, include_assets, bm25_filter, hybrid_mode, rank_window,
+                      weights, lean):
+    return result_key(
+        query, generation, search_type=search_type, k=k,
+        include_assets=include_assets, bm25_filter=bm25_filter, hybrid_mode=hybrid_mode,
+        rank_window=rank_window or RRF_RANK_WINDOW, weights=weights or RRF_WEIGHTS,
+        lean=lean, snippet_chars=SNIPPET_MAX_CHARS, snippet_tokens=SNIPPET_MAX_TOKENS
     )
-    return embedding
 
-def search_documents(query, search_type="hybrid", k=5):
+def _build_result(hit, lean):
+    """Search result of a backend hit."""
+    result = {
+        "id": hit["_id"],
+        "score": hit["_score"],
+        "text": build_snippet(hit.get("highlight", {}).get("text", []), SNIPPET_MAX_CHARS, SNIPPET_MAX_TOKENS) if lean else hit["_source"]["text"],
+        "source": hit["_source"]["source_pdf"],
+        "page": hit["_source"]["page_number"],
+        "metadata": hit["_source"].get("metadata", {}),
+        "assets_id": hit["_source"].get("assets_id"),
+        "has_image": hit["_source"].get("content_type") == "image"
+    }
+    if "_ranks" in hit:
+        result["ranks"] = hit["_ranks"]
+    return result
+
+def search_documents(query, search_type="hybrid", k=5, include_assets=True, bm25_filter=False,
+                     hybrid_mode=None, rank_window=None, weights=None, lean=None):
     """
     Search documents using the specified search type.
     
@@ -87,117 +460,301 @@ def search_documents(query, search_type="hybrid", k=5):
         query (str): The search query
         search_type (str): One of "bm25", "vector", or "hybrid"
         k (int): Number of results to return
+        include_assets (bool): Fetch tables and images of the hits' pages,
+            see fetch_page_assets
+        bm25_filter (bool): For "vector" and "hybrid", only consider
+            nearest neighbours that match the query's terms
+        hybrid_mode (str): "rrf" or "sum", HYBRID_MODE by default
+        rank_window (int): Hits per leg fused by "rrf", RRF_RANK_WINDOW by default
+        weights (dict): "bm25" and "vector" weights of "rrf", RRF_WEIGHTS by default
+        lean (bool): Only fetch the fields results render, and return
+            highlight snippets within SNIPPET_MAX_CHARS/SNIPPET_MAX_TOKENS
+            as "text" instead of whole chunks; SEARCH_LEAN by default
         
     Returns:
-        list: List of search results
+        SearchResults: List of search results; its metadata holds the
+            search type and timings in milliseconds of the embedding client's
+            creation (embed_init, first search only), the embedding, each
+            search leg (split into the backend's took and the network time),
+            the fusion, result processing, page assets and the whole search.
+            metadata["legs"] holds the backend stats of each leg (took_ms,
+            hits, total_hits, response_bytes), and metadata["hits"] and
+            metadata["response_bytes"] their totals. Results carry the
+            "id" of their chunk, and "rrf" results their rank in each leg
+            as "ranks".
+
+    Results are cached by query, options and index generation, see
+    get_result_cache; metadata["result_cache"] tells whether they were
+    served from the cache ("hit") or not ("miss"). The metadata of every
+    search is recorded in the metrics sinks, see get_retrieval_metrics
+    and add_metrics_sink.
     """
+    timings = {}
+    legs = {}
+    lean = SEARCH_LEAN if lean is None else lean
+    metadata = {"search_type": search_type, "lean": lean, "timings": timings, "legs": legs}
+    start = time.perf_counter()
     try:
-        if search_type == "bm25":
-            # BM25 search with image content
-            response = es.search(
-                index=MEDICAL_JOURNAL_INDEX_NAME,
-                body={
-                    "query": {
-                        "multi_match": {
-                            "query": query,
-                            "fields": [
-                                "text^2",
-                                "metadata.image_info.caption^1.5",
-                                "metadata.image_info.description^1.2",
-                                "metadata.image_info.ocr_text"
-                            ]
-                        }
-                    },
-                    "size": k
-                }
-            )
-            
-        elif search_type == "vector":
-            # Vector search using IBM watsonx embeddings
-            embeddings = initialize_watsonx()
-            query_vector = embeddings.embed_query(query)
-            
-            response = es.search(
-                index=MEDICAL_JOURNAL_INDEX_NAME,
-                body={
-                    "query": {
-                        "script_score": {
-                            "query": {"match_all": {}},
-                            "script": {
-                                "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
-                                "params": {"query_vector": query_vector}
-                            }
-                        }
-                    },
-                    "size": k
-                }
-            )
-            
-        elif search_type == "hybrid":
-            # Hybrid search combining BM25 and vector search with image content
-            embeddings = initialize_watsonx()
-            query_vector = embeddings.embed_query(query)
-            
-            response = es.search(
-                index=MEDICAL_JOURNAL_INDEX_NAME,
-                body={
-                    "query": {
-                        "bool": {
-                            "should": [
-                                {
-                                    "multi_match": {
-                                        "query": query,
-                                        "fields": [
-                                            "text^2",
-                                            "metadata.image_info.caption^1.5",
-                                            "metadata.image_info.description^1.2",
-                                            "metadata.image_info.ocr_text"
-                                        ]
-                                    }
-                                },
-                                {
-                                    "script_score": {
-                                        "query": {"match_all": {}},
-                                        "script": {
-                                            "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
-                                            "params": {"query_vector": query_vector}
-                                        }
-                                    }
-                                }
-                            ]
-                        }
-                    },
-                    "size": k
-                }
-            )
-            
+        hybrid_mode = _validate_search(search_type, hybrid_mode)
+        if hybrid_mode is not None:
+            metadata["hybrid_mode"] = hybrid_mode
+        result_cache = get_result_cache()
+        if result_cache is not None:
+            cache_key = _result_cache_key(query, _generation_tracker.current(), search_type, k, include_assets,
+                                          bm25_filter, metadata.get("hybrid_mode"), rank_window, weights, lean)
+            cached = result_cache.get(cache_key)
+            metadata["result_cache"] = "miss" if cached is None else "hit"
+            if cached is not None:
+                metadata["hits"] = len(cached)
+                timings["total_ms"] = _elapsed_ms(start)
+                return SearchResults(cached, metadata)
+
+        options = {"bm25_filter": bm25_filter, "snippet_chars": SNIPPET_MAX_CHARS if lean else None}
+        if search_type == "hybrid" and hybrid_mode == "rrf":
+            hits = _rrf_search(query, k, timings, legs, rank_window or RRF_RANK_WINDOW, weights or RRF_WEIGHTS,
+                               **options)
         else:
-            raise ValueError(f"Invalid search type: {search_type}")
+            hits = _search_leg(query, search_type, k, timings, legs, **options)
         
         # Process and return results
-        results = []
-        for hit in response["hits"]["hits"]:
-            result = {
-                "score": hit["_score"],
-                "text": hit["_source"]["text"],
-                "source": hit["_source"]["source_pdf"],
-                "page": hit["_source"]["page_number"],
-                "metadata": hit["_source"].get("metadata", {}),
-                "has_image": hit["_source"]["metadata"].get("image_info", {}).get("has_image", False)
-            }
-            if result["has_image"]:
-                result["image_info"] = hit["_source"]["metadata"]["image_info"]
-            results.append(result)
+        postprocess_start = time.perf_counter()
+        results = SearchResults((_build_result(hit, lean) for hit in hits), metadata)
+        _summarize_legs(metadata, results)
+        timings["postprocess_ms"] = _elapsed_ms(postprocess_start)
             
+        if include_assets:
+            assets_start = time.perf_counter()
+            fetch_page_assets(results)
+            timings["assets_ms"] = _elapsed_ms(assets_start)
+        if result_cache is not None:
+            result_cache.put(cache_key, list(results))
+        timings["total_ms"] = _elapsed_ms(start)
         return results
         
     except Exception as e:
         logger.error(f"Error performing search: {str(e)}", exc_info=True)
-        return []
+        metadata["error"] = str(e)
+        timings["total_ms"] = _elapsed_ms(start)
+        return SearchResults(metadata=metadata)
+    finally:
+        _record_metrics(metadata)
+
+async def _asearch_leg(query, search_type, size, timings, legs, **options):
+    """Async _search_leg: the query is embedded and searched without blocking the event loop."""
+    query_vector = None
+    if search_type != "bm25":
+        embeddings = _timed_embeddings(timings)
+        start = time.perf_counter()
+        query_vector = await embeddings.aembed_query(query)
+        timings["embed_ms"] = _elapsed_ms(start)
+    stats = legs[search_type] = {}
+    start = time.perf_counter()
+    hits = await get_async_backend().search(query, query_vector, search_type, size, stats=stats, **options)
+    _record_leg(search_type, _elapsed_ms(start), stats, timings)
+    return hits
+
+async def _arrf_search(query, k, timings, legs, rank_window, weights, **options):
+    """Async _rrf_search: the BM25 leg runs concurrently with the embedding and the kNN leg."""
+    size = max(rank_window, k)
+    bm25_hits, vector_hits = await asyncio.gather(
+        _asearch_leg(query, "bm25", size, timings, legs, **options),
+        _asearch_leg(query, "vector", size, timings, legs, **options)
+    )
+    start = time.perf_counter()
+    fused = reciprocal_rank_fusion({"bm25": bm25_hits, "vector": vector_hits}, weights, RRF_RANK_CONSTANT)
+    hits = [dict(hit, _score=score, _ranks=ranks) for hit, score, ranks in fused[:k]]
+    timings["fuse_ms"] = _elapsed_ms(start)
+    return hits
+
+async def asearch_documents(query, search_type="hybrid", k=5, include_assets=True, bm25_filter=False,
+                            hybrid_mode=None, rank_window=None, weights=None, lean=None):
+    """
+    Async search_documents, for event loops running many searches concurrently.
+
+    Takes the same arguments and returns the same SearchResults as
+    search_documents, sharing its result cache, but embeds the query with
+    the async embedding path and searches with the event loop's
+    AsyncElasticsearch client, see get_async_backend.
+    """
+    timings = {}
+    legs = {}
+    lean = SEARCH_LEAN if lean is None else lean
+    metadata = {"search_type": search_type, "lean": lean, "timings": timings, "legs": legs}
+    start = time.perf_counter()
+    try:
+        hybrid_mode = _validate_search(search_type, hybrid_mode)
+        if hybrid_mode is not None:
+            metadata["hybrid_mode"] = hybrid_mode
+        result_cache = get_result_cache()
+        if result_cache is not None:
+            # The generation is fetched with the synchronous client at most every check interval
+            generation = await asyncio.to_thread(_generation_tracker.current)
+            cache_key = _result_cache_key(query, generation, search_type, k, include_assets, bm25_filter,
+                                          hybrid_mode, rank_window, weights, lean)
+            cached = result_cache.get(cache_key)
+            metadata["result_cache"] = "miss" if cached is None else "hit"
+            if cached is not None:
+                metadata["hits"] = len(cached)
+                timings["total_ms"] = _elapsed_ms(start)
+                return SearchResults(cached, metadata)
+
+        options = {"bm25_filter": bm25_filter, "snippet_chars": SNIPPET_MAX_CHARS if lean else None}
+        if hybrid_mode == "rrf":
+            hits = await _arrf_search(query, k, timings, legs, rank_window or RRF_RANK_WINDOW,
+                                      weights or RRF_WEIGHTS, **options)
+        else:
+            hits = await _asearch_leg(query, search_type, k, timings, legs, **options)
+        postprocess_start = time.perf_counter()
+        results = SearchResults((_build_result(hit, lean) for hit in hits), metadata)
+        _summarize_legs(metadata, results)
+        timings["postprocess_ms"] = _elapsed_ms(postprocess_start)
+
+        if include_assets:
+            assets_start = time.perf_counter()
+            await afetch_page_assets(results)
+            timings["assets_ms"] = _elapsed_ms(assets_start)
+        if result_cache is not None:
+            result_cache.put(cache_key, list(results))
+        timings["total_ms"] = _elapsed_ms(start)
+        return results
+
+    except Exception as e:
+        logger.error(f"Error performing search: {str(e)}", exc_info=True)
+        metadata["error"] = str(e)
+        timings["total_ms"] = _elapsed_ms(start)
+        return SearchResults(metadata=metadata)
+    finally:
+        _record_metrics(metadata)
+
+def _embed_queries(embeddings, queries):
+    """Vectors of queries, embedding the ones not cached in a single call."""
+    if hasattr(embeddings, 'embed_queries'):
+        return embeddings.embed_queries(queries)
+    return embeddings.embed_documents(queries)
+
+def search_documents_batch(queries, search_type="hybrid", k=5, include_assets=True, bm25_filter=False,
+                           hybrid_mode=None, rank_window=None, weights=None, lean=None):
+    """
+    Search documents for several queries in one round trip.
+
+    Queries not served from the result cache are embedded in a single call
+    and searched with a single _msearch request, both legs of "rrf"
+    searches included, and the page assets of all their results are
+    fetched together.
+
+    Args:
+        queries (list): The search queries; repeated queries are searched once
+        search_type, k, include_assets, bm25_filter, hybrid_mode,
+        rank_window, weights, lean: As in search_documents, for every query
+
+    Returns:
+        dict: "results" maps every query to its SearchResults, as
+            search_documents would return them, and "merged" holds the
+            results of all queries by descending score with every chunk
+            once, listing the queries that found it as "queries"
+            (see search_backends.merge_results). Its metadata holds the
+            timings in milliseconds of the whole batch and the stats of its
+            _msearch request; every query's results hold copies of them,
+            and only the batch is recorded in the metrics sinks.
+    """
+    timings = {}
+    lean = SEARCH_LEAN if lean is None else lean
+    queries = list(dict.fromkeys(queries))
+    metadata = {"search_type": search_type, "lean": lean, "timings": timings, "legs": {}}
+    start = time.perf_counter()
+    try:
+        hybrid_mode = _validate_search(search_type, hybrid_mode)
+        if hybrid_mode is not None:
+            metadata["hybrid_mode"] = hybrid_mode
+        results = {}
+        cache_keys = {}
+        pending = []
+        result_cache = get_result_cache()
+        generation = _generation_tracker.current() if result_cache is not None else None
+        for query in queries:
+            query_metadata = dict(metadata, timings={}, legs={})
+            if result_cache is not None:
+                cache_keys[query] = _result_cache_key(query, generation, search_type, k, include_assets, bm25_filter,
+                                                      hybrid_mode, rank_window, weights, lean)
+                cached = result_cache.get(cache_keys[query])
+                query_metadata["result_cache"] = "miss" if cached is None else "hit"
+                if cached is not None:
+                    results[query] = SearchResults(cached, query_metadata)
+                    continue
+            results[query] = SearchResults(metadata=query_metadata)
+            pending.append(query)
+
+        if pending:
+            query_vectors = [None] * len(pending)
+            if search_type != "bm25":
+                embeddings = _timed_embeddings(timings)
+                embed_start = time.perf_counter()
+                query_vectors = _embed_queries(embeddings, pending)
+                timings["embed_ms"] = _elapsed_ms(embed_start)
+
+            # One search per query, or one per leg and query for "rrf"
+            rrf = hybrid_mode == "rrf"
+            leg_names = ("bm25", "vector") if rrf else (search_type,)
+            size = max(rank_window or RRF_RANK_WINDOW, k) if rrf else k
+            options = {"bm25_filter": bm25_filter, "snippet_chars": SNIPPET_MAX_CHARS if lean else None}
+            searches = [
+                dict(options, query=query, query_vector=None if leg == "bm25" else query_vector, search_type=leg, k=size)
+                for query, query_vector in zip(pending, query_vectors) for leg in leg_names
+            ]
+            stats = metadata["legs"]["msearch"] = {}
+            search_start = time.perf_counter()
+            leg_hits = get_backend().search_many(searches, stats=stats)
+            _record_leg("msearch", _elapsed_ms(search_start), stats, timings)
+
+            postprocess_start = time.perf_counter()
+            for i, query in enumerate(pending):
+                hits = leg_hits[i * len(leg_names)]
+                if rrf:
+                    fused = reciprocal_rank_fusion(
+                        dict(zip(leg_names, leg_hits[i * len(leg_names):(i + 1) * len(leg_names)])),
+                        weights or RRF_WEIGHTS, RRF_RANK_CONSTANT
+                    )
+                    hits = [dict(hit, _score=score, _ranks=ranks) for hit, score, ranks in fused[:k]]
+                results[query].extend(_build_result(hit, lean) for hit in hits)
+            timings["postprocess_ms"] = _elapsed_ms(postprocess_start)
+
+            if include_assets:
+                assets_start = time.perf_counter()
+                fetch_page_assets([result for query in pending for result in results[query]])
+                timings["assets_ms"] = _elapsed_ms(assets_start)
+            if result_cache is not None:
+                for query in pending:
+                    result_cache.put(cache_keys[query], list(results[query]))
+            for query in pending:
+                results[query].metadata.update(
+                    timings=dict(timings), legs={name: dict(stats) for name, stats in metadata["legs"].items()}
+                )
+        for query_results in results.values():
+            query_results.metadata["hits"] = len(query_results)
+
+        merged = SearchResults(merge_results(results), metadata)
+        _summarize_legs(metadata, merged)
+        timings["total_ms"] = _elapsed_ms(start)
+        return {"results": results, "merged": merged}
+
+    except Exception as e:
+        logger.error(f"Error performing batch search: {str(e)}", exc_info=True)
+        metadata["error"] = str(e)
+        timings["total_ms"] = _elapsed_ms(start)
+        return {
+            "results": {query: SearchResults(metadata=dict(metadata)) for query in queries},
+            "merged": SearchResults(metadata=metadata)
+        }
+    finally:
+        _record_metrics(metadata)
 
 def test_elasticsearch_connection():
     """Test Elasticsearch connection and return True if successful."""
     try:
+        es = get_es_client()
+        if es is None:
+            logger.info(f"Using the local index in {LOCAL_INDEX_DIR}, not Elasticsearch")
+            return True
         if not es.ping():
             logger.error("Failed to ping Elasticsearch")
             return False
@@ -223,4 +780,20 @@ if __name__ == "__main__":
             logger.info(f"\nResult {i}:")
             logger.info(f"Score: {result['score']}")
             logger.info(f"Source: {result['source']} (Page {result['page']})")
-            logger.info(f"Text: {result['text'][:200]}...") 
\ No newline at end of file
+            logger.info(f"Text: {result['text'][:200]}...") 
+        # Response and prompt size of the same search with whole chunks and with snippets;
+        # without the result cache, so both searches go to the backend
+        RESULT_CACHE, _result_cache = "off", None
+        for lean in (False, True):
+            sized = search_documents(query, search_type="hybrid", k=5, lean=lean)
+            logger.info(
+                f"{'Lean' if lean else 'Full'} results: {sized.metadata['response_bytes']} response bytes, "
+                f"about {sum(approximate_token_count(result['text']) for result in sized)} prompt tokens of text"
+            )
+        stats = get_query_cache_stats()
+        if stats is not None:
+            logger.info(f"Query embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                        f"({100 * stats['hit_rate']:.0f}% hit rate)")
+        logger.info(f"Stage timings of the first search: {results.metadata['timings']}")
+        if get_retrieval_metrics() is not None:
+            logger.info(f"Search metrics:\n{get_retrieval_metrics().export_text()}")
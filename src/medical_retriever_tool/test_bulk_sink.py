@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from elasticsearch import Elasticsearch
+from bulk_sink import stream_bulk
+
+def fake_bulk_response(operations=None, **kwargs):
+    """Acknowledge every index operation except documents whose id starts with 'bad'."""
+    items = []
+    for line in operations[::2]:
+        doc_id = line.decode('utf-8').split('"_id":"')[1].split('"')[0]
+        if doc_id.startswith("bad"):
+            items.append({"index": {"_id": doc_id, "status": 400, "error": {"type": "mapper_parsing_exception"}}})
+        else:
+            items.append({"index": {"_id": doc_id, "status": 201}})
+    response = MagicMock()
+    response.body = {"errors": any("error" in item["index"] for item in items), "items": items}
+    return response
+
+class TestStreamBulk(unittest.TestCase):
+    def setUp(self):
+        self.es = Elasticsearch("http://localhost:9200")
+
+    def test_reports_indexed_and_failed_items(self):
+        """Per-item failures are reported while the rest of the stream is indexed"""
+        actions = ({"_index": "test", "_id": doc_id, "_source": {"text": doc_id}}
+                   for doc_id in ["a", "b", "bad-1", "c", "d"])
+        with patch.object(Elasticsearch, "bulk", side_effect=fake_bulk_response) as mock_bulk:
+            result = stream_bulk(self.es, actions, chunk_size=2, max_in_flight=2)
+
+        self.assertEqual(result["indexed"], 4)
+        self.assertEqual(result["failed"], [{"_id": "bad-1", "error": {"type": "mapper_parsing_exception"}}])
+        self.assertEqual(mock_bulk.call_count, 3)
+
+    def test_flushes_by_byte_size(self):
+        """Requests are split once they reach max_chunk_bytes"""
+        actions = ({"_index": "test", "_id": str(i), "_source": {"text": "x" * 1000}} for i in range(6))
+        with patch.object(Elasticsearch, "bulk", side_effect=fake_bulk_response) as mock_bulk:
+            result = stream_bulk(self.es, actions, chunk_size=500, max_chunk_bytes=2500)
+
+        self.assertEqual(result["indexed"], 6)
+        self.assertEqual(mock_bulk.call_count, 3)
+
+    def test_reports_acknowledged_ids(self):
+        """Only acknowledged ids are passed to on_indexed, in groups of at most chunk_size"""
+        actions = ({"_index": "test", "_id": doc_id, "_source": {"text": doc_id}}
+                   for doc_id in ["a", "b", "bad-1", "c"])
+        acked = []
+        with patch.object(Elasticsearch, "bulk", side_effect=fake_bulk_response):
+            stream_bulk(self.es, actions, chunk_size=2, max_in_flight=1, on_indexed=acked.append)
+
+        self.assertTrue(all(len(ids) <= 2 for ids in acked))
+        self.assertEqual(sorted(doc_id for ids in acked for doc_id in ids), ["a", "b", "c"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+import tempfile
+from checkpoint import IngestCheckpoint
+
+class TestIngestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "output", "checkpoint.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_progress_survives_reopen(self):
+        """Acknowledged chunks and finished documents are read back after a crash"""
+        checkpoint = IngestCheckpoint(self.path)
+        checkpoint.start("full", "medical_journal", "key")
+        checkpoint.record_chunks("aaa", ["aaa_0", "aaa_1"])
+        checkpoint.record_document("a.pdf", "aaa", signatures={"aaa_0": "00ff"})
+        checkpoint.record_chunks("bbb", ["bbb_0"])
+        checkpoint.close()
+
+        resumed = IngestCheckpoint(self.path)
+        self.assertEqual(resumed.run["mode"], "full")
+        self.assertEqual(resumed.run["index_name"], "medical_journal")
+        self.assertTrue(resumed.is_document_done("aaa"))
+        self.assertFalse(resumed.is_document_done("bbb"))
+        self.assertEqual(resumed.acked_chunks("bbb"), {"bbb_0"})
+        self.assertEqual(resumed.signatures, {"aaa_0": "00ff"})
+
+        resumed.resume()
+        resumed.record_chunks("bbb", ["bbb_1"])
+        resumed.close()
+        self.assertEqual(IngestCheckpoint(self.path).acked_chunks("bbb"), {"bbb_0", "bbb_1"})
+
+    def test_torn_last_line_is_ignored(self):
+        """A line cut off by a crash does not prevent resuming"""
+        checkpoint = IngestCheckpoint(self.path)
+        checkpoint.start("full", "medical_journal", "key")
+        checkpoint.record_chunks("aaa", ["aaa_0"])
+        checkpoint.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"event": "chunks", "pdf_sha256": "aaa", "ids": ["aaa_1"')
+
+        resumed = IngestCheckpoint(self.path)
+        self.assertEqual(resumed.acked_chunks("aaa"), {"aaa_0"})
+
+        # Records appended after resuming are not glued to the torn line
+        resumed.resume()
+        resumed.record_chunks("aaa", ["aaa_2"])
+        resumed.close()
+        self.assertEqual(IngestCheckpoint(self.path).acked_chunks("aaa"), {"aaa_0", "aaa_2"})
+
+    def test_clear_removes_journal(self):
+        checkpoint = IngestCheckpoint(self.path)
+        checkpoint.start("full", "medical_journal", "key")
+        checkpoint.clear()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(IngestCheckpoint(self.path).run)
+        with self.assertRaises(ValueError):
+            IngestCheckpoint(self.path).resume()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from conversion import _convert_in_pool, _conversion_result, ConversionStats
+
+def stub_convert(pdf_file):
+    """Converts a PDF named "<pages>.pdf" into a document of that many pages."""
+    converted = _conversion_result(pdf_file)
+    converted["num_pages"] = int(pdf_file.split(".")[0])
+    converted["document"] = {"num_pages": converted["num_pages"]}
+    converted["duration"] = 0.5
+    return converted
+
+class CountingPools:
+    """Thread pools standing in for worker process pools, counting submissions."""
+
+    def __init__(self):
+        self.created = 0
+        self.submitted = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        self.created += 1
+        pools = self
+
+        class Pool(ThreadPoolExecutor):
+            def submit(self, fn, *args):
+                with pools.lock:
+                    pools.submitted += 1
+                return super().submit(fn, *args)
+
+        return Pool(max_workers=2)
+
+class TestConvertInPool(unittest.TestCase):
+    def test_converts_every_pdf_within_the_pending_window(self):
+        """At most max_pending conversions are queued ahead of the consumer"""
+        pools = CountingPools()
+        pdf_files = [f"{i}.pdf" for i in range(1, 11)]
+        results = []
+        for converted in _convert_in_pool(pdf_files, pools, stub_convert, max_pending=4):
+            results.append(converted)
+            self.assertLessEqual(pools.submitted - len(results), 4)
+        self.assertEqual(sorted(converted["pdf_file"] for converted in results), sorted(pdf_files))
+        self.assertEqual(pools.created, 1)
+
+    def test_conversion_exception_becomes_the_pdf_error(self):
+        def convert(pdf_file):
+            if pdf_file == "bad.pdf":
+                raise RuntimeError("no xref table")
+            return stub_convert(pdf_file)
+
+        results = {converted["pdf_file"]: converted
+                   for converted in _convert_in_pool(["1.pdf", "bad.pdf", "2.pdf"], CountingPools(), convert, 2)}
+        self.assertEqual(results["bad.pdf"]["error"], "Error converting bad.pdf: no xref table")
+        self.assertIsNone(results["1.pdf"]["error"])
+        self.assertEqual(results["2.pdf"]["num_pages"], 2)
+
+    def test_dead_worker_fails_only_its_pdf(self):
+        """After a worker dies the pool is replaced and the PDFs in flight are retried"""
+        attempts = {}
+
+        def convert(pdf_file):
+            attempts[pdf_file] = attempts.get(pdf_file, 0) + 1
+            if pdf_file == "crash.pdf":
+                raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+            return stub_convert(pdf_file)
+
+        pools = CountingPools()
+        pdf_files = ["1.pdf", "crash.pdf", "2.pdf", "3.pdf"]
+        results = {converted["pdf_file"]: converted for converted in _convert_in_pool(pdf_files, pools, convert, 4)}
+        self.assertEqual(sorted(results), sorted(pdf_files))
+        self.assertEqual(results["crash.pdf"]["error"], "Conversion worker died converting crash.pdf")
+        self.assertEqual([results[name]["error"] for name in ("1.pdf", "2.pdf", "3.pdf")], [None] * 3)
+        self.assertEqual(attempts["crash.pdf"], 2)
+        self.assertGreater(pools.created, 1)
+
+class TestConversionStats(unittest.TestCase):
+    def test_throughput_per_worker(self):
+        stats = ConversionStats()
+        for converted in (dict(stub_convert("4.pdf"), worker=1), dict(stub_convert("2.pdf"), worker=1),
+                          dict(stub_convert("3.pdf"), worker=2), dict(stub_convert("5.pdf"), cached=True)):
+            stats.add(converted)
+        self.assertEqual(stats.report_lines(), [
+            "Worker 1: 2 files, 6 pages in 1.0s (6.00 pages/sec)",
+            "Worker 2: 1 files, 3 pages in 0.5s (6.00 pages/sec)",
+            "Conversion cache: 1 files reused"
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
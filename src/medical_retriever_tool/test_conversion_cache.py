@@ -0,0 +1,48 @@
+import unittest
+import tempfile
+from conversion_cache import ConversionCache
+
+class FakePipelineOptions:
+    def __init__(self, **options):
+        self.options = options
+
+    def model_dump_json(self):
+        return str(sorted(self.options.items()))
+
+DOCUMENT = {
+    "name": "breathe-journal",
+    "num_pages": 2,
+    "markdown": "## Asthma\n\nHumidity and airway inflammation.",
+    "tables": [{"table_index": 0, "content": "", "structure": "", "page_number": 2}],
+    "images": []
+}
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.options = FakePipelineOptions(do_table_structure=True, do_image_ocr=True)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        """A stored document is returned for the same PDF hash"""
+        cache = ConversionCache(self.tmp_dir.name, self.options, "2.0.0")
+        self.assertIsNone(cache.get("abc"))
+        cache.put("abc", DOCUMENT)
+        self.assertEqual(ConversionCache(self.tmp_dir.name, self.options, "2.0.0").get("abc"), DOCUMENT)
+
+    def test_key_includes_pipeline_options_and_version(self):
+        """Changing pipeline options or Docling version misses the cache"""
+        ConversionCache(self.tmp_dir.name, self.options, "2.0.0").put("abc", DOCUMENT)
+        other_options = FakePipelineOptions(do_table_structure=False, do_image_ocr=True)
+        self.assertIsNone(ConversionCache(self.tmp_dir.name, other_options, "2.0.0").get("abc"))
+        self.assertIsNone(ConversionCache(self.tmp_dir.name, self.options, "2.1.0").get("abc"))
+
+    def test_non_json_values_are_stored_as_text(self):
+        cache = ConversionCache(self.tmp_dir.name, self.options)
+        cache.put("abc", dict(DOCUMENT, images=[{"caption": object.__new__(FakePipelineOptions)}]))
+        self.assertIsInstance(cache.get("abc")["images"][0]["caption"], str)
+
+if __name__ == '__main__':
+    unittest.main()
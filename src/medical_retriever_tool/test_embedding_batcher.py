@@ -0,0 +1,59 @@
+import unittest
+import threading
+from embedding_batcher import embed_in_batches
+
+class FakeEmbeddings:
+    """Embeds a text as [len(text)] and fails on texts listed in poison."""
+
+    def __init__(self, fail_first=0, poison=()):
+        self.calls = []
+        self.fail_first = fail_first
+        self.poison = set(poison)
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.calls.append(list(texts))
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise RuntimeError("429 Too Many Requests")
+        if self.poison.intersection(texts):
+            raise RuntimeError("bad input")
+        return [[float(len(text))] for text in texts]
+
+class TestEmbedInBatches(unittest.TestCase):
+    def test_vectors_follow_input_order(self):
+        """Vectors line up with texts across batches"""
+        texts = ["a" * n for n in range(1, 11)]
+        embeddings = FakeEmbeddings()
+        vectors = embed_in_batches(embeddings, texts, batch_size=3, max_in_flight=4, retry_delay=0)
+        self.assertEqual(vectors, [[float(n)] for n in range(1, 11)])
+        self.assertEqual(len(embeddings.calls), 4)
+
+    def test_only_failed_batch_is_retried(self):
+        """A transient failure re-sends just the failed batch"""
+        texts = ["a", "bb", "ccc", "dddd"]
+        embeddings = FakeEmbeddings(fail_first=1)
+        vectors = embed_in_batches(embeddings, texts, batch_size=2, max_in_flight=1, retry_delay=0)
+        self.assertEqual(vectors, [[1.0], [2.0], [3.0], [4.0]])
+        self.assertEqual(embeddings.calls, [["a", "bb"], ["a", "bb"], ["ccc", "dddd"]])
+
+    def test_bad_input_is_isolated(self):
+        """A text that always fails yields None without losing its batch"""
+        texts = ["a", "bb", "bad", "dddd"]
+        embeddings = FakeEmbeddings(poison=["bad"])
+        vectors = embed_in_batches(embeddings, texts, batch_size=4, max_retries=0, retry_delay=0)
+        self.assertEqual(vectors, [[1.0], [2.0], None, [4.0]])
+
+    def test_throttled_batch_is_not_split(self):
+        """A batch still throttled after its retries is given up instead of split into more requests"""
+        embeddings = FakeEmbeddings(fail_first=2)
+        vectors = embed_in_batches(embeddings, ["a", "bb", "ccc"], batch_size=3, max_retries=1, retry_delay=0)
+        self.assertEqual(vectors, [None, None, None])
+        self.assertEqual(len(embeddings.calls), 2)
+
+    def test_empty_input(self):
+        self.assertEqual(embed_in_batches(FakeEmbeddings(), []), [])
+
+if __name__ == '__main__':
+    unittest.main()
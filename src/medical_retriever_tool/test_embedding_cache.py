@@ -0,0 +1,108 @@
+import unittest
+import tempfile
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+
+MODEL_ID = "ibm/slate-125m-english-rtrvr-v2"
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def open_cache(self, **kwargs):
+        options = {"dims": 3, "max_entries": 100}
+        options.update(kwargs)
+        return EmbeddingCache(self.tmp_dir.name, MODEL_ID, 500, **options)
+
+    def test_vectors_persist_across_opens(self):
+        """Vectors written and flushed are found by a new cache instance"""
+        cache = self.open_cache()
+        cache.put_many(["asthma", "humidity"], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        cache.flush()
+
+        reopened = self.open_cache(readonly=True)
+        self.assertEqual(reopened.get_many(["humidity", "copd", "asthma"]),
+                         [[4.0, 5.0, 6.0], None, [1.0, 2.0, 3.0]])
+        self.assertEqual((reopened.hits, reopened.misses), (2, 1))
+
+    def test_key_includes_model_settings(self):
+        """A different truncation setting does not reuse cached vectors"""
+        cache = self.open_cache()
+        cache.put_many(["asthma"], [[1.0, 2.0, 3.0]])
+        cache.flush()
+        other = EmbeddingCache(self.tmp_dir.name, MODEL_ID, 256, dims=3)
+        self.assertEqual(other.get_many(["asthma"]), [None])
+
+    def test_grows_and_evicts_least_recently_used(self):
+        """The cache never holds more than max_entries vectors"""
+        cache = self.open_cache(max_entries=2000)
+        texts = [f"chunk {i}" for i in range(2000)]
+        cache.put_many(texts, [[float(i), 0.0, 0.0] for i in range(2000)])
+        cache.get_many(texts[:10])
+        cache.put_many(["new chunk"], [[9.0, 9.0, 9.0]])
+
+        self.assertLessEqual(len(cache), 2000)
+        self.assertNotIn(None, cache.get_many(texts[:10] + ["new chunk"]))
+        self.assertEqual(cache.get_many(["chunk 10"]), [None])
+
+    def test_readonly_cache_misses_slots_reused_by_writer(self):
+        """A reader opened before an eviction does not return the vector now in the slot"""
+        cache = self.open_cache(max_entries=10)
+        texts = [f"chunk {i}" for i in range(10)]
+        cache.put_many(texts, [[float(i), 0.0, 0.0] for i in range(10)])
+        cache.flush()
+        reader = self.open_cache(readonly=True)
+        cache.put_many(["new chunk"], [[9.0, 9.0, 9.0]])
+        cache.flush()
+
+        self.assertEqual(reader.get_many(["chunk 0", "chunk 1"]), [None, [1.0, 0.0, 0.0]])
+        self.assertEqual((reader.hits, reader.misses), (1, 1))
+
+    def test_stored_key_is_rewritten_into_a_fresh_slot(self):
+        """A reader keeps the complete previous vector while the writer stores a new one"""
+        cache = self.open_cache()
+        cache.put_many(["asthma"], [[1.0, 2.0, 3.0]])
+        cache.flush()
+        reader = self.open_cache(readonly=True)
+        cache.put_many(["asthma"], [[4.0, 5.0, 6.0]])
+        cache.flush()
+
+        self.assertEqual(reader.get_many(["asthma"]), [[1.0, 2.0, 3.0]])
+        self.assertEqual(self.open_cache(readonly=True).get_many(["asthma"]), [[4.0, 5.0, 6.0]])
+        self.assertEqual(len(cache), 1)
+
+    def test_growth_is_persisted_without_flush(self):
+        """After a crash following a resize the header matches the grown files"""
+        cache = self.open_cache(max_entries=5000)
+        cache.put_many([f"chunk {i}" for i in range(1500)], [[float(i), 0.0, 0.0] for i in range(1500)])
+        reopened = self.open_cache(max_entries=5000, readonly=True)
+        self.assertEqual(reopened._capacity, cache._capacity)
+        self.assertEqual(len(reopened._keys), cache._capacity)
+
+    def test_float16_storage(self):
+        cache = self.open_cache(dtype="float16")
+        cache.put_many(["asthma"], [[0.5, 0.25, -1.0]])
+        self.assertEqual(cache.get_many(["asthma"]), [[0.5, 0.25, -1.0]])
+
+    def test_cached_embeddings_only_embeds_misses(self):
+        cache = self.open_cache()
+        embeddings = CountingEmbeddings()
+        cached = CachedEmbeddings(embeddings, cache)
+        cached.embed_documents(["a", "bb"])
+        vectors = cached.embed_documents(["bb", "ccc"])
+
+        self.assertEqual(embeddings.embedded, ["a", "bb", "ccc"])
+        self.assertEqual(vectors, [[2.0, 1.0, 0.5], [3.0, 1.0, 0.5]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import time
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+from embedding_client import TokenBucket, RateLimitedEmbeddings, is_retryable, backoff_delay
+
+def http_error(status, headers=None):
+    error = Exception(f"status {status}")
+    error.response = MagicMock(status_code=status, headers=headers or {})
+    return error
+
+class FlakyEmbeddings:
+    """Fails with the given errors first, then embeds texts as their lengths."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class TestEmbeddingClient(unittest.TestCase):
+    def client(self, embeddings, **options):
+        return RateLimitedEmbeddings(embeddings, bucket=TokenBucket(1000), base_delay=0.001, **options)
+
+    def test_token_bucket_limits_rate(self):
+        """After the burst is spent, tokens are handed out at the configured rate"""
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_retries_throttled_requests(self):
+        """429 and 5xx responses are retried until the request succeeds"""
+        embeddings = FlakyEmbeddings([http_error(429), http_error(503)])
+        client = self.client(embeddings)
+        self.assertEqual(client.embed_documents(["ab", "c"]), [[2.0], [1.0]])
+        self.assertEqual(embeddings.calls, 3)
+        self.assertEqual(client.throttled, 2)
+
+    def test_client_errors_are_not_retried(self):
+        embeddings = FlakyEmbeddings([http_error(400)])
+        with self.assertRaises(Exception):
+            self.client(embeddings).embed_documents(["a"])
+        self.assertEqual(embeddings.calls, 1)
+
+    def test_gives_up_after_max_retries(self):
+        embeddings = FlakyEmbeddings([http_error(429)] * 3)
+        with self.assertRaises(Exception):
+            self.client(embeddings, max_retries=2).embed_documents(["a"])
+        self.assertEqual(embeddings.calls, 3)
+
+    def test_backoff_honours_retry_after(self):
+        self.assertEqual(backoff_delay(http_error(429, {"Retry-After": "2"}), 0), 2.0)
+        self.assertLessEqual(backoff_delay(http_error(429), 3, base_delay=0.5), 4.0)
+        self.assertTrue(is_retryable(ConnectionError()))
+
+    def test_async_path_limits_in_flight(self):
+        """Concurrent async requests never exceed max_in_flight"""
+        state = {"active": 0, "peak": 0}
+
+        class SlowEmbeddings:
+            def embed_query(self, text):
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                time.sleep(0.02)
+                state["active"] -= 1
+                return [1.0]
+
+        client = self.client(SlowEmbeddings(), max_in_flight=2)
+
+        async def run():
+            return await asyncio.gather(*(client.aembed_query(str(i)) for i in range(6)))
+
+        self.assertEqual(asyncio.run(run()), [[1.0]] * 6)
+        self.assertLessEqual(state["peak"], 2)
+
+    def test_async_path_works_on_several_event_loops(self):
+        """A client shared by event loops, e.g. Streamlit sessions, waits on a semaphore per loop"""
+        class AsyncEmbeddings:
+            async def aembed_query(self, text):
+                await asyncio.sleep(0.001)
+                return [float(len(text))]
+
+        client = self.client(AsyncEmbeddings(), max_in_flight=1)
+
+        async def run():
+            return await asyncio.gather(*(client.aembed_query("ab") for _ in range(3)))
+
+        self.assertEqual(asyncio.run(run()), [[2.0]] * 3)
+        self.assertEqual(asyncio.run(run()), [[2.0]] * 3)
+
+    def test_async_path_awaits_native_async_methods(self):
+        """Clients with aembed_* are awaited on the event loop, and throttled calls retried"""
+        class AsyncEmbeddings(FlakyEmbeddings):
+            def embed_documents(self, texts):
+                raise AssertionError("blocking call from the async path")
+
+            async def aembed_documents(self, texts):
+                return FlakyEmbeddings.embed_documents(self, texts)
+
+        embeddings = AsyncEmbeddings([http_error(429)])
+        vectors = asyncio.run(self.client(embeddings).aembed_documents(["ab", "c"]))
+        self.assertEqual(vectors, [[2.0], [1.0]])
+        self.assertEqual(embeddings.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
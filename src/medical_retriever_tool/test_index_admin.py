@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+from index_admin import BULK_LOAD_SETTINGS, build_index_body, create_index, finalize_bulk_load, swap_alias
+from search_backends import MULTI_MATCH_FIELDS
+
+class TestIndexAdmin(unittest.TestCase):
+    def test_swap_moves_alias_off_previous_indices(self):
+        """The alias is removed from old indices and added to the new one in one request"""
+        es = MagicMock()
+        es.indices.exists_alias.return_value = True
+        es.indices.get_alias.return_value = {"medical_journal_1": {}}
+
+        old_indices = swap_alias(es, "medical_journal", "medical_journal_2")
+
+        self.assertEqual(old_indices, ["medical_journal_1"])
+        es.indices.update_aliases.assert_called_once_with(actions=[
+            {"remove": {"index": "medical_journal_1", "alias": "medical_journal"}},
+            {"add": {"index": "medical_journal_2", "alias": "medical_journal", "is_write_index": True}}
+        ])
+
+    def test_swap_replaces_legacy_concrete_index(self):
+        """A concrete index named like the alias is removed in the same request"""
+        es = MagicMock()
+        es.indices.exists_alias.return_value = False
+        es.indices.exists.return_value = True
+
+        old_indices = swap_alias(es, "medical_journal", "medical_journal_2")
+
+        self.assertEqual(old_indices, [])
+        actions = es.indices.update_aliases.call_args.kwargs["actions"]
+        self.assertEqual(actions[0], {"remove_index": {"index": "medical_journal"}})
+        self.assertEqual(actions[1]["add"]["index"], "medical_journal_2")
+
+    def test_bulk_load_settings_are_restored(self):
+        """A bulk-loaded index starts without refresh and replicas and gets them back when finalized"""
+        es = MagicMock()
+        create_index(es, "medical_journal_2", bulk_load=True)
+        settings = es.indices.create.call_args.kwargs["settings"]
+        for key, value in BULK_LOAD_SETTINGS.items():
+            self.assertEqual(settings[key], value)
+
+        finalize_bulk_load(es, "medical_journal_2")
+        restored = es.indices.put_settings.call_args.kwargs["settings"]
+        self.assertEqual(restored, {"refresh_interval": "30s", "number_of_replicas": 1})
+        es.indices.refresh.assert_called_once_with(index="medical_journal_2")
+
+    def test_vector_storage_options(self):
+        """Quantized HNSW options end up in the mapping and the vector stays out of _source"""
+        body = build_index_body({"index_type": "int8_hnsw", "m": 32, "ef_construction": 200})
+        self.assertEqual(body["mappings"]["properties"]["vector"]["index_options"],
+                         {"type": "int8_hnsw", "m": 32, "ef_construction": 200})
+        self.assertEqual(body["mappings"]["_source"], {"excludes": ["vector", "image_text"]})
+        with self.assertRaises(ValueError):
+            build_index_body({"index_type": "int2_hnsw"})
+
+    def test_text_search_fields_are_mapped(self):
+        """Every field of the BM25 query exists in the mapping"""
+        properties = build_index_body()["mappings"]["properties"]
+        for field in MULTI_MATCH_FIELDS:
+            mapping = properties
+            path = field.split("^")[0].split(".")
+            for name in path[:-1]:
+                mapping = mapping[name]["properties"]
+            self.assertEqual(mapping[path[-1]]["type"], "text", field)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import unittest
+import tempfile
+from index_manifest import IndexManifest, file_sha256, chunk_id
+
+SETTINGS = {"chunk_size": 500, "chunk_overlap": 50, "embedding_model_id": "ibm/slate-125m-english-rtrvr-v2"}
+
+class TestIndexManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "output", "manifest.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_plan_classifies_files(self):
+        """Files are new, changed, unchanged or removed relative to the manifest"""
+        manifest = IndexManifest(self.path, SETTINGS)
+        manifest.record("a.pdf", "aaa", 10)
+        manifest.record("b.pdf", "bbb", 5)
+        manifest.record("c.pdf", "ccc", 3)
+        manifest.save()
+
+        plan = IndexManifest(self.path, SETTINGS).plan({"a.pdf": "aaa", "b.pdf": "b2", "d.pdf": "ddd"})
+        self.assertEqual(plan, {
+            "new": ["d.pdf"],
+            "changed": ["b.pdf"],
+            "unchanged": ["a.pdf"],
+            "removed": ["c.pdf"],
+            "aliases": {}
+        })
+
+    def test_settings_change_marks_files_changed(self):
+        """Files indexed with other chunking settings are re-indexed"""
+        manifest = IndexManifest(self.path, SETTINGS)
+        manifest.record("a.pdf", "aaa", 10)
+        manifest.save()
+
+        plan = IndexManifest(self.path, dict(SETTINGS, chunk_size=800)).plan({"a.pdf": "aaa"})
+        self.assertEqual(plan["changed"], ["a.pdf"])
+
+    def test_dependents_of_changed_files_are_changed(self):
+        """Files with near-duplicates of a changed or removed file's chunks are re-indexed"""
+        manifest = IndexManifest(self.path, SETTINGS)
+        manifest.record("a.pdf", "aaa", 10)
+        manifest.record("b.pdf", "bbb", 5, duplicate_of={"aaa"})
+        manifest.record("c.pdf", "ccc", 3, duplicate_of={"bbb"})
+        manifest.record("d.pdf", "ddd", 4)
+
+        plan = manifest.plan({"a.pdf": "a2", "b.pdf": "bbb", "c.pdf": "ccc", "d.pdf": "ddd"})
+        self.assertEqual(plan["changed"], ["a.pdf", "b.pdf", "c.pdf"])
+        self.assertEqual(plan["unchanged"], ["d.pdf"])
+        plan = manifest.plan({"b.pdf": "bbb", "c.pdf": "ccc", "d.pdf": "ddd"})
+        self.assertEqual((plan["removed"], plan["changed"]), (["a.pdf"], ["b.pdf", "c.pdf"]))
+
+    def test_same_content_files_are_indexed_once(self):
+        """A copy of an indexed PDF is an alias; deleting either copy keeps the content indexed"""
+        manifest = IndexManifest(self.path, SETTINGS)
+        plan = manifest.plan({"b.pdf": "aaa", "a.pdf": "aaa"})
+        self.assertEqual((plan["new"], plan["aliases"]), (["a.pdf"], {"b.pdf": "a.pdf"}))
+        manifest.record("a.pdf", "aaa", 10)
+
+        plan = manifest.plan({"b.pdf": "aaa"})
+        self.assertEqual((plan["removed"], plan["new"], plan["aliases"]), (["a.pdf"], ["b.pdf"], {}))
+        plan = manifest.plan({"a.pdf": "aaa"})
+        self.assertEqual((plan["removed"], plan["unchanged"]), ([], ["a.pdf"]))
+
+    def test_alias_indexed_under_its_own_name_is_removed(self):
+        manifest = IndexManifest(self.path, SETTINGS)
+        manifest.record("a.pdf", "aaa", 10)
+        manifest.record("b.pdf", "aaa", 10)
+        plan = manifest.plan({"a.pdf": "aaa", "b.pdf": "aaa"})
+        self.assertEqual((plan["removed"], plan["changed"], plan["unchanged"]), (["b.pdf"], ["a.pdf"], []))
+
+    def test_reset(self):
+        manifest = IndexManifest(self.path, SETTINGS)
+        manifest.record("a.pdf", "aaa", 10)
+        manifest.reset()
+        self.assertEqual(manifest.plan({"a.pdf": "aaa"})["new"], ["a.pdf"])
+
+    def test_file_hash_and_chunk_id(self):
+        pdf_path = os.path.join(self.tmp_dir.name, "a.pdf")
+        with open(pdf_path, 'wb') as f:
+            f.write(b"%PDF-1.4")
+        sha256 = file_sha256(pdf_path)
+        self.assertEqual(len(sha256), 64)
+        self.assertEqual(chunk_id(sha256, 3), f"{sha256}_3")
+
+if __name__ == '__main__':
+    unittest.main()
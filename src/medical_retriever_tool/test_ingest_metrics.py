@@ -0,0 +1,51 @@
+import os
+import json
+import unittest
+import tempfile
+from ingest_metrics import IngestMetrics, percentile
+
+class TestIngestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "output", "ingest_metrics.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 95), 0.0)
+        self.assertEqual(percentile([3.0], 50), 3.0)
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50), 3.0)
+        self.assertAlmostEqual(percentile(list(range(1, 101)), 95), 95.05)
+
+    def test_events_and_summary(self):
+        """Stage, batch and document events are streamed and summarised"""
+        metrics = IngestMetrics(self.path)
+        metrics.record_stage("convert", 2.0, "a.pdf", pages=4)
+        with metrics.stage("chunk", "a.pdf"):
+            pass
+        metrics.record_embedding_batch(0.25, 64, 1, "a.pdf")
+        metrics.record_bulk_failure("a.pdf", "abc_3", {"type": "mapper_parsing_exception"})
+        metrics.record_document("a.pdf", True, pages=4, chunks=20, bytes=10000)
+        metrics.record_document("b.pdf", False, error="PDF file is empty: b.pdf")
+        summary = metrics.close()
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([event["event"] for event in events],
+                         ["stage", "stage", "embedding_batch", "bulk_failure", "document", "document", "summary"])
+        self.assertEqual(summary["documents"], 1)
+        self.assertEqual(summary["failed_documents"], 1)
+        self.assertEqual(summary["chunks"], 20)
+        self.assertEqual(summary["bulk_failures"], 1)
+        self.assertEqual(summary["stages"]["convert"]["p50_seconds"], 2.0)
+        self.assertEqual(summary["stages"]["chunk"]["count"], 1)
+        self.assertEqual(summary["embedding_batches"]["count"], 1)
+
+    def test_without_file(self):
+        metrics = IngestMetrics()
+        metrics.record_stage("convert", 1.0)
+        self.assertEqual(metrics.close()["stages"]["convert"]["total_seconds"], 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import math
+import unittest
+import tempfile
+from unittest.mock import patch
+import numpy as np
+from local_index import LocalIndex, LocalIndexWriter, BM25_K1, BM25_B
+
+DIMS = 4
+
+def chunk_action(doc_id, text, vector, sha="aaa", chunk_index=0, **fields):
+    source = {
+        "text": text,
+        "vector": vector,
+        "source_pdf": "a.pdf",
+        "pdf_sha256": sha,
+        "page_number": 1,
+        "chunk_index": chunk_index,
+        "content_type": "text",
+        "metadata": {}
+    }
+    source.update(fields)
+    return {"_index": "medical_journal", "_id": doc_id, "_source": source}
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.writer = LocalIndexWriter(self.tmp_dir.name, dims=DIMS)
+
+    def tearDown(self):
+        self.writer.close()
+        self.tmp_dir.cleanup()
+
+    def index(self, actions):
+        self.writer.index_actions(actions)
+        return self.writer.commit()
+
+    def test_bm25_matches_lucene_formula(self):
+        """Scores equal Lucene's BM25 with the text field's boost of 2"""
+        index = self.index([
+            chunk_action("aaa_0", "asthma and humidity", [1, 0, 0, 0], chunk_index=0),
+            chunk_action("aaa_1", "humidity in the tropics is high", [0, 1, 0, 0], chunk_index=1),
+            chunk_action("aaa_2", "diabetes", [0, 0, 1, 0], chunk_index=2)
+        ])
+        hits = index.search("asthma", None, "bm25", k=5)
+        self.assertEqual([hit["_id"] for hit in hits], ["aaa_0"])
+
+        # "and", "in", "the" and "is" are stop words: lengths are 2, 3 and 1
+        avg_length = (2 + 3 + 1) / 3
+        idf = math.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+        expected = 2.0 * idf * 1 / (1 + BM25_K1 * (1 - BM25_B + BM25_B * 2 / avg_length))
+        self.assertAlmostEqual(hits[0]["_score"], expected, places=5)
+        self.assertEqual(hits[0]["_source"]["text"], "asthma and humidity")
+        self.assertNotIn("vector", hits[0]["_source"])
+
+    def test_vector_and_hybrid_scores(self):
+        index = self.index([
+            chunk_action("aaa_0", "asthma", [1, 0, 0, 0], chunk_index=0),
+            chunk_action("aaa_1", "humidity", [0.6, 0.8, 0, 0], chunk_index=1)
+        ])
+        hits = index.search("humidity", [2, 0, 0, 0], "vector", k=2)
+        self.assertEqual([hit["_id"] for hit in hits], ["aaa_0", "aaa_1"])
+        self.assertAlmostEqual(hits[0]["_score"], 1.0, places=5)
+        self.assertAlmostEqual(hits[1]["_score"], 0.8, places=5)
+
+        bm25 = {hit["_id"]: hit["_score"] for hit in index.search("humidity", None, "bm25", k=2)}
+        hybrid = index.search("humidity", [2, 0, 0, 0], "hybrid", k=2)
+        self.assertEqual(hybrid[0]["_id"], "aaa_1")
+        self.assertAlmostEqual(hybrid[0]["_score"], 0.8 + bm25["aaa_1"], places=5)
+        self.assertAlmostEqual(hybrid[1]["_score"], 1.0, places=5)
+
+    def test_hybrid_adds_neighbours_to_bm25_matches(self):
+        """Like query + knn: BM25 matches outside the k neighbours keep their BM25 score"""
+        index = self.index([
+            chunk_action("aaa_0", "asthma", [1, 0, 0, 0], chunk_index=0),
+            chunk_action("aaa_1", "humidity", [-1, 0, 0, 0], chunk_index=1),
+            chunk_action("aaa_2", "pollen", [0, 1, 0, 0], chunk_index=2)
+        ])
+        bm25 = index.search("humidity", None, "bm25", k=1)[0]["_score"]
+        hits = index.search("humidity", [1, 0, 0, 0], "hybrid", k=2)
+        # The neighbours are aaa_0 (1.0) and aaa_2 (0.5); aaa_1 only matches the query
+        self.assertEqual([hit["_id"] for hit in hits], ["aaa_0", "aaa_1"])
+        self.assertAlmostEqual(hits[1]["_score"], bm25, places=5)
+
+        filtered = index.search("humidity", [1, 0, 0, 0], "vector", k=3, bm25_filter=True)
+        self.assertEqual([hit["_id"] for hit in filtered], ["aaa_1"])
+        self.assertAlmostEqual(filtered[0]["_score"], 0.0, places=5)
+
+    def test_duplicates_and_page_assets_are_not_returned(self):
+        """Only canonical chunks are searched; image captions of their page are"""
+        assets = {"_id": "aaa_p1_assets", "_source": {
+            "source_pdf": "a.pdf", "pdf_sha256": "aaa", "page_number": 1, "content_type": "page_assets",
+            "metadata": {"tables": [], "images": [{"caption": "bronchial scan", "description": "", "ocr_text": ""}]}
+        }}
+        index = self.index([
+            assets,
+            chunk_action("aaa_0", "figure one", [1, 0, 0, 0], chunk_index=0, content_type="image",
+                         assets_id="aaa_p1_assets"),
+            chunk_action("aaa_1", "figure one", None, chunk_index=1, duplicate_of="aaa_0")
+        ])
+        for search_type in ("bm25", "vector", "hybrid"):
+            hits = index.search("figure bronchial", [1, 0, 0, 0], search_type, k=5)
+            self.assertEqual([hit["_id"] for hit in hits], ["aaa_0"])
+        self.assertEqual([hit["_id"] for hit in index.search("bronchial", None, "bm25", k=5)], ["aaa_0"])
+        self.assertEqual(index.get(["aaa_p1_assets", "missing"])["aaa_p1_assets"]["metadata"]["images"][0]["caption"],
+                         "bronchial scan")
+
+    def test_staged_changes_survive_reopen(self):
+        """Changes written before a crash are committed by the next writer"""
+        self.index([chunk_action("aaa_0", "asthma", [1, 0, 0, 0])])
+        self.writer.index_actions([chunk_action("aaa_1", "humidity", [0, 1, 0, 0], chunk_index=1)])
+        self.writer.close()
+        # A partly written vector at the end of the staging file is dropped
+        with open(self.writer._vectors_path, 'ab') as f:
+            f.write(b"\0\0")
+
+        self.writer = LocalIndexWriter(self.tmp_dir.name, dims=DIMS)
+        committed = LocalIndex.open(self.tmp_dir.name)
+        self.assertEqual(len(committed), 1)
+        committed.close()
+        index = self.writer.commit()
+        self.assertEqual(sorted(index.ids), ["aaa_0", "aaa_1"])
+        self.assertEqual(index.search("humidity", [0, 1, 0, 0], "vector", k=1)[0]["_id"], "aaa_1")
+
+    def test_reader_opening_during_a_commit(self):
+        """A version read from CURRENT just before a commit can still be opened, until the next one"""
+        self.index([chunk_action("aaa_0", "asthma", [1, 0, 0, 0])])
+        with open(os.path.join(self.tmp_dir.name, "CURRENT"), 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+        self.index([chunk_action("aaa_1", "humidity", [0, 1, 0, 0], chunk_index=1)])
+        previous = LocalIndex(os.path.join(self.tmp_dir.name, version))
+        self.assertEqual(previous.ids, ["aaa_0"])
+        previous.close()
+
+        latest = self.index([chunk_action("aaa_2", "pollen", [0, 0, 1, 0], chunk_index=2)])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, version)))
+
+        # A reader that read CURRENT before it moved on to the latest version retries
+        current_path = os.path.join(self.tmp_dir.name, "CURRENT")
+        with open(current_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+        open_version = LocalIndex.__init__
+
+        def moving_current(index, version_dir):
+            with open(current_path, 'w', encoding='utf-8') as f:
+                f.write(os.path.basename(latest.version_dir))
+            open_version(index, version_dir)
+
+        with patch.object(LocalIndex, "__init__", moving_current):
+            reopened = LocalIndex.open(self.tmp_dir.name)
+        self.assertEqual(reopened.version_dir, latest.version_dir)
+        reopened.close()
+
+    def test_delete_stale_and_discard(self):
+        self.index([chunk_action(f"aaa_{i}", "asthma", [1, 0, 0, 0], chunk_index=i) for i in range(3)])
+        self.writer.index_actions([chunk_action("bbb_0", "asthma", [1, 0, 0, 0], sha="bbb")])
+        self.assertEqual(self.writer.delete_stale("a.pdf", "bbb", 1), 3)
+        self.assertEqual(self.writer.commit().ids, ["bbb_0"])
+
+        self.writer.delete_all()
+        self.writer.discard_staged()
+        self.assertEqual(self.writer.commit().ids, ["bbb_0"])
+        self.writer.delete_all()
+        self.assertEqual(len(self.writer.commit()), 0)
+
+    def test_ivf_with_all_lists_matches_exact_search(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, DIMS))
+        self.writer.index_actions(
+            chunk_action(f"aaa_{i}", "text", vector.tolist(), chunk_index=i) for i, vector in enumerate(vectors)
+        )
+        index = self.writer.commit(ivf_lists=4)
+        self.assertEqual(index.meta["ivf_lists"], 4)
+        query = rng.normal(size=DIMS).tolist()
+        exact = index.search("", query, "vector", k=10, nprobe=None)
+        probed = index.search("", query, "vector", k=10, nprobe=4)
+        self.assertEqual([hit["_id"] for hit in probed], [hit["_id"] for hit in exact])
+
+if __name__ == '__main__':
+    unittest.main()
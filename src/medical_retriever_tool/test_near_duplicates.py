@@ -0,0 +1,44 @@
+import unittest
+from near_duplicates import NearDuplicateIndex, shingles
+
+ABSTRACT = (
+    "Background: Hypertension is a leading risk factor for cardiovascular disease worldwide. "
+    "Methods: We conducted a randomized controlled trial of 1200 adults with stage 1 hypertension "
+    "comparing lifestyle intervention with usual care over 24 months. Results: Systolic blood pressure "
+    "fell by 8.2 mmHg in the intervention group compared with 2.1 mmHg under usual care."
+)
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    def test_finds_near_duplicates(self):
+        """A lightly edited copy is matched to the first occurrence"""
+        index = NearDuplicateIndex()
+        self.assertIsNone(index.check("a_0", ABSTRACT))
+        edited = ABSTRACT.replace("24 months", "twenty-four months") + " Preprint."
+        self.assertEqual(index.check("b_3", edited), "a_0")
+        self.assertEqual(len(index), 1)
+
+    def test_distinct_texts_are_kept(self):
+        index = NearDuplicateIndex()
+        self.assertIsNone(index.check("a_0", ABSTRACT))
+        other = ("Objective: To describe the incidence of sepsis in neonatal intensive care units and the "
+                 "antibiotic resistance patterns of isolated organisms across three tertiary hospitals.")
+        self.assertIsNone(index.check("a_1", other))
+        self.assertEqual(len(index), 2)
+
+    def test_exported_signatures_are_matched_after_load(self):
+        index = NearDuplicateIndex()
+        index.check("a_0", ABSTRACT)
+        index.check("a_1", "| --- | --- |")
+        restored = NearDuplicateIndex()
+        restored.load(index.export(["a_0", "a_1"]))
+        self.assertEqual(len(restored), 1)
+        self.assertEqual(restored.check("b_0", ABSTRACT + " Preprint."), "a_0")
+
+    def test_text_without_words_is_ignored(self):
+        index = NearDuplicateIndex()
+        self.assertIsNone(index.check("a_0", "| --- | --- |"))
+        self.assertEqual(shingles("--"), set())
+        self.assertEqual(len(index), 0)
+
+if __name__ == '__main__':
+    unittest.main()
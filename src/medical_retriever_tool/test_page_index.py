@@ -0,0 +1,43 @@
+import unittest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from page_index import PageIndex
+
+TABLES = [{"table_index": 0, "page_number": 2}, {"table_index": 1, "page_number": 3}]
+IMAGES = [{"page_number": 3, "caption": "Figure 1"}]
+
+class TestPageIndex(unittest.TestCase):
+    def setUp(self):
+        pages = [(1, "Abstract about asthma."), (2, "| humidity | admissions |"), (3, "Figure 1 shows PM2.5.")]
+        self.page_index, self.text = PageIndex.from_pages(pages, TABLES, IMAGES)
+
+    def test_joined_text_and_offsets(self):
+        """Offsets of each page's text map back to that page"""
+        self.assertEqual(self.text, "Abstract about asthma.\n| humidity | admissions |\nFigure 1 shows PM2.5.")
+        self.assertEqual(self.page_index.page_for_offset(0), 1)
+        self.assertEqual(self.page_index.page_for_offset(self.text.index("| humidity")), 2)
+        self.assertEqual(self.page_index.page_for_offset(self.text.index("PM2.5")), 3)
+
+    def test_page_content(self):
+        """Tables and images are looked up per page"""
+        self.assertEqual(self.page_index.content_type(1), "text")
+        self.assertEqual(self.page_index.content_type(2), "table")
+        self.assertEqual(self.page_index.content_type(3), "image")
+        self.assertEqual(self.page_index.tables_on(3), [TABLES[1]])
+        self.assertEqual(self.page_index.images_on(2), [])
+        self.assertEqual(self.page_index.asset_pages(), [2, 3])
+
+    def test_empty_pages_are_skipped(self):
+        page_index, text = PageIndex.from_pages([(1, ""), (2, "Text")], [], [])
+        self.assertEqual(text, "Text")
+        self.assertEqual(page_index.page_for_offset(0), 2)
+        self.assertEqual(PageIndex.from_pages([], [], [])[0].page_for_offset(5), 0)
+
+    def test_chunk_start_offsets(self):
+        """Chunks from the splitter map to the page they start on"""
+        splitter = RecursiveCharacterTextSplitter(chunk_size=30, chunk_overlap=0, add_start_index=True)
+        chunks = splitter.create_documents([self.text])
+        pages = [self.page_index.page_for_offset(chunk.metadata["start_index"]) for chunk in chunks]
+        self.assertEqual(pages, [1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from query_cache import QueryVectorCache, CachedQueryEmbeddings, normalize_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text))]
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+class TestQueryVectorCache(unittest.TestCase):
+    def test_normalized_queries_share_an_entry(self):
+        self.assertEqual(normalize_query("  Asthma   and\tCOPD "), "asthma and copd")
+        embeddings = CountingEmbeddings()
+        cached = CachedQueryEmbeddings(embeddings, QueryVectorCache())
+        first = cached.embed_query("Asthma")
+        self.assertEqual(cached.embed_query(" asthma "), first)
+        self.assertEqual(embeddings.queries, ["Asthma"])
+        self.assertEqual(cached.cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 1})
+
+    def test_lru_eviction(self):
+        cache = QueryVectorCache(max_entries=2)
+        cache.put("asthma", [1.0])
+        cache.put("copd", [2.0])
+        cache.get("asthma")
+        cache.put("humidity", [3.0])
+        self.assertIsNone(cache.get("copd"))
+        self.assertEqual(cache.get("asthma"), [1.0])
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entries_are_embedded_again(self):
+        clock = FakeClock()
+        embeddings = CountingEmbeddings()
+        cached = CachedQueryEmbeddings(embeddings, QueryVectorCache(ttl=60, clock=clock))
+        cached.embed_query("asthma")
+        clock.now = 59
+        cached.embed_query("asthma")
+        clock.now = 121
+        cached.embed_query("asthma")
+        self.assertEqual(len(embeddings.queries), 2)
+
+    def test_missing_queries_are_embedded_in_one_call(self):
+        embeddings = CountingEmbeddings()
+        calls = []
+        embed_documents = embeddings.embed_documents
+        embeddings.embed_documents = lambda texts: calls.append(texts) or embed_documents(texts)
+        cached = CachedQueryEmbeddings(embeddings, QueryVectorCache())
+        cached.embed_query("asthma")
+        self.assertEqual(cached.embed_queries(["Asthma", "copd", "eczema"]), [[6.0], [4.0], [6.0]])
+        self.assertEqual(calls, [["copd", "eczema"]])
+
+    def test_async_query_uses_cache(self):
+        embeddings = CountingEmbeddings()
+        cached = CachedQueryEmbeddings(embeddings, QueryVectorCache())
+        asyncio.run(cached.aembed_query("copd"))
+        self.assertEqual(asyncio.run(cached.aembed_query("COPD")), [4.0])
+        self.assertEqual(embeddings.queries, ["copd"])
+
+if __name__ == '__main__':
+    unittest.main()
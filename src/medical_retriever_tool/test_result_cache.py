@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import unittest
+import tempfile
+from result_cache import MemoryResultCache, DiskResultCache, IndexGenerationTracker, result_key
+
+RESULTS = [{"score": 1.5, "text": "Asthma and humidity", "source": "a.pdf", "page": 3, "metadata": {}}]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestResultKey(unittest.TestCase):
+    def test_key_fields(self):
+        key = result_key("Asthma ", "medical_journal_1:0", search_type="hybrid", k=5)
+        self.assertEqual(key, result_key("asthma", "medical_journal_1:0", search_type="hybrid", k=5))
+        self.assertNotEqual(key, result_key("asthma", "medical_journal_1:1", search_type="hybrid", k=5))
+        self.assertNotEqual(key, result_key("asthma", "medical_journal_1:0", search_type="hybrid", k=10))
+        self.assertNotEqual(key, result_key("asthma", "medical_journal_1:0", search_type="bm25", k=5))
+
+class TestMemoryResultCache(unittest.TestCase):
+    def test_hits_are_copies(self):
+        cache = MemoryResultCache()
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", RESULTS)
+        results = cache.get("key")
+        results[0]["tables"] = []
+        self.assertEqual(cache.get("key"), RESULTS)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_size_limit_and_ttl(self):
+        clock = FakeClock()
+        cache = MemoryResultCache(max_entries=2, ttl=60, clock=clock)
+        cache.put("a", RESULTS)
+        cache.put("b", RESULTS)
+        cache.get("a")
+        cache.put("c", RESULTS)
+        self.assertIsNone(cache.get("b"))
+        clock.now = 61
+        self.assertIsNone(cache.get("a"))
+
+class TestDiskResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_entries_are_shared_between_instances(self):
+        DiskResultCache(self.tmp_dir.name).put("key", RESULTS)
+        cache = DiskResultCache(self.tmp_dir.name)
+        self.assertEqual(cache.get("key"), RESULTS)
+        self.assertIsNone(cache.get("other"))
+
+    def test_writes_leave_no_temporary_files(self):
+        cache = DiskResultCache(self.tmp_dir.name)
+        cache.put("key", RESULTS)
+        cache.put("key", RESULTS)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["key.json"])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        entry_size = len(json.dumps({"stored": time.time(), "results": RESULTS}))
+        cache = DiskResultCache(self.tmp_dir.name, max_bytes=entry_size * 3 + entry_size // 2)
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.put(key, RESULTS)
+            os.utime(os.path.join(self.tmp_dir.name, f"{key}.json"), (i, i))
+        cache.put("d", RESULTS)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("d"), RESULTS)
+        self.assertLessEqual(len(cache), 3)
+
+    def test_expired_entries_are_ignored(self):
+        cache = DiskResultCache(self.tmp_dir.name, ttl=0)
+        cache.put("key", RESULTS)
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+class TestIndexGenerationTracker(unittest.TestCase):
+    def test_generation_is_checked_every_interval(self):
+        clock = FakeClock()
+        generations = iter(["index_1:0", "index_1:1"])
+        tracker = IndexGenerationTracker(lambda: next(generations), check_interval=5, clock=clock)
+        self.assertEqual(tracker.current(), "index_1:0")
+        clock.now = 4
+        self.assertEqual(tracker.current(), "index_1:0")
+        clock.now = 5
+        self.assertEqual(tracker.current(), "index_1:1")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import unittest
+import tempfile
+from retrieval_metrics import LatencyHistogram, RetrievalMetrics
+from search_backends import response_stats
+
+def search_metadata(total_ms, **fields):
+    metadata = {"search_type": "hybrid", "timings": {"embed_ms": 2.0, "vector_took_ms": 1.0, "total_ms": total_ms}}
+    metadata.update(fields)
+    return metadata
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_over_recent_samples(self):
+        histogram = LatencyHistogram(max_samples=100)
+        for value in range(1, 201):
+            histogram.observe(float(value))
+        summary = histogram.summary()
+        # Only the last 100 values are kept for percentiles, all count
+        self.assertEqual(summary["count"], 200)
+        self.assertAlmostEqual(summary["p50"], 150.5)
+        self.assertAlmostEqual(summary["p99"], 199.01)
+        self.assertAlmostEqual(summary["mean"], 100.5)
+
+class TestRetrievalMetrics(unittest.TestCase):
+    def test_stages_values_and_counters(self):
+        metrics = RetrievalMetrics()
+        for total_ms in (10.0, 20.0, 30.0):
+            metrics.record(search_metadata(total_ms, hits=5, response_bytes=1000))
+        metrics.record(search_metadata(1.0, result_cache="hit", hits=5))
+        metrics.record(search_metadata(3.0, error="timeout"))
+        snapshot = metrics.snapshot()
+        self.assertEqual(sorted(snapshot["stages"]), ["embed", "total", "vector_took"])
+        self.assertEqual(snapshot["stages"]["total"]["p50"], 10.0)
+        self.assertEqual(snapshot["values"]["hits"]["count"], 4)
+        self.assertEqual(snapshot["counters"], {"searches": 5, "errors": 1, "result_cache_hits": 1})
+
+    def test_text_export(self):
+        metrics = RetrievalMetrics()
+        metrics.record(search_metadata(10.0, hits=5, response_bytes=1000))
+        text = metrics.export_text()
+        self.assertIn('retrieval_stage_ms{stage="total",quantile="0.95"} 10.000', text)
+        self.assertIn('retrieval_stage_ms_count{stage="embed"} 1', text)
+        self.assertIn('retrieval_response_bytes_sum 1000.000', text)
+        self.assertIn('retrieval_searches_total 1', text)
+        self.assertEqual(text.count("# TYPE retrieval_stage_ms summary"), 1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "retrieval.prom")
+            metrics.write_text(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(f.read(), text)
+
+class TestResponseStats(unittest.TestCase):
+    def test_search_and_msearch_responses(self):
+        stats = {}
+        response_stats({"took": 7, "hits": {"total": {"value": 42}, "hits": [{"_id": "a"}, {"_id": "b"}]}}, stats)
+        self.assertEqual((stats["took_ms"], stats["hits"], stats["total_hits"]), (7, 2, 42))
+        self.assertGreater(stats["response_bytes"], 0)
+
+        stats = {}
+        response_stats({"took": 9, "responses": [
+            {"hits": {"total": {"value": 3}, "hits": [{"_id": "a"}]}},
+            {"hits": {"total": {"value": 1}, "hits": [{"_id": "b"}]}}
+        ]}, stats)
+        self.assertEqual((stats["took_ms"], stats["hits"], stats["total_hits"]), (9, 2, 4))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+from search_backends import (ElasticsearchBackend, AsyncElasticsearchBackend, CANONICAL_CHUNKS, LEAN_SOURCE_FIELDS, SearchResults,
+                             build_snippet, get_search_backend, merge_results, reciprocal_rank_fusion)
+
+class FakeMsearchClient:
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def msearch(self, index, searches):
+        self.requests.append((index, searches))
+        return {"responses": self.responses}
+
+class TestElasticsearchBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = ElasticsearchBackend(None, "medical_journal", num_candidates=50)
+
+    def test_vector_search_uses_knn(self):
+        body = self.backend.build_search("asthma", [0.1, 0.2], "vector", k=5)
+        self.assertNotIn("query", body)
+        self.assertEqual(body["knn"]["k"], 5)
+        self.assertEqual(body["knn"]["num_candidates"], 50)
+        self.assertEqual(body["knn"]["filter"], [CANONICAL_CHUNKS])
+        self.assertEqual(body["size"], 5)
+
+    def test_hybrid_search_combines_query_and_knn(self):
+        body = self.backend.build_search("asthma", [0.1, 0.2], "hybrid", k=80)
+        self.assertEqual(body["query"]["bool"]["filter"], CANONICAL_CHUNKS)
+        self.assertEqual(body["query"]["bool"]["must"]["multi_match"]["query"], "asthma")
+        # Never fewer candidates than hits
+        self.assertEqual(body["knn"]["num_candidates"], 80)
+
+    def test_bm25_filter(self):
+        body = self.backend.build_search("asthma", [0.1, 0.2], "vector", k=5, bm25_filter=True)
+        self.assertEqual(body["knn"]["filter"][1]["multi_match"]["query"], "asthma")
+        body = self.backend.build_search("asthma", None, "bm25", k=5, bm25_filter=True)
+        self.assertNotIn("knn", body)
+
+    def test_lean_search_requests_snippets(self):
+        body = self.backend.build_search("asthma", [0.1, 0.2], "hybrid", k=5, snippet_chars=600)
+        self.assertEqual(body["_source"], LEAN_SOURCE_FIELDS)
+        self.assertNotIn("text", body["_source"])
+        self.assertEqual(body["highlight"]["highlight_query"], {"match": {"text": "asthma"}})
+        self.assertEqual(body["highlight"]["fields"]["text"]["no_match_size"], 600)
+        self.assertNotIn("_source", self.backend.build_search("asthma", None, "bm25", k=5))
+
+    def test_search_many_sends_one_msearch(self):
+        es = FakeMsearchClient([{"hits": {"hits": [{"_id": "a"}]}}, {"hits": {"hits": []}}])
+        backend = ElasticsearchBackend(es, "medical_journal")
+        hits = backend.search_many([
+            {"query": "asthma", "query_vector": None, "search_type": "bm25", "k": 5},
+            {"query": "copd", "query_vector": [0.1, 0.2], "search_type": "vector", "k": 5}
+        ])
+        self.assertEqual(hits, [[{"_id": "a"}], []])
+        index, searches = es.requests[0]
+        self.assertEqual(len(es.requests), 1)
+        self.assertEqual(index, "medical_journal")
+        self.assertEqual(searches[0], {})
+        self.assertEqual(searches[1]["query"]["bool"]["must"]["multi_match"]["query"], "asthma")
+        self.assertEqual(searches[3]["knn"]["query_vector"], [0.1, 0.2])
+
+        es.responses = [{"error": {"type": "search_phase_execution_exception"}}]
+        with self.assertRaises(RuntimeError):
+            backend.search_many([{"query": "asthma", "query_vector": None, "search_type": "bm25", "k": 5}])
+
+    def test_invalid_search_type(self):
+        with self.assertRaises(ValueError):
+            self.backend.build_search("asthma", None, "fuzzy", k=5)
+        with self.assertRaises(ValueError):
+            get_search_backend("solr")
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.bodies = []
+
+    async def search(self, index, body):
+        self.bodies.append(body)
+        return {"hits": {"hits": [{"_id": "a", "_score": 1.0}]}}
+
+class TestAsyncElasticsearchBackend(unittest.TestCase):
+    def test_search_is_awaitable_with_the_same_body(self):
+        es = FakeAsyncClient()
+        backend = AsyncElasticsearchBackend(es, "medical_journal", num_candidates=50)
+        hits = asyncio.run(backend.search("asthma", [0.1, 0.2], "hybrid", k=5))
+        self.assertEqual(hits, [{"_id": "a", "_score": 1.0}])
+        self.assertEqual(es.bodies, [backend.build_search("asthma", [0.1, 0.2], "hybrid", k=5)])
+
+class TestBuildSnippet(unittest.TestCase):
+    def test_fragments_within_budget(self):
+        fragments = ["humidity triggers asthma", "in coastal cities", "during summer"]
+        self.assertEqual(build_snippet(fragments, 50), "humidity triggers asthma … in coastal cities")
+        self.assertEqual(build_snippet(fragments, 20), "humidity triggers …")
+        self.assertEqual(build_snippet(fragments, 100, max_tokens=5), "humidity triggers asthma")
+        self.assertEqual(build_snippet([], 100), "")
+
+class TestMergeResults(unittest.TestCase):
+    def test_chunks_found_by_several_queries_are_kept_once(self):
+        merged = merge_results({
+            "asthma": [{"id": "a", "score": 0.9, "text": "asthma"}, {"id": "b", "score": 0.5, "text": "humidity"}],
+            "copd": [{"id": "b", "score": 0.7, "text": "humidity"}, {"id": "c", "score": 0.6, "text": "copd"}]
+        })
+        self.assertEqual([result["id"] for result in merged], ["a", "b", "c"])
+        self.assertEqual(merged[1]["score"], 0.7)
+        self.assertEqual(merged[1]["queries"], ["asthma", "copd"])
+        self.assertEqual(merged[2]["queries"], ["copd"])
+
+class TestReciprocalRankFusion(unittest.TestCase):
+    def hits(self, *ids):
+        return [{"_id": doc_id, "_score": 100.0 - i} for i, doc_id in enumerate(ids)]
+
+    def test_hits_found_by_both_legs_rank_first(self):
+        fused = reciprocal_rank_fusion(
+            {"bm25": self.hits("a", "b", "c"), "vector": self.hits("c", "d")}, rank_constant=60
+        )
+        self.assertEqual([hit["_id"] for hit, _, _ in fused], ["c", "a", "b", "d"])
+        hit, score, ranks = fused[0]
+        self.assertAlmostEqual(score, 1 / 63 + 1 / 61)
+        self.assertEqual(ranks, {"bm25": 3, "vector": 1})
+
+    def test_weights(self):
+        fused = reciprocal_rank_fusion(
+            {"bm25": self.hits("a"), "vector": self.hits("b")}, weights={"vector": 2.0}
+        )
+        self.assertEqual([hit["_id"] for hit, _, _ in fused], ["b", "a"])
+
+    def test_search_results_is_a_list_with_metadata(self):
+        results = SearchResults([{"text": "asthma"}], {"timings": {"total_ms": 1.0}})
+        self.assertEqual(results, [{"text": "asthma"}])
+        self.assertEqual(results.metadata["timings"]["total_ms"], 1.0)
+        self.assertEqual(SearchResults().metadata, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import asyncio
+import unittest
+import subprocess
+from unittest.mock import patch
+import searcher
+
+class TestSearcherImport(unittest.TestCase):
+    def test_import_needs_no_settings(self):
+        """Importing connects to nothing and validates nothing"""
+        env = {var: value for var, value in os.environ.items() if not var.startswith(("ES_", "IBM_CLOUD_"))}
+        env["SEARCH_BACKEND"] = "elasticsearch"
+        output = subprocess.run(
+            [sys.executable, "-c", "import sys, searcher; print(searcher._es, 'elasticsearch' in sys.modules)"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True
+        )
+        self.assertEqual(output.returncode, 0, output.stderr)
+        self.assertEqual(output.stdout.strip(), "None False")
+
+    def test_settings_are_validated_on_first_use(self):
+        with patch.multiple(searcher, SEARCH_BACKEND="elasticsearch", ES_URL=None, ES_USER="elastic",
+                            ES_PASSWORD=None, ES_CERT_FINGERPRINT="AB:CD", _es=None):
+            with self.assertRaisesRegex(ValueError, "ES_URL, ES_PASSWORD"):
+                searcher.get_es_client()
+
+    def test_backend_is_created_once(self):
+        with patch.multiple(searcher, SEARCH_BACKEND="local", _es=None, _backend=None):
+            backend = searcher.get_backend()
+            self.assertEqual(backend.name, "local")
+            self.assertIs(searcher.get_backend(), backend)
+            self.assertIsNone(searcher.get_es_client())
+
+    def test_batch_queries_have_their_own_metadata(self):
+        """Per-query metadata holds copies of the batch timings, not the batch's dicts"""
+        class Backend:
+            name = "local"
+
+            def search_many(self, searches, stats=None):
+                stats.update(took_ms=1.0, hits=len(searches))
+                return [[{"_id": f"{search['query']}_{i}", "_score": 1.0,
+                          "_source": {"text": "t", "source_pdf": "a.pdf", "page_number": 1}}
+                         for i in range(len(search["query"]))] for search in searches]
+
+        with patch.multiple(searcher, _backend=Backend(), RESULT_CACHE="off", _result_cache=None):
+            batch = searcher.search_documents_batch(["copd", "asthma"], search_type="bm25", include_assets=False)
+        merged, copd = batch["merged"].metadata, batch["results"]["copd"].metadata
+        self.assertEqual(copd["legs"], merged["legs"])
+        self.assertIsNot(copd["timings"], merged["timings"])
+        self.assertIsNot(copd["legs"]["msearch"], merged["legs"]["msearch"])
+        self.assertEqual((copd["hits"], batch["results"]["asthma"].metadata["hits"], merged["hits"]), (4, 6, 10))
+        self.assertIn("total_ms", merged["timings"])
+        self.assertNotIn("total_ms", copd["timings"])
+
+    def test_async_backend_is_closed_with_its_loop(self):
+        """Every asyncio.run gets its own async backend, closed before the run returns"""
+        class AsyncBackend:
+            closed = False
+
+            async def close(self):
+                self.closed = True
+
+        async def use_backend():
+            return searcher.get_async_backend()
+
+        with patch.multiple(searcher, SEARCH_BACKEND="local", _backend=None,
+                            get_async_search_backend=lambda backend, async_es: AsyncBackend()):
+            first = asyncio.run(use_backend())
+            self.assertTrue(first.closed)
+            second = asyncio.run(use_backend())
+        self.assertIsNot(first, second)
+        self.assertTrue(second.closed)
+        self.assertEqual(len(searcher._async_backends), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from token_chunking import TokenChunker, approximate_token_count
+
+def word_count(text):
+    return len(text.split())
+
+class TestTokenChunker(unittest.TestCase):
+    def test_packs_lines_up_to_budget(self):
+        """Lines are packed into chunks of at most max_tokens tokens"""
+        text = "\n".join(f"line {i} has five words" for i in range(20))
+        chunks, starts = TokenChunker(word_count, max_tokens=12, overlap_tokens=0).split(text)
+
+        self.assertEqual(len(chunks), 10)
+        self.assertTrue(all(word_count(chunk) <= 12 for chunk in chunks))
+        for chunk, start in zip(chunks, starts):
+            self.assertEqual(text[start:start + len(chunk)], chunk)
+
+    def test_tables_are_not_split(self):
+        """A table that fits the budget ends up whole in one chunk"""
+        table = "| a | b |\n|---|---|\n| 1 | 2 |\n| 3 | 4 |"
+        text = "intro words here\n" + table + "\nafter the table"
+        chunks, _ = TokenChunker(word_count, max_tokens=25, overlap_tokens=5).split(text)
+
+        self.assertEqual(sum(table in chunk for chunk in chunks), 1)
+
+    def test_overlap_repeats_trailing_text(self):
+        text = "one two\nthree four\nfive six\nseven eight"
+        chunks, _ = TokenChunker(word_count, max_tokens=4, overlap_tokens=2).split(text)
+
+        self.assertEqual(chunks[0], "one two\nthree four")
+        self.assertTrue(chunks[1].startswith("three four"))
+
+    def test_long_sentences_are_cut(self):
+        """Text without line breaks is cut at sentence ends, then between words"""
+        text = "Short sentence here. " + " ".join(["word"] * 30)
+        chunks, _ = TokenChunker(word_count, max_tokens=10, overlap_tokens=0).split(text)
+
+        self.assertTrue(chunks[0].startswith("Short sentence here. word"))
+        self.assertTrue(all(word_count(chunk) <= 10 for chunk in chunks))
+        self.assertEqual(sum(word_count(chunk) for chunk in chunks), 33)
+
+    def test_approximate_count(self):
+        self.assertEqual(approximate_token_count("Hello, world."), 4)
+        self.assertGreater(approximate_token_count("electroencephalography"), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_TOKENS = 450
+DEFAULT_OVERLAP_TOKENS = 50
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+def approximate_token_count(text):
+    """
+    Fast local estimate of the number of BPE tokens in text.
+
+    Every punctuation mark counts as one token and every word as one token
+    plus one per six characters beyond the first, which over-estimates the
+    slate (RoBERTa) tokenizer on English and medical vocabulary, so chunks
+    packed with it stay under the model's truncation limit.
+    """
+    count = 0
+    for piece in _PIECE_PATTERN.findall(text):
+        count += 1 + (len(piece) - 1) // 6
+    return count
+
+def load_token_counter(tokenizer_name=None):
+    """
+    Return a function counting the tokens of a text.
+
+    Uses the Hugging Face tokenizer tokenizer_name when given and the
+    transformers package is installed, else approximate_token_count.
+    """
+    if tokenizer_name:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {tokenizer_name}, approximating token counts: {str(e)}")
+    return approximate_token_count
+
+def _is_table_line(line):
+    return line.startswith('|') or line.startswith('+-')
+
+class TokenChunker:
+    """
+    Pack text into chunks of up to max_tokens tokens.
+
+    The text is cut into units first: whole markdown tables, and lines of
+    other text (long lines are cut at sentence ends, and sentences that are
+    still too long at word boundaries). Units are then packed greedily into
+    chunks. A table is never split unless it exceeds max_tokens on its own,
+    in which case it is split between rows. Consecutive chunks share up to
+    overlap_tokens tokens of trailing text units.
+    """
+
+    def __init__(self, count_tokens=approximate_token_count, max_tokens=DEFAULT_CHUNK_TOKENS,
+                 overlap_tokens=DEFAULT_OVERLAP_TOKENS):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _lines(self, text):
+        """(start, end) of every non-empty line."""
+        offset = 0
+        for line in text.split('\n'):
+            if line.strip():
+                yield offset, offset + len(line)
+            offset += len(line) + 1
+
+    def _split_oversized(self, text, start, end, pattern):
+        """Cut text[start:end] after the matches of pattern, then into units of max_tokens."""
+        pieces = []
+        piece_start = start
+        for match in pattern.finditer(text, start, end):
+            pieces.append((piece_start, match.start()))
+            piece_start = match.end()
+        pieces.append((piece_start, end))
+        units = []
+        for piece_start, piece_end in pieces:
+            tokens = self.count_tokens(text[piece_start:piece_end])
+            if tokens <= self.max_tokens:
+                units.append((piece_start, piece_end, tokens, False))
+            elif pattern is _SENTENCE_END_PATTERN:
+                units.extend(self._split_oversized(text, piece_start, piece_end, re.compile(r"\s+")))
+            else:
+                # A single word longer than the budget, cut it by characters
+                step = max(1, (piece_end - piece_start) * self.max_tokens // tokens)
+                for cut in range(piece_start, piece_end, step):
+                    cut_end = min(piece_end, cut + step)
+                    units.append((cut, cut_end, self.count_tokens(text[cut:cut_end]), False))
+        return units
+
+    def _units(self, text):
+        """Units of text as (start, end, tokens, is_table)."""
+        units = []
+        table = []
+        for start, end in list(self._lines(text)) + [(None, None)]:
+            if start is not None and _is_table_line(text[start:end].strip()):
+                table.append((start, end))
+                continue
+            if table:
+                table_start, table_end = table[0][0], table[-1][1]
+                tokens = self.count_tokens(text[table_start:table_end])
+                if tokens <= self.max_tokens:
+                    units.append((table_start, table_end, tokens, True))
+                else:
+                    units.extend((row_start, row_end, self.count_tokens(text[row_start:row_end]), True)
+                                 for row_start, row_end in table)
+                table = []
+            if start is None:
+                break
+            tokens = self.count_tokens(text[start:end])
+            if tokens <= self.max_tokens:
+                units.append((start, end, tokens, False))
+            else:
+                units.extend(self._split_oversized(text, start, end, _SENTENCE_END_PATTERN))
+        return units
+
+    def split(self, text):
+        """
+        Split text into token-budgeted chunks.
+
+        Returns:
+            tuple: (chunks, chunk_starts) with the chunk texts and the offset
+                of each chunk in text
+        """
+        chunks = []
+        chunk_starts = []
+        current = []
+        current_tokens = 0
+        for unit in self._units(text):
+            tokens = unit[2]
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append(text[current[0][0]:current[-1][1]])
+                chunk_starts.append(current[0][0])
+                # Carry trailing text units over as overlap, never tables
+                overlap = []
+                overlap_tokens = 0
+                for previous in reversed(current):
+                    if previous[3] or overlap_tokens + previous[2] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_tokens += previous[2]
+                if overlap_tokens + tokens > self.max_tokens:
+                    overlap, overlap_tokens = [], 0
+                current, current_tokens = overlap, overlap_tokens
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            chunks.append(text[current[0][0]:current[-1][1]])
+            chunk_starts.append(current[0][0])
+        return chunks, chunk_starts